@@ -0,0 +1,584 @@
+"""
+Device Catalog
+==============
+
+Materialized per-MAC device records, upserted by the ingest pipeline.
+
+Every MAC gets a catalog row id (order of first sighting). Vendor and
+device type are resolved once per MAC (type again only when the name
+changes, classified per ingest batch), so directory, search, aggregations and export read ready-made
+records instead of rebuilding device state from raw logs per request.
+
+Sorted secondary indexes (last_seen, first_seen, count, name) hold
+(key, row) tuples and are patched with bisect after each ingest batch.
+Pages are read by keyset: the cursor is the last (key, row) of the
+previous page, so a deep page costs O(page size), not a full sort.
+
+Facet bitmaps (manufacturer, type, tags, GPS) are Python ints with bit
+n = catalog row n. Filter combinations are bitwise ANDs and facet counts
+are int.bit_count() of the intersection.
+"""
+
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from datetime import datetime, timedelta
+import time
+
+from api.utils import timestamp_to_epoch, encode_cursor, decode_cursor
+from api.ingest import register_listener, ingest_lock, refresh, get_entries
+from api.classifier import classify, classify_many
+
+# Online if seen within the last hour
+ONLINE_SECONDS = 3600
+
+# Sort key for records without a parseable timestamp (sorts first)
+MISSING_EPOCH = -1.0
+
+SORT_FIELDS = ("last_seen", "first_seen", "count", "name")
+
+# Rebuild indexes instead of patching when a batch touches more devices
+REBUILD_FRACTION = 0.25
+
+# Record fields with a bitmap per distinct value
+FACET_FIELDS = ("manufacturer", "type")
+
+STATUSES = ("online", "offline", "unknown")
+
+catalog_state = {
+    "devices": [],              # catalog row id -> record
+    "by_mac": {},               # {mac: catalog row id}
+    "epoch_high": array('d'),   # ingest row -> running max epoch (for time windows)
+    "sorted": {field: [] for field in SORT_FIELDS},   # {field: [(key, row), ...]}
+    "facets": {field: {} for field in FACET_FIELDS},  # {field: {value: bits}}
+    "facet_rows": {},           # {row: (manufacturer, type, has_gps)} as indexed
+    "gps_bits": 0,
+    "tag_bits": {},             # {tag: bits}
+    "tags": {}                  # {mac: [tag, ...]} mirror of the tag store
+}
+
+# ========================= INGEST =========================
+
+def _upsert_entries(start_row, entries):
+    """Ingest listener: upsert device records for new sightings"""
+    devices = catalog_state["devices"]
+    epoch_high = catalog_state["epoch_high"]
+    high = epoch_high[-1] if epoch_high else float("-inf")
+
+    known = len(devices)
+    touched = {}    # {row: {field: old key}} for devices that existed before the batch
+    retype = set()  # rows that are new or renamed
+
+    for entry in entries:
+        epoch = timestamp_to_epoch(entry["timestamp"])
+        if epoch is not None and epoch > high:
+            high = epoch
+        epoch_high.append(high)
+
+        row = catalog_state["by_mac"].get(entry["mac"])
+        if row is not None and row < known and row not in touched:
+            touched[row] = {field: sort_key(field, devices[row]) for field in SORT_FIELDS}
+
+        _upsert(devices, catalog_state["by_mac"], entry, epoch, retype)
+
+    _classify_rows(devices, retype)
+    _update_facets(list(touched) + list(range(known, len(devices))))
+
+    if len(touched) + len(devices) - known > len(devices) * REBUILD_FRACTION:
+        _rebuild_indexes()
+        return
+
+    for field, index in catalog_state["sorted"].items():
+        for row, old_keys in touched.items():
+            new_key = sort_key(field, devices[row])
+            if new_key == old_keys[field]:
+                continue
+            del index[bisect_left(index, old_keys[field])]
+            insort(index, new_key)
+
+        for row in range(known, len(devices)):
+            insort(index, sort_key(field, devices[row]))
+
+def _rebuild_indexes():
+    """Sort all secondary indexes from scratch"""
+    devices = catalog_state["devices"]
+    catalog_state["sorted"] = {
+        field: sorted(sort_key(field, record) for record in devices)
+        for field in SORT_FIELDS
+    }
+
+def _update_facets(rows):
+    """Move changed rows between facet bitmaps (one OR/AND per value)"""
+    devices = catalog_state["devices"]
+    facets = catalog_state["facets"]
+    facet_rows = catalog_state["facet_rows"]
+
+    added = defaultdict(list)     # {(field, value): [row, ...]}
+    removed = defaultdict(list)
+    gps_rows, tag_rows = [], defaultdict(list)
+
+    for row in rows:
+        record = devices[row]
+        values = (record["manufacturer"], record["type"], record["gps_count"] > 0)
+        old = facet_rows.get(row)
+        if old == values:
+            continue
+
+        for i, field in enumerate(FACET_FIELDS):
+            if old is None or old[i] != values[i]:
+                added[(field, values[i])].append(row)
+                if old is not None:
+                    removed[(field, old[i])].append(row)
+
+        if values[2] and not (old and old[2]):
+            gps_rows.append(row)
+
+        if old is None:
+            for tag in catalog_state["tags"].get(record["mac"], ()):
+                tag_rows[tag].append(row)
+
+        facet_rows[row] = values
+
+    size = len(devices)
+    for (field, value), value_rows in removed.items():
+        facets[field][value] &= ~bits_from_rows(value_rows, size)
+        if not facets[field][value]:
+            del facets[field][value]
+    for (field, value), value_rows in added.items():
+        facets[field][value] = facets[field].get(value, 0) | bits_from_rows(value_rows, size)
+    if gps_rows:
+        catalog_state["gps_bits"] |= bits_from_rows(gps_rows, size)
+    for tag, value_rows in tag_rows.items():
+        catalog_state["tag_bits"][tag] = catalog_state["tag_bits"].get(tag, 0) | bits_from_rows(value_rows, size)
+
+def _reset_catalog():
+    """Ingest listener: drop all records (log rotated)"""
+    catalog_state["devices"] = []
+    catalog_state["by_mac"] = {}
+    catalog_state["epoch_high"] = array('d')
+    catalog_state["sorted"] = {field: [] for field in SORT_FIELDS}
+    catalog_state["facets"] = {field: {} for field in FACET_FIELDS}
+    catalog_state["facet_rows"] = {}
+    catalog_state["gps_bits"] = 0
+    catalog_state["tag_bits"] = {}
+
+def _upsert(devices, by_mac, entry, epoch, retype):
+    """
+    Create or update the record of one sighting's MAC
+
+    Rows of new or renamed devices are added to retype; their "type" is
+    set by _classify_rows once per batch.
+    """
+    mac = entry["mac"]
+    row = by_mac.get(mac)
+
+    if row is None:
+        row = by_mac[mac] = len(devices)
+        name = entry["name"]
+        devices.append({
+            "row": row,
+            "mac": mac,
+            "name": name,
+            "manufacturer": lookup_oui(mac),
+            "type": None,
+            "count": 0,
+            "first_seen": entry["timestamp"],
+            "first_epoch": epoch,
+            "last_seen": None,
+            "last_epoch": None,
+            "gps_count": 0
+        })
+        retype.add(row)
+
+    record = devices[row]
+    record["count"] += 1
+    record["last_seen"] = entry["timestamp"]
+    record["last_epoch"] = epoch
+
+    # Latest known name wins (same as get_mac_statistics)
+    if entry["name"] != "Unknown" and entry["name"] != record["name"]:
+        record["name"] = entry["name"]
+        retype.add(row)
+
+    if entry.get("lat") and entry.get("lon"):
+        record["gps_count"] += 1
+
+    return record
+
+def _classify_rows(devices, rows):
+    """Set the device type of the given rows in one classifier batch"""
+    rows = list(rows)
+    types = classify_many((devices[row]["name"], devices[row]["mac"]) for row in rows)
+    for row, device_type in zip(rows, types):
+        devices[row]["type"] = device_type
+
+# ========================= READS =========================
+
+def get_catalog(hours=None):
+    """
+    Device records, optionally restricted to a time window
+
+    Without a window the materialized records are returned. With a window
+    the first candidate row is found by bisecting the running max epoch
+    (rows are appended chronologically) and only the rows inside the
+    window are aggregated.
+
+    Args:
+        hours: None or number of hours back from now
+
+    Returns:
+        List[dict]: Records in order of first sighting (do not modify)
+    """
+    with ingest_lock:
+        entries = get_entries()
+
+        if hours is None:
+            return list(catalog_state["devices"])
+
+        cutoff = (datetime.now() - timedelta(hours=hours)).timestamp()
+        start = bisect_left(catalog_state["epoch_high"], cutoff)
+
+        devices, by_mac, retype = [], {}, set()
+        for row in range(start, len(entries)):
+            entry = entries[row]
+            epoch = timestamp_to_epoch(entry["timestamp"])
+            if epoch is None or epoch < cutoff:
+                continue
+            _upsert(devices, by_mac, entry, epoch, retype)
+        _classify_rows(devices, retype)
+
+        # Global row ids keep cursors stable while the window moves
+        for record in devices:
+            record["row"] = catalog_state["by_mac"][record["mac"]]
+
+    return devices
+
+def get_record(mac):
+    """Catalog record of one MAC (None if never seen)"""
+    with ingest_lock:
+        refresh()
+        row = catalog_state["by_mac"].get(mac)
+        return None if row is None else catalog_state["devices"][row]
+
+def device_status(record, now=None):
+    """Online/offline from the record's last sighting"""
+    if record["last_epoch"] is None:
+        return "unknown"
+
+    if now is None:
+        now = time.time()
+
+    return "online" if now - record["last_epoch"] < ONLINE_SECONDS else "offline"
+
+# ========================= SORTED INDEXES =========================
+
+def sort_key(field, record):
+    """
+    Index key of a record: (value, row)
+
+    last_seen/first_seen sort by epoch (chronological, not by the
+    "14 OCT 1230" string), name case-insensitively. The row id makes
+    every key unique, which keyset pagination relies on.
+    """
+    if field == "last_seen":
+        value = record["last_epoch"]
+    elif field == "first_seen":
+        value = record["first_epoch"]
+    elif field == "count":
+        return (record["count"], record["row"])
+    else:
+        return (record["name"].lower(), record["row"])
+
+    return (MISSING_EPOCH if value is None else value, record["row"])
+
+def get_sorted_page(sort_by, descending, limit, after=None, offset=0, predicate=None, records=None):
+    """
+    One page in index order
+
+    Args:
+        sort_by: One of SORT_FIELDS
+        descending: Walk the index backwards
+        limit: Page size
+        after: Key (value, row) of the last item of the previous page
+        offset: Matching items to skip (page-number pagination)
+        predicate: Optional callable(record) -> bool
+        records: Optional record list (time window); sorted on the fly
+
+    Returns:
+        tuple: (records, next_key) - next_key is None on the last page
+    """
+    with ingest_lock:
+        if records is None:
+            refresh()
+            devices = catalog_state["devices"]
+            index = catalog_state["sorted"][sort_by]
+        else:
+            devices = {record["row"]: record for record in records}
+            index = sorted(sort_key(sort_by, record) for record in records)
+
+        if descending:
+            start = len(index) if after is None else bisect_left(index, after)
+            positions = range(start - 1, -1, -1)
+        else:
+            start = 0 if after is None else bisect_right(index, after)
+            positions = range(start, len(index))
+
+        page = []
+        last_key = None
+        for pos in positions:
+            record = devices[index[pos][1]]
+            if predicate is not None and not predicate(record):
+                continue
+            if offset:
+                offset -= 1
+                continue
+            if len(page) == limit:
+                return page, last_key
+            page.append(record)
+            last_key = index[pos]
+
+    return page, None
+
+def make_cursor(sort_by, descending, key):
+    """Opaque cursor token for the key after which the next page starts"""
+    return encode_cursor([sort_by, "desc" if descending else "asc", key[0], key[1]])
+
+def parse_cursor(token, sort_by, descending):
+    """
+    Key from a cursor token
+
+    Returns:
+        tuple | None: (value, row), None if invalid or made for another sort order
+    """
+    payload = decode_cursor(token)
+    if not payload or len(payload) != 4:
+        return None
+
+    field, order, value, row = payload
+    if field != sort_by or order != ("desc" if descending else "asc") or not isinstance(row, int):
+        return None
+
+    if field == "name":
+        if not isinstance(value, str):
+            return None
+    elif not isinstance(value, (int, float)) or isinstance(value, bool):
+        return None
+
+    return (value, row)
+
+# ========================= FACET BITMAPS =========================
+
+def bits_from_rows(rows, size):
+    """Bitmap with the given rows set (built in a bytearray, O(size/8 + rows))"""
+    buf = bytearray((size + 7) // 8)
+    for row in rows:
+        buf[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(buf, "little")
+
+def bits_test(bits, size):
+    """
+    Membership test for a bitmap
+
+    Returns:
+        callable: row -> bool (O(1), the bitmap is unpacked once)
+    """
+    buf = bits.to_bytes((size + 7) // 8 or 1, "little")
+    return lambda row: bool(buf[row >> 3] >> (row & 7) & 1)
+
+def get_facet_index(now=None, records=None, status=None):
+    """
+    Facet bitmaps over catalog rows
+
+    Status bitmaps depend on the current time. They are taken from the
+    presence engine if given, otherwise cut from the last_seen index
+    (only online/unknown rows are visited).
+
+    Args:
+        now: Reference time (default: time.time())
+        records: Optional record list (time window); bitmaps built on the fly
+        status: Optional {"online": bits, "unknown": bits} for the whole catalog
+
+    Returns:
+        dict: {
+            "size": int,                  # bitmap width (catalog rows)
+            "all": bits,
+            "manufacturer": {value: bits},
+            "type": {value: bits},
+            "status": {"online": bits, "offline": bits, "unknown": bits},
+            "tags": {tag: bits},
+            "gps": bits
+        }
+    """
+    if now is None:
+        now = time.time()
+    cutoff = now - ONLINE_SECONDS
+
+    with ingest_lock:
+        refresh()
+        size = len(catalog_state["devices"])
+
+        if records is None:
+            if status is not None:
+                online, unknown = status["online"], status["unknown"]
+            else:
+                index = catalog_state["sorted"]["last_seen"]
+                online = bits_from_rows(
+                    (row for _, row in index[bisect_right(index, (cutoff, float("inf"))):]), size
+                )
+                unknown = bits_from_rows(
+                    (row for _, row in index[:bisect_right(index, (MISSING_EPOCH, float("inf")))]), size
+                )
+            result = {
+                "size": size,
+                "all": (1 << size) - 1,
+                "manufacturer": dict(catalog_state["facets"]["manufacturer"]),
+                "type": dict(catalog_state["facets"]["type"]),
+                "tags": dict(catalog_state["tag_bits"]),
+                "gps": catalog_state["gps_bits"]
+            }
+        else:
+            grouped = defaultdict(list)
+            for record in records:
+                row = record["row"]
+                grouped[("all", None)].append(row)
+                for field in FACET_FIELDS:
+                    grouped[(field, record[field])].append(row)
+                for tag in catalog_state["tags"].get(record["mac"], ()):
+                    grouped[("tags", tag)].append(row)
+                if record["gps_count"]:
+                    grouped[("gps", None)].append(row)
+                if record["last_epoch"] is None:
+                    grouped[("unknown", None)].append(row)
+                elif record["last_epoch"] > cutoff:
+                    grouped[("online", None)].append(row)
+
+            bits = {key: bits_from_rows(rows, size) for key, rows in grouped.items()}
+            online = bits.get(("online", None), 0)
+            unknown = bits.get(("unknown", None), 0)
+            result = {
+                "size": size,
+                "all": bits.get(("all", None), 0),
+                "manufacturer": {v: b for (f, v), b in bits.items() if f == "manufacturer"},
+                "type": {v: b for (f, v), b in bits.items() if f == "type"},
+                "tags": {v: b for (f, v), b in bits.items() if f == "tags"},
+                "gps": bits.get(("gps", None), 0)
+            }
+
+    result["status"] = {
+        "online": online,
+        "offline": result["all"] & ~online & ~unknown,
+        "unknown": unknown
+    }
+    return result
+
+def facet_counts(index, selections):
+    """
+    Counts per facet value for the current selection
+
+    Each facet is counted against the selection of all *other* facets,
+    so the UI can show how many devices a different value would give.
+
+    Args:
+        index: Result of get_facet_index()
+        selections: {facet: bits | None} active filters (None = not filtered)
+
+    Returns:
+        dict: {facet: {value: count}} (values with zero count omitted)
+    """
+    counts = {}
+    for facet in ("manufacturer", "type", "status", "tags"):
+        base = index["all"]
+        for other, bits in selections.items():
+            if other != facet and bits is not None:
+                base &= bits
+
+        counts[facet] = {
+            value: count
+            for value, count in ((v, (b & base).bit_count()) for v, b in index[facet].items())
+            if count
+        }
+
+    return counts
+
+# ========================= TAGS =========================
+
+def get_tags(mac):
+    """Tags of a device (empty list if none)"""
+    return catalog_state["tags"].get(mac, [])
+
+def set_many_tags(changes):
+    """
+    Mirror many tag updates at once
+
+    Rows are grouped per tag, so each tag bitmap is rewritten once
+    regardless of how many MACs changed.
+
+    Args:
+        changes: {mac: [tag, ...]} new tags per MAC (empty = untagged)
+    """
+    with ingest_lock:
+        added = defaultdict(list)
+        removed = defaultdict(list)
+
+        for mac, tags in changes.items():
+            old = catalog_state["tags"].get(mac, [])
+            if tags:
+                catalog_state["tags"][mac] = list(tags)
+            else:
+                catalog_state["tags"].pop(mac, None)
+
+            row = catalog_state["by_mac"].get(mac)
+            if row is None:
+                continue
+
+            for tag in set(old) - set(tags):
+                removed[tag].append(row)
+            for tag in set(tags) - set(old):
+                added[tag].append(row)
+
+        size = len(catalog_state["devices"])
+        tag_bits = catalog_state["tag_bits"]
+        for tag, rows in removed.items():
+            tag_bits[tag] &= ~bits_from_rows(rows, size)
+            if not tag_bits[tag]:
+                del tag_bits[tag]
+        for tag, rows in added.items():
+            tag_bits[tag] = tag_bits.get(tag, 0) | bits_from_rows(rows, size)
+
+def load_catalog_tags(tags_db):
+    """Replace all mirrored tags (tag store loaded)"""
+    with ingest_lock:
+        catalog_state["tags"] = {mac: list(tags) for mac, tags in tags_db.items() if tags}
+
+        rows = defaultdict(list)
+        for mac, tags in catalog_state["tags"].items():
+            row = catalog_state["by_mac"].get(mac)
+            if row is not None:
+                for tag in tags:
+                    rows[tag].append(row)
+
+        size = len(catalog_state["devices"])
+        catalog_state["tag_bits"] = {tag: bits_from_rows(r, size) for tag, r in rows.items()}
+
+# ========================= CLASSIFICATION =========================
+
+def lookup_oui(mac):
+    """Lookup manufacturer from MAC (OUI)"""
+    oui = mac[:8].upper()
+
+    # Simple OUI database (can be extended)
+    oui_db = {
+        "00:03:93": "Apple", "00:05:02": "Apple", "00:0A:27": "Apple",
+        "0C:47:C9": "Samsung", "10:08:B1": "Samsung", "14:49:E0": "Samsung",
+        "00:0C:F1": "Intel", "00:13:E0": "Intel", "00:15:00": "Intel",
+        "00:50:F2": "Microsoft", "08:00:27": "VirtualBox",
+        "00:1B:63": "Apple", "00:25:00": "Apple", "3C:BD:D8": "Samsung"
+    }
+
+    return oui_db.get(oui, "Unknown")
+
+def detect_device_type(name, mac):
+    """Heuristic device type detection (see api.classifier)"""
+    return classify(name, mac)
+
+register_listener(_upsert_entries, _reset_catalog)
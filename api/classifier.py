@@ -0,0 +1,138 @@
+"""
+Device Classifier
+=================
+
+Keyword-based device type detection, compiled once into a single regex.
+
+Rules are checked in order, the first rule with a keyword contained in
+the (lowercased) name wins. All keywords of all rules are alternatives of
+one pattern wrapped in a lookahead, so a single finditer pass reports the
+matching rule at every position - overlapping keywords included - and the
+lowest rule index wins, exactly like testing the rules one after another.
+
+Results are memoized per name. Devices whose name matches no rule fall
+back to OUI hints (MAC prefix -> type).
+
+Rules and hints can be overridden in config.json:
+
+    "device_type_rules": {"smartphone": ["iphone", "galaxy"], ...},
+    "device_type_oui_hints": {"08:00:27": "laptop", ...}
+"""
+
+from functools import lru_cache
+import json
+import re
+
+from api.utils import CONFIG_PATH
+
+UNKNOWN_TYPE = "unknown"
+
+# Checked in order - first match wins
+DEFAULT_RULES = [
+    ("smartphone", ["iphone", "galaxy", "pixel", "oneplus", "xiaomi", "huawei"]),
+    ("headset", ["airpods", "buds", "headset", "earbuds", "headphone"]),
+    ("wearable", ["watch", "band", "fit", "tracker"]),
+    ("laptop", ["macbook", "laptop", "thinkpad"]),
+    ("iot", ["sensor", "beacon", "tag", "tracker"])
+]
+
+# {OUI: type} - used when the name gives no hint
+DEFAULT_OUI_HINTS = {}
+
+classifier_state = {
+    "types": [],        # rule index -> device type
+    "pattern": None,    # compiled lookahead alternation, one group per rule
+    "oui_hints": {}
+}
+
+# ========================= RULES =========================
+
+def load_rules(rules=None, oui_hints=None):
+    """
+    Compile classification rules (clears the memo cache)
+
+    Args:
+        rules: [(type, [keyword, ...]), ...] or {type: [keyword, ...]};
+               None = config.json or DEFAULT_RULES
+        oui_hints: {OUI: type}; None = config.json or DEFAULT_OUI_HINTS
+    """
+    if rules is None or oui_hints is None:
+        config = _read_config()
+        if rules is None:
+            rules = config.get("device_type_rules") or DEFAULT_RULES
+        if oui_hints is None:
+            oui_hints = config.get("device_type_oui_hints") or DEFAULT_OUI_HINTS
+
+    if isinstance(rules, dict):
+        rules = list(rules.items())
+
+    types, groups = [], []
+    for device_type, keywords in rules:
+        keywords = [str(k).lower() for k in keywords if k]
+        if not keywords:
+            continue
+        alternatives = "|".join(re.escape(k) for k in keywords)
+        types.append(device_type)
+        groups.append(f"({alternatives})")
+
+    classifier_state["types"] = types
+    classifier_state["pattern"] = re.compile(f"(?=(?:{'|'.join(groups)}))") if groups else None
+    classifier_state["oui_hints"] = {oui.upper(): t for oui, t in oui_hints.items()}
+
+    _classify_name.cache_clear()
+
+def _read_config():
+    try:
+        config = json.loads(CONFIG_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    return config if isinstance(config, dict) else {}
+
+# ========================= CLASSIFY =========================
+
+@lru_cache(maxsize=65536)
+def _classify_name(name):
+    """Device type from the name alone (None if no rule matches)"""
+    pattern = classifier_state["pattern"]
+    if pattern is None:
+        return None
+
+    best = None
+    for match in pattern.finditer(name.lower()):
+        rule = match.lastindex - 1
+        if best is None or rule < best:
+            best = rule
+            if best == 0:
+                break
+
+    return None if best is None else classifier_state["types"][best]
+
+def classify(name, mac=None):
+    """
+    Device type of a name/MAC pair
+
+    Args:
+        name: Device name
+        mac: MAC address (for OUI hints), optional
+
+    Returns:
+        str: Device type or "unknown"
+    """
+    device_type = _classify_name(name or "")
+    if device_type is None and mac:
+        device_type = classifier_state["oui_hints"].get(mac[:8].upper())
+    return device_type or UNKNOWN_TYPE
+
+def classify_many(devices):
+    """
+    Classify a batch of devices
+
+    Args:
+        devices: Iterable of (name, mac) tuples
+
+    Returns:
+        List[str]: Device types in input order
+    """
+    return [classify(name, mac) for name, mac in devices]
+
+load_rules()
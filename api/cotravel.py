@@ -0,0 +1,183 @@
+"""
+Co-Travel Detection
+===================
+
+Findet MAC-Paare, die wiederholt am selben Ort im selben Zeitfenster
+gesehen werden ("travels with").
+
+Spatiotemporales Hashing: (Gitterzelle, Zeit-Slot) -> MACs. Ein neuer Fix
+zählt nur gegen die MACs in den 3x3 Nachbarzellen desselben Slots, die
+Paar-Zähler werden beim Ingest fortgeschrieben - kein Paarvergleich über
+den gesamten Datenbestand.
+
+Paare unter COTRAVEL_MIN_SLOTS, die länger als COTRAVEL_PAIR_WINDOW_SLOTS
+nicht mehr zusammen gesehen wurden, werden verworfen (einmal pro Tag),
+damit die Zähler bei langer Laufzeit nicht unbegrenzt wachsen.
+"""
+
+from collections import defaultdict
+from math import floor
+from api.utils import timestamp_to_epoch
+from api.ingest import register_listener, ingest_lock, refresh
+
+# Gitterzelle (~110 m Nord-Süd) und Zeit-Slot
+COTRAVEL_CELL_DEG = 0.001
+COTRAVEL_SLOT_SECONDS = 900
+
+# Orte für "places": grobe Zellen (~1 km)
+PLACE_CELL_FACTOR = 10
+
+# Standard-Schwellwerte für Co-Travel-Paare
+COTRAVEL_MIN_SLOTS = 3
+COTRAVEL_MIN_PLACES = 2
+
+# Schwache Paare verfallen nach 7 Tagen ohne gemeinsamen Slot; geprüft wird täglich
+COTRAVEL_PAIR_WINDOW_SLOTS = 7 * 24 * 3600 // COTRAVEL_SLOT_SECONDS
+COTRAVEL_PRUNE_EVERY_SLOTS = 24 * 3600 // COTRAVEL_SLOT_SECONDS
+
+cotravel_state = {
+    "buckets": {},                      # {(row, col, slot): {mac, ...}}
+    "slot_keys": defaultdict(list),     # {slot: [bucket_key, ...]} zum Aufräumen
+    "max_slot": None,
+    "pruned_slot": None,                # Slot des letzten Aufräumens
+    "pairs": {}                         # {(mac_a, mac_b): {...}}
+}
+
+# ========================= INGEST =========================
+
+def _update_pairs(start_row, entries):
+    """Ingest-Listener: Fixes in Buckets einsortieren, Paar-Zähler erhöhen"""
+    buckets = cotravel_state["buckets"]
+    pairs = cotravel_state["pairs"]
+
+    for entry in entries:
+        if not (entry.get("lat") and entry.get("lon")):
+            continue
+
+        epoch = timestamp_to_epoch(entry["timestamp"])
+        if epoch is None:
+            continue
+
+        mac = entry["mac"]
+        slot = int(epoch // COTRAVEL_SLOT_SECONDS)
+        row = floor(entry["lat"] / COTRAVEL_CELL_DEG)
+        col = floor(entry["lon"] / COTRAVEL_CELL_DEG)
+
+        key = (row, col, slot)
+        bucket = buckets.get(key)
+        if bucket is not None and mac in bucket:
+            continue
+
+        _advance_slot(slot)
+
+        place = (row // PLACE_CELL_FACTOR, col // PLACE_CELL_FACTOR)
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                neighbour = buckets.get((row + dr, col + dc, slot))
+                if not neighbour:
+                    continue
+
+                for other in neighbour:
+                    if other == mac:
+                        continue
+
+                    pair = (mac, other) if mac < other else (other, mac)
+                    stats = pairs.get(pair)
+                    if stats is None:
+                        stats = pairs[pair] = {
+                            "slots": 0,
+                            "places": set(),
+                            "first_slot": slot,
+                            "last_slot": None
+                        }
+
+                    # Pro Slot nur einmal zählen
+                    if stats["last_slot"] == slot:
+                        continue
+
+                    stats["slots"] += 1
+                    stats["last_slot"] = slot
+                    stats["places"].add(place)
+
+        if bucket is None:
+            bucket = buckets[key] = set()
+            cotravel_state["slot_keys"][slot].append(key)
+        bucket.add(mac)
+
+def _advance_slot(slot):
+    """Buckets vergangener Slots freigeben (Log ist chronologisch)"""
+    max_slot = cotravel_state["max_slot"]
+    if max_slot is not None and slot <= max_slot:
+        return
+
+    cotravel_state["max_slot"] = slot
+    slot_keys = cotravel_state["slot_keys"]
+
+    # Vorherigen Slot für leicht verspätete Zeilen behalten
+    for old_slot in [s for s in slot_keys if s < slot - 1]:
+        for key in slot_keys.pop(old_slot):
+            cotravel_state["buckets"].pop(key, None)
+
+    pruned_slot = cotravel_state["pruned_slot"]
+    if pruned_slot is None:
+        cotravel_state["pruned_slot"] = slot
+    elif slot - pruned_slot >= COTRAVEL_PRUNE_EVERY_SLOTS:
+        _prune_pairs(slot)
+
+def _prune_pairs(slot):
+    """Paare unter der Schwelle ohne gemeinsamen Slot im Fenster verwerfen"""
+    cutoff = slot - COTRAVEL_PAIR_WINDOW_SLOTS
+    pairs = cotravel_state["pairs"]
+
+    stale = [
+        pair for pair, stats in pairs.items()
+        if stats["slots"] < COTRAVEL_MIN_SLOTS and stats["last_slot"] < cutoff
+    ]
+    for pair in stale:
+        del pairs[pair]
+
+    cotravel_state["pruned_slot"] = slot
+
+def _reset_pairs():
+    """Ingest-Listener: Zähler leeren (Log rotiert)"""
+    cotravel_state["buckets"] = {}
+    cotravel_state["slot_keys"] = defaultdict(list)
+    cotravel_state["max_slot"] = None
+    cotravel_state["pruned_slot"] = None
+    cotravel_state["pairs"] = {}
+
+# ========================= READS =========================
+
+def get_cotravel_pairs(min_slots=COTRAVEL_MIN_SLOTS, min_places=COTRAVEL_MIN_PLACES):
+    """
+    Paare oberhalb der Schwellwerte
+
+    Args:
+        min_slots: Mindestanzahl gemeinsamer Zeit-Slots (darunter nur Paare
+                   aus dem letzten COTRAVEL_PAIR_WINDOW_SLOTS-Fenster)
+        min_places: Mindestanzahl verschiedener Orte (~1 km Zellen)
+
+    Returns:
+        List[dict]: Paare, sortiert nach gemeinsamen Slots
+    """
+    with ingest_lock:
+        refresh()
+
+        result = []
+        for (mac_a, mac_b), stats in cotravel_state["pairs"].items():
+            if stats["slots"] < min_slots or len(stats["places"]) < min_places:
+                continue
+
+            result.append({
+                "mac_a": mac_a,
+                "mac_b": mac_b,
+                "shared_slots": stats["slots"],
+                "places": len(stats["places"]),
+                "first_epoch": stats["first_slot"] * COTRAVEL_SLOT_SECONDS,
+                "last_epoch": stats["last_slot"] * COTRAVEL_SLOT_SECONDS
+            })
+
+    result.sort(key=lambda p: (p["shared_slots"], p["places"]), reverse=True)
+    return result
+
+register_listener(_update_pairs, _reset_pairs)
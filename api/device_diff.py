@@ -0,0 +1,165 @@
+"""
+Device Diff
+===========
+
+Compare the devices seen in two time windows.
+
+Per calendar day the ingest pipeline maintains a bitmap of catalog rows
+seen that day. A window is the OR of its day bitmaps, so comparing two
+30-day windows is ~60 ORs plus a few ANDs over device ids instead of two
+full log scans.
+
+Windows have day granularity: a window covers every day from the day of
+"from" to the day of "to" (inclusive).
+"""
+
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from datetime import date, datetime
+from functools import lru_cache
+
+from api.ingest import register_listener, ingest_lock, refresh
+from api.catalog import catalog_state, bits_from_rows
+from api.utils import timestamp_to_epoch, parse_time_param
+
+# Max devices listed per group (counts are always complete)
+DIFF_MAX_LIMIT = 1000
+
+diff_state = {
+    "days": [],         # sorted day ordinals with sightings
+    "bits": {}          # {day ordinal: bits of catalog rows seen that day}
+}
+
+# ========================= INGEST =========================
+
+@lru_cache(maxsize=4096)
+def _day_of(epoch):
+    """Local calendar day (ordinal) of an epoch"""
+    return datetime.fromtimestamp(epoch).date().toordinal()
+
+def _index_entries(start_row, entries):
+    """Ingest listener: set the rows of new sightings in their day bitmaps"""
+    by_mac = catalog_state["by_mac"]
+    size = len(catalog_state["devices"])
+
+    rows_per_day = defaultdict(set)
+    for entry in entries:
+        epoch = timestamp_to_epoch(entry["timestamp"])
+        if epoch is not None:
+            rows_per_day[_day_of(epoch)].add(by_mac[entry["mac"]])
+
+    days, bits = diff_state["days"], diff_state["bits"]
+    for day, rows in rows_per_day.items():
+        if day not in bits:
+            days.insert(bisect_left(days, day), day)
+            bits[day] = 0
+        bits[day] |= bits_from_rows(rows, size)
+
+def _reset_diff():
+    """Ingest listener: drop all day bitmaps (log rotated)"""
+    diff_state["days"] = []
+    diff_state["bits"] = {}
+
+# ========================= QUERIES =========================
+
+def parse_window(value):
+    """
+    Window parameter "from,to" (epoch seconds or ISO dates)
+
+    Returns:
+        tuple | None: (first day, last day) as ordinals, None if invalid
+    """
+    parts = (value or "").split(",")
+    if len(parts) != 2:
+        return None
+
+    start, end = (parse_time_param(part.strip()) for part in parts)
+    if start is None or end is None or start > end:
+        return None
+
+    # Epochs outside the platform's datetime range
+    try:
+        return _day_of(start), _day_of(end)
+    except (OverflowError, ValueError, OSError):
+        return None
+
+def window_bits(first_day, last_day):
+    """Rows seen on any day of [first_day, last_day] (OR of the day bitmaps)"""
+    days, bits = diff_state["days"], diff_state["bits"]
+    result = 0
+    for day in days[bisect_left(days, first_day):bisect_right(days, last_day)]:
+        result |= bits[day]
+    return result
+
+def diff_windows(window_a, window_b, limit=100):
+    """
+    Devices only in A, only in B, in both, and returning
+
+    "returning" are devices of B that were absent during A but had been
+    seen before A started (a subset of only_b).
+
+    Args:
+        window_a: (first day, last day) ordinals, see parse_window
+        window_b: (first day, last day) ordinals
+        limit: Max devices listed per group (capped at DIFF_MAX_LIMIT)
+
+    Returns:
+        dict: {"a": {...}, "b": {...}, "only_a": {"count", "devices"},
+               "only_b": {...}, "both": {...}, "returning": {...}}
+    """
+    limit = max(0, min(limit, DIFF_MAX_LIMIT))
+
+    with ingest_lock:
+        refresh()
+        a = window_bits(*window_a)
+        b = window_bits(*window_b)
+        before_a = window_bits(date.min.toordinal(), window_a[0] - 1)
+
+        only_b = b & ~a
+        groups = {
+            "only_a": a & ~b,
+            "only_b": only_b,
+            "both": a & b,
+            "returning": only_b & before_a
+        }
+
+        devices = catalog_state["devices"]
+        result = {
+            "a": _window_info(window_a, a),
+            "b": _window_info(window_b, b)
+        }
+        for name, bits in groups.items():
+            result[name] = {
+                "count": bits.bit_count(),
+                "devices": [_device_summary(devices[row]) for row in _rows(bits, limit)]
+            }
+
+    return result
+
+def _window_info(window, bits):
+    return {
+        "from": date.fromordinal(window[0]).isoformat(),
+        "to": date.fromordinal(window[1]).isoformat(),
+        "devices": bits.bit_count()
+    }
+
+def _rows(bits, limit):
+    """First `limit` set bits (catalog rows in order of first sighting)"""
+    rows = []
+    while bits and len(rows) < limit:
+        low = bits & -bits
+        rows.append(low.bit_length() - 1)
+        bits ^= low
+    return rows
+
+def _device_summary(record):
+    return {
+        "mac": record["mac"],
+        "name": record["name"],
+        "manufacturer": record["manufacturer"],
+        "type": record["type"],
+        "first_seen": record["first_seen"],
+        "last_seen": record["last_seen"]
+    }
+
+register_listener(_index_entries, _reset_diff)
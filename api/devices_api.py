@@ -7,21 +7,43 @@ Device = Central entity (MAC address + metadata)
 """
 
 from collections import defaultdict
-from datetime import datetime, timedelta
+from datetime import datetime
+import re
+import time
 from api.utils import (
-    get_parsed_logs,
     filter_logs_by_time,
-    filter_logs_by_mac,
-    get_mac_statistics,
     is_valid_mac,
-    format_mac
+    format_mac,
+    iter_csv,
+    iter_ndjson
 )
-import json
-from pathlib import Path
+from api.catalog import (
+    get_catalog,
+    get_record,
+    get_sorted_page,
+    sort_key,
+    make_cursor,
+    parse_cursor,
+    device_status,
+    get_tags,
+    set_many_tags,
+    load_catalog_tags,
+    get_facet_index,
+    facet_counts,
+    bits_from_rows,
+    bits_test,
+    SORT_FIELDS,
+    detect_device_type
+)
+from api.search_index import candidate_rows, reindex_mac, reindex_all
+from api.ingest import snapshot, get_device_entries
+from api import tag_store
+from api import presence
+
+TIME_FILTER_HOURS = {"24h": 24, "7d": 24*7, "30d": 24*30}
 
-# Device Tags Storage
-BASE_DIR = Path(__file__).parent.parent
-TAGS_PATH = BASE_DIR / "device_tags.json"
+# First number in a raw line mentioning RSSI
+RSSI_PATTERN = re.compile(r'-?\d+')
 
 # ========================= DEVICE DIRECTORY =========================
 
@@ -34,11 +56,19 @@ def get_device_directory(
     status=None,
     search_query=None,
     sort_by="last_seen",
-    sort_order="desc"
+    sort_order="desc",
+    cursor=None,
+    tag=None
 ):
     """
     Paginated device directory with filters
     
+    Pages are read from the catalog's sorted indexes. Pass the returned
+    next_cursor to get the following page in O(page size) (keyset
+    pagination, stable while new sightings arrive); page is only used
+    without a cursor. Filters are ANDed facet bitmaps; "facets" holds
+    the counts per value for the current selection.
+    
     Args:
         page: Page number (1-based)
         limit: Items per page (max 100)
@@ -47,84 +77,111 @@ def get_device_directory(
         device_type: "smartphone", "headset", "wearable", "unknown"
         status: "online", "offline"
         search_query: Search in MAC/Name
+        tag: Filter by tag
         sort_by: "last_seen", "first_seen", "count", "name"
         sort_order: "asc", "desc"
+        cursor: Opaque token from a previous page's next_cursor
     
     Returns:
         dict: {
             "devices": [...],
-            "pagination": {...},
-            "filters_applied": {...}
+            "pagination": {..., "next_cursor": str | None},
+            "filters_applied": {...},
+            "facets": {"manufacturer": {...}, "type": {...}, "status": {...}, "tags": {...}}
         }
     """
-    logs = get_parsed_logs()
+    if sort_by not in SORT_FIELDS:
+        sort_by = "last_seen"
+    descending = (sort_order == "desc")
+    
+    after = None
+    if cursor:
+        after = parse_cursor(cursor, sort_by, descending)
+        if after is None:
+            return {"error": "Invalid cursor"}
+    
+    # One data version for records, bitmaps and index lookups
+    with snapshot():
+        return _build_directory(
+            page, limit, time_filter, manufacturer, device_type, status,
+            search_query, sort_by, descending, after, tag
+        )
+
+def _select_devices(time_filter, manufacturer, device_type, status, search_query, tag):
+    """
+    Filter selection as a catalog bitmap
     
-    # Apply time filter
-    if time_filter == "24h":
-        logs = filter_logs_by_time(logs, hours=24)
-    elif time_filter == "7d":
-        logs = filter_logs_by_time(logs, hours=24*7)
-    elif time_filter == "30d":
-        logs = filter_logs_by_time(logs, hours=24*30)
-    
-    # Get device statistics
-    stats = get_mac_statistics(logs)
-    
-    # Load tags
-    tags_db = load_tags()
-    
-    # Build device list
-    devices = []
-    for mac, data in stats.items():
-        # Apply filters
-        if search_query:
-            if search_query.lower() not in mac.lower() and \
-               search_query.lower() not in data["name"].lower():
-                continue
-        
-        # Manufacturer filter
-        if manufacturer:
-            device_manufacturer = lookup_oui(mac)
-            if manufacturer.lower() not in device_manufacturer.lower():
-                continue
-        
-        # Device type filter (heuristic)
-        if device_type:
-            detected_type = detect_device_type(data["name"], mac)
-            if device_type != detected_type:
-                continue
-        
-        # Status filter
-        if status:
-            device_status = get_device_status(data["last"])
-            if status != device_status:
-                continue
+    Returns:
+        tuple: (hours, records, now, index, selections, selected)
+    """
+    # Materialized device records (api.catalog)
+    hours = TIME_FILTER_HOURS.get(time_filter)
+    records = get_catalog(hours)
+    now = time.time()
+    if hours is None:
+        # Status bitmaps maintained by the presence engine
+        index = get_facet_index(now, status=presence.status_bits(now))
+    else:
+        index = get_facet_index(now, records)
+    
+    # Facet selections (None = not filtered)
+    selections = {
+        "manufacturer": None,
+        "type": index["type"].get(device_type, 0) if device_type else None,
+        "status": index["status"].get(status, 0) if status else None,
+        "tags": index["tags"].get(tag, 0) if tag else None,
+        "search": None
+    }
+    
+    if manufacturer:
+        selections["manufacturer"] = 0
+        for value, bits in index["manufacturer"].items():
+            if manufacturer.lower() in value.lower():
+                selections["manufacturer"] |= bits
+    
+    if search_query:
+        query_lower = search_query.lower()
         
-        # Build device object
-        device = {
-            "mac": mac,
-            "name": data["name"],
-            "manufacturer": lookup_oui(mac),
-            "type": detect_device_type(data["name"], mac),
-            "count": data["count"],
-            "first_seen": data["first"],
-            "last_seen": data["last"],
-            "status": get_device_status(data["last"]),
-            "positions": len(data["positions"]),
-            "tags": tags_db.get(mac, []),
-            "has_gps": len(data["positions"]) > 0
-        }
+        def search_match(record):
+            return query_lower in record["mac"].lower() or query_lower in record["name"].lower()
         
-        devices.append(device)
+        if hours is None:
+            # n-gram candidates (also match vendor/tags), verified on MAC/name
+            rows = (row for row in candidate_rows(search_query) if search_match(records[row]))
+        else:
+            rows = (record["row"] for record in records if search_match(record))
+        selections["search"] = bits_from_rows(rows, index["size"])
+    
+    selected = index["all"]
+    for bits in selections.values():
+        if bits is not None:
+            selected &= bits
     
-    # Sort
-    devices = sort_devices(devices, sort_by, sort_order)
+    return hours, records, now, index, selections, selected
+
+def _build_directory(page, limit, time_filter, manufacturer, device_type, status,
+                     search_query, sort_by, descending, after, tag):
+    """Directory page from catalog, facet bitmaps and sorted indexes"""
+    hours, records, now, index, selections, selected = _select_devices(
+        time_filter, manufacturer, device_type, status, search_query, tag
+    )
     
-    # Pagination
-    total = len(devices)
-    start = (page - 1) * limit
-    end = start + limit
-    paginated = devices[start:end]
+    # Totals over the whole selection
+    total = selected.bit_count()
+    online = (selected & index["status"]["online"]).bit_count()
+    with_gps = (selected & index["gps"]).bit_count()
+    
+    # Page from the sorted index
+    is_selected = bits_test(selected, index["size"])
+    offset = 0 if after is not None else (page - 1) * limit
+    page_records, next_key = get_sorted_page(
+        sort_by, descending, limit,
+        after=after,
+        offset=offset,
+        predicate=lambda record: is_selected(record["row"]),
+        records=records if hours is not None else None
+    )
+    paginated = [_device_from_record(record, device_status(record, now)) for record in page_records]
     
     return {
         "devices": paginated,
@@ -133,102 +190,188 @@ def get_device_directory(
             "limit": limit,
             "total": total,
             "pages": (total + limit - 1) // limit,
-            "has_next": end < total,
-            "has_prev": page > 1
+            "has_next": next_key is not None,
+            "has_prev": after is not None or page > 1,
+            "next_cursor": make_cursor(sort_by, descending, next_key) if next_key else None
         },
         "filters_applied": {
             "time_filter": time_filter,
             "manufacturer": manufacturer,
             "device_type": device_type,
             "status": status,
-            "search_query": search_query
+            "search_query": search_query,
+            "tag": tag
         },
         "stats": {
             "total_devices": total,
-            "online": len([d for d in devices if d["status"] == "online"]),
-            "with_gps": len([d for d in devices if d["has_gps"]])
-        }
+            "online": online,
+            "with_gps": with_gps
+        },
+        "facets": facet_counts(index, selections)
     }
 
 # ========================= DEVICE DETAILS =========================
 
-def get_device_details(mac):
+# Optional sections of the detail view (header fields are always returned)
+DETAIL_FIELDS = ("statistics", "positions", "rssi_timeline", "sessions", "recent_logs")
+
+# Sub-resource -> default number of (most recent) items
+DEVICE_RESOURCES = {"positions": 50, "rssi": 100, "sessions": 10, "logs": 20}
+
+def get_device_details(mac, fields=None):
     """
     Detailed view of a single device
     
+    The header (mac, name, manufacturer, type, tags) comes from the
+    catalog and the first posting; each optional section is computed only
+    when requested.
+    
     Args:
         mac: MAC address
+        fields: Iterable of DETAIL_FIELDS (None = all)
     
     Returns:
-        dict: Complete device info with history
+        dict: Device header plus the requested sections
     """
     # Validate MAC
     if not is_valid_mac(mac):
         return {"error": "Invalid MAC address"}
     
+    if fields is None:
+        fields = DETAIL_FIELDS
+    unknown = [field for field in fields if field not in DETAIL_FIELDS]
+    if unknown:
+        return {"error": f"Unknown fields: {', '.join(unknown)}"}
+    
     mac = format_mac(mac)
     
-    logs = get_parsed_logs()
-    device_logs = filter_logs_by_mac(logs, mac)
+    with snapshot():
+        record = get_record(mac)
+        if record is None:
+            return {"error": "Device not found"}
+        
+        first_name = get_device_entries(mac, first=1)[0]["name"]
+        result = {
+            "mac": mac,
+            "name": first_name,
+            "manufacturer": record["manufacturer"],
+            "type": detect_device_type(first_name, mac),
+            "tags": get_tags(mac)
+        }
+        
+        # Full posting list only for sections that scan all sightings
+        device_logs = None
+        if {"statistics", "rssi_timeline", "sessions"} & set(fields):
+            device_logs = get_device_entries(mac)
+        
+        sections = {}
+        if "statistics" in fields or "rssi_timeline" in fields:
+            sections["rssi"] = _rssi_values(device_logs)
+        if "statistics" in fields or "sessions" in fields:
+            sections["sessions"] = detect_sessions(device_logs)
+        
+        if "statistics" in fields:
+            result["statistics"] = {
+                "total_scans": record["count"],
+                "first_seen": record["first_seen"],
+                "last_seen": record["last_seen"],
+                "positions_count": record["gps_count"],
+                "rssi_samples": len(sections["rssi"]),
+                "sessions": len(sections["sessions"]),
+                "status": presence.status_of(mac)
+            }
+        if "positions" in fields:
+            result["positions"] = _positions(
+                device_logs or get_device_entries(mac), DEVICE_RESOURCES["positions"]
+            )
+        if "rssi_timeline" in fields:
+            result["rssi_timeline"] = sections["rssi"][-DEVICE_RESOURCES["rssi"]:]
+        if "sessions" in fields:
+            result["sessions"] = sections["sessions"][-DEVICE_RESOURCES["sessions"]:]
+        if "recent_logs" in fields:
+            result["recent_logs"] = get_device_entries(mac, last=DEVICE_RESOURCES["logs"])
+    
+    return result
+
+def get_device_resource(mac, resource, limit=None):
+    """
+    One sub-resource of a device (positions, RSSI, sessions or logs)
+    
+    Args:
+        mac: MAC address
+        resource: Key of DEVICE_RESOURCES
+        limit: Most recent N items (None = resource default, 0 = all)
     
-    if not device_logs:
-        return {"error": "Device not found"}
+    Returns:
+        dict: {"mac", "resource", "items": [...], "total": int}
+    """
+    if resource not in DEVICE_RESOURCES:
+        return {"error": f"Unknown resource: {resource}"}
+    if not is_valid_mac(mac):
+        return {"error": "Invalid MAC address"}
     
-    # Load tags
-    tags_db = load_tags()
+    mac = format_mac(mac)
+    if limit is None:
+        limit = DEVICE_RESOURCES[resource]
     
-    # Build statistics
-    positions = []
-    rssi_values = []
+    device_logs = get_device_entries(mac)
+    if not device_logs:
+        return {"error": "Device not found"}
     
-    for log in device_logs:
-        if log.get("lat") and log.get("lon"):
-            positions.append({
-                "lat": log["lat"],
-                "lon": log["lon"],
-                "timestamp": log["timestamp"]
-            })
-        
-        # Try to extract RSSI (if available in raw)
-        raw = log.get("raw", "")
-        if "RSSI" in raw or "rssi" in raw:
-            try:
-                import re
-                match = re.search(r'-?\d+', raw)
-                if match:
-                    rssi = int(match.group())
-                    if -120 <= rssi <= 0:
-                        rssi_values.append({
-                            "value": rssi,
-                            "timestamp": log["timestamp"]
-                        })
-            except:
-                pass
-    
-    # Calculate session info
-    sessions = detect_sessions(device_logs)
+    if resource == "positions":
+        items = _positions(device_logs)
+    elif resource == "rssi":
+        items = _rssi_values(device_logs)
+    elif resource == "sessions":
+        items = detect_sessions(device_logs)
+    else:
+        items = device_logs
     
     return {
         "mac": mac,
-        "name": device_logs[0]["name"],
-        "manufacturer": lookup_oui(mac),
-        "type": detect_device_type(device_logs[0]["name"], mac),
-        "tags": tags_db.get(mac, []),
-        "statistics": {
-            "total_scans": len(device_logs),
-            "first_seen": device_logs[0]["timestamp"],
-            "last_seen": device_logs[-1]["timestamp"],
-            "positions_count": len(positions),
-            "rssi_samples": len(rssi_values),
-            "sessions": len(sessions),
-            "status": get_device_status(device_logs[-1]["timestamp"])
-        },
-        "positions": positions[-50:] if len(positions) > 50 else positions,  # Last 50
-        "rssi_timeline": rssi_values[-100:] if len(rssi_values) > 100 else rssi_values,  # Last 100
-        "sessions": sessions[-10:] if len(sessions) > 10 else sessions,  # Last 10
-        "recent_logs": device_logs[-20:] if len(device_logs) > 20 else device_logs  # Last 20
+        "resource": resource,
+        "items": items[-limit:] if limit else items,
+        "total": len(items)
     }
 
+def _positions(device_logs, limit=None):
+    """GPS positions in log order (limit = most recent N, scanned from the end)"""
+    if limit:
+        positions = []
+        for log in reversed(device_logs):
+            if log.get("lat") and log.get("lon"):
+                positions.append({"lat": log["lat"], "lon": log["lon"], "timestamp": log["timestamp"]})
+                if len(positions) == limit:
+                    break
+        positions.reverse()
+        return positions
+    
+    return [
+        {"lat": log["lat"], "lon": log["lon"], "timestamp": log["timestamp"]}
+        for log in device_logs
+        if log.get("lat") and log.get("lon")
+    ]
+
+def _rssi_values(device_logs):
+    """RSSI samples [{"value", "timestamp"}, ...] from the raw log lines"""
+    rssi_values = []
+    for log in device_logs:
+        rssi = _extract_rssi(log)
+        if rssi is not None:
+            rssi_values.append({"value": rssi, "timestamp": log["timestamp"]})
+    return rssi_values
+
+def _extract_rssi(log):
+    """RSSI of a sighting (if available in raw), None otherwise"""
+    raw = log.get("raw", "")
+    if "RSSI" in raw or "rssi" in raw:
+        match = RSSI_PATTERN.search(raw)
+        if match:
+            rssi = int(match.group())
+            if -120 <= rssi <= 0:
+                return rssi
+    return None
+
 # ========================= DEVICE TIMELINE =========================
 
 def get_device_timeline(mac, timerange="24h"):
@@ -247,8 +390,7 @@ def get_device_timeline(mac, timerange="24h"):
     
     mac = format_mac(mac)
     
-    logs = get_parsed_logs()
-    device_logs = filter_logs_by_mac(logs, mac)
+    device_logs = get_device_entries(mac)
     
     # Apply time filter
     if timerange == "1h":
@@ -291,19 +433,11 @@ def get_device_timeline(mac, timerange="24h"):
             positions_count += 1
         
         # RSSI
-        raw = log.get("raw", "")
-        if "RSSI" in raw or "rssi" in raw:
-            try:
-                import re
-                match = re.search(r'-?\d+', raw)
-                if match:
-                    rssi = int(match.group())
-                    if -120 <= rssi <= 0:
-                        point["rssi"] = rssi
-                        rssi_sum += rssi
-                        rssi_count += 1
-            except:
-                pass
+        rssi = _extract_rssi(log)
+        if rssi is not None:
+            point["rssi"] = rssi
+            rssi_sum += rssi
+            rssi_count += 1
         
         timeline.append(point)
     
@@ -331,46 +465,55 @@ def search_devices(query, limit=20):
     Returns:
         dict: Search results
     """
-    logs = get_parsed_logs()
-    stats = get_mac_statistics(logs)
-    tags_db = load_tags()
-    
     query_lower = query.lower()
-    results = []
+    matches = []
+    
+    # Candidates from the n-gram index (api.search_index); the snapshot keeps
+    # row ids and catalog on the same data version
+    with snapshot():
+        rows = candidate_rows(query)
+        records = get_catalog()
+        for row in sorted(rows):
+            record = records[row]
+            mac = record["mac"]
+            tags = get_tags(mac)
+            
+            # Search in MAC
+            if query_lower in mac.lower():
+                match_field = "mac"
+            # Search in name
+            elif query_lower in record["name"].lower():
+                match_field = "name"
+            # Search in manufacturer
+            elif query_lower in record["manufacturer"].lower():
+                match_field = "manufacturer"
+            # Search in tags
+            elif any(query_lower in tag.lower() for tag in tags):
+                match_field = "tags"
+            else:
+                continue
+            
+            matches.append((sort_key("last_seen", record), record, match_field, tags))
     
-    for mac, data in stats.items():
-        # Search in MAC
-        if query_lower in mac.lower():
-            match_field = "mac"
-        # Search in name
-        elif query_lower in data["name"].lower():
-            match_field = "name"
-        # Search in manufacturer
-        elif query_lower in lookup_oui(mac).lower():
-            match_field = "manufacturer"
-        # Search in tags
-        elif any(query_lower in tag.lower() for tag in tags_db.get(mac, [])):
-            match_field = "tags"
-        else:
-            continue
-        
+    # Sort by last_seen (chronological)
+    matches.sort(key=lambda m: m[0], reverse=True)
+    
+    results = []
+    for _, record, match_field, tags in matches[:limit]:
         results.append({
-            "mac": mac,
-            "name": data["name"],
-            "manufacturer": lookup_oui(mac),
-            "count": data["count"],
-            "last_seen": data["last"],
+            "mac": record["mac"],
+            "name": record["name"],
+            "manufacturer": record["manufacturer"],
+            "count": record["count"],
+            "last_seen": record["last_seen"],
             "match_field": match_field,
-            "tags": tags_db.get(mac, [])
+            "tags": tags
         })
     
-    # Sort by last_seen
-    results.sort(key=lambda x: x["last_seen"], reverse=True)
-    
     return {
         "query": query,
-        "results": results[:limit],
-        "total": len(results)
+        "results": results,
+        "total": len(matches)
     }
 
 # ========================= DEVICE TAGGING =========================
@@ -395,14 +538,11 @@ def tag_device(mac, tags):
     if not isinstance(tags, list):
         return {"success": False, "error": "Tags must be a list"}
     
-    # Load existing tags
-    tags_db = load_tags()
+    if not all(isinstance(tag, str) for tag in tags):
+        return {"success": False, "error": "Tags must be strings"}
     
-    # Update tags
-    tags_db[mac] = tags
-    
-    # Save
-    save_tags(tags_db)
+    # Update tags (api.tag_store, one transaction)
+    tags = tag_store.set_tags(mac, tags, on_change=_mirror_tags)
     
     return {
         "success": True,
@@ -416,11 +556,10 @@ def get_device_tags(mac):
         return {"error": "Invalid MAC address"}
     
     mac = format_mac(mac)
-    tags_db = load_tags()
     
     return {
         "mac": mac,
-        "tags": tags_db.get(mac, [])
+        "tags": tag_store.get_tags(mac)
     }
 
 def remove_device_tags(mac):
@@ -429,57 +568,89 @@ def remove_device_tags(mac):
         return {"success": False, "error": "Invalid MAC address"}
     
     mac = format_mac(mac)
-    tags_db = load_tags()
     
-    if mac in tags_db:
-        del tags_db[mac]
-        save_tags(tags_db)
+    tag_store.remove_tags(mac, on_change=_mirror_tags)
     
     return {
         "success": True,
         "mac": mac
     }
 
+def bulk_tag_devices(macs, tags, action="add"):
+    """
+    Tag or untag many devices in one request
+    
+    Args:
+        macs: List of MAC addresses
+        tags: List of tag strings (ignored for "clear")
+        action: "add", "remove", "set" or "clear"
+    
+    Returns:
+        dict: {
+            "success": bool,
+            "action": str,
+            "updated": int,          # devices whose tags changed
+            "invalid_macs": [...]
+        }
+    """
+    if action not in tag_store.BULK_ACTIONS:
+        return {"success": False, "error": f"Action must be one of {', '.join(tag_store.BULK_ACTIONS)}"}
+    
+    if not isinstance(macs, list):
+        return {"success": False, "error": "MACs must be a list"}
+    
+    if tags is None:
+        tags = []
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        return {"success": False, "error": "Tags must be a list of strings"}
+    
+    valid = []
+    invalid = []
+    for mac in macs:
+        if isinstance(mac, str) and is_valid_mac(mac):
+            valid.append(format_mac(mac))
+        else:
+            invalid.append(mac)
+    
+    _, changed = tag_store.bulk_update(valid, tags, action, on_change=_mirror_tags)
+    
+    return {
+        "success": True,
+        "action": action,
+        "updated": len(changed),
+        "invalid_macs": invalid
+    }
+
+def _mirror_tags(changes):
+    """Propagate tag changes to the catalog bitmaps and the search index"""
+    set_many_tags(changes)
+    for mac in changes:
+        reindex_mac(mac)
+
 # ========================= DEVICE EXPORT =========================
 
+# CSV columns of the device export
+EXPORT_FIELDS = ["mac", "name", "manufacturer", "type", "count", "first_seen",
+                 "last_seen", "status", "positions", "tags"]
+
 def export_devices(format_type="json", time_filter=None, filters=None):
     """
-    Export device directory
+    Export device directory (all matching devices, no size cap)
     
     Args:
-        format_type: "json" or "csv"
+        format_type: "json", "csv" or "ndjson"
         time_filter: None, "24h", "7d", "30d"
         filters: Additional filters dict
     
     Returns:
-        dict: Export data
+        dict: Export data ("data" is a str for csv/ndjson)
     """
-    # Get directory (all devices, no pagination)
-    directory = get_device_directory(
-        page=1,
-        limit=10000,  # Large limit
-        time_filter=time_filter,
-        manufacturer=filters.get("manufacturer") if filters else None,
-        device_type=filters.get("device_type") if filters else None,
-        status=filters.get("status") if filters else None
-    )
-    
-    devices = directory["devices"]
+    devices = list(iter_export_devices(time_filter, filters))
     
-    if format_type == "csv":
-        # CSV format
-        csv_lines = ["mac,name,manufacturer,type,count,first_seen,last_seen,status,positions,tags"]
-        for device in devices:
-            tags_str = "|".join(device["tags"]) if device["tags"] else ""
-            csv_lines.append(
-                f"{device['mac']},{device['name']},{device['manufacturer']},"
-                f"{device['type']},{device['count']},{device['first_seen']},"
-                f"{device['last_seen']},{device['status']},{device['positions']},{tags_str}"
-            )
-        
+    if format_type in ("csv", "ndjson"):
         return {
-            "format": "csv",
-            "data": "\n".join(csv_lines),
+            "format": format_type,
+            "data": "".join(_serialize_devices(devices, format_type)),
             "count": len(devices)
         }
     
@@ -491,78 +662,60 @@ def export_devices(format_type="json", time_filter=None, filters=None):
         "exported_at": datetime.now().isoformat()
     }
 
-# ========================= HELPER FUNCTIONS =========================
-
-def lookup_oui(mac):
-    """Lookup manufacturer from MAC (OUI)"""
-    oui = mac[:8].upper()
-    
-    # Simple OUI database (can be extended)
-    oui_db = {
-        "00:03:93": "Apple", "00:05:02": "Apple", "00:0A:27": "Apple",
-        "0C:47:C9": "Samsung", "10:08:B1": "Samsung", "14:49:E0": "Samsung",
-        "00:0C:F1": "Intel", "00:13:E0": "Intel", "00:15:00": "Intel",
-        "00:50:F2": "Microsoft", "08:00:27": "VirtualBox",
-        "00:1B:63": "Apple", "00:25:00": "Apple", "3C:BD:D8": "Samsung"
-    }
-    
-    return oui_db.get(oui, "Unknown")
-
-def detect_device_type(name, mac):
-    """Heuristic device type detection"""
-    name_lower = name.lower()
-    
-    # Smartphone indicators
-    if any(x in name_lower for x in ["iphone", "galaxy", "pixel", "oneplus", "xiaomi", "huawei"]):
-        return "smartphone"
+def stream_export_devices(format_type="csv", time_filter=None, filters=None):
+    """
+    Device export as a text stream (for generator responses)
     
-    # Headset indicators
-    if any(x in name_lower for x in ["airpods", "buds", "headset", "earbuds", "headphone"]):
-        return "headset"
+    Args:
+        format_type: "csv" or "ndjson"
+        time_filter: None, "24h", "7d", "30d"
+        filters: Additional filters dict
     
-    # Wearable indicators
-    if any(x in name_lower for x in ["watch", "band", "fit", "tracker"]):
-        return "wearable"
+    Returns:
+        Iterator[str]: Export chunks, CSV header first
+    """
+    return _serialize_devices(iter_export_devices(time_filter, filters), format_type)
+
+def _serialize_devices(devices, format_type):
+    """CSV (tags joined with "|") or NDJSON chunks"""
+    if format_type == "csv":
+        rows = (dict(device, tags="|".join(device["tags"])) for device in devices)
+        return iter_csv(rows, EXPORT_FIELDS)
     
-    # Laptop indicators
-    if any(x in name_lower for x in ["macbook", "laptop", "thinkpad"]):
-        return "laptop"
+    return iter_ndjson(devices)
+
+def iter_export_devices(time_filter=None, filters=None):
+    """
+    All devices matching the filters, most recently seen first
     
-    # IoT indicators
-    if any(x in name_lower for x in ["sensor", "beacon", "tag", "tracker"]):
-        return "iot"
+    The selection is resolved once against a consistent snapshot; entries
+    are built one at a time while the caller consumes them.
     
-    return "unknown"
+    Yields:
+        dict: Directory entry
+    """
+    filters = filters or {}
+    
+    with snapshot():
+        hours, records, now, index, _, selected = _select_devices(
+            time_filter,
+            filters.get("manufacturer"),
+            filters.get("device_type"),
+            filters.get("status"),
+            filters.get("search_query"),
+            filters.get("tag")
+        )
+        is_selected = bits_test(selected, index["size"])
+        ordered, _ = get_sorted_page(
+            "last_seen", True, selected.bit_count(),
+            predicate=lambda record: is_selected(record["row"]),
+            records=records if hours is not None else None
+        )
+    
+    for record in ordered:
+        yield _device_from_record(record, device_status(record, now))
 
-def get_device_status(last_seen_timestamp):
-    """Determine if device is online/offline"""
-    try:
-        # Parse timestamp (format: "14 OCT 1230")
-        parts = last_seen_timestamp.split()
-        day = int(parts[0])
-        month_str = parts[1]
-        time_str = parts[2]
-        
-        months = {"JAN": 1, "FEB": 2, "MAR": 3, "APR": 4, "MAY": 5, "JUN": 6,
-                 "JUL": 7, "AUG": 8, "SEP": 9, "OCT": 10, "NOV": 11, "DEC": 12}
-        month = months.get(month_str, 10)
-        
-        hour = int(time_str[:2])
-        minute = int(time_str[2:4])
-        
-        year = datetime.now().year
-        last_seen = datetime(year, month, day, hour, minute)
-        
-        # Online if seen within last hour
-        now = datetime.now()
-        diff = (now - last_seen).total_seconds()
-        
-        if diff < 3600:  # 1 hour
-            return "online"
-        else:
-            return "offline"
-    except:
-        return "unknown"
+# ========================= HELPER FUNCTIONS =========================
 
 def detect_sessions(logs):
     """
@@ -601,35 +754,21 @@ def detect_sessions(logs):
     
     return sessions
 
-def sort_devices(devices, sort_by, sort_order):
-    """Sort device list"""
-    reverse = (sort_order == "desc")
-    
-    if sort_by == "last_seen":
-        devices.sort(key=lambda d: d["last_seen"], reverse=reverse)
-    elif sort_by == "first_seen":
-        devices.sort(key=lambda d: d["first_seen"], reverse=reverse)
-    elif sort_by == "count":
-        devices.sort(key=lambda d: d["count"], reverse=reverse)
-    elif sort_by == "name":
-        devices.sort(key=lambda d: d["name"].lower(), reverse=reverse)
-    
-    return devices
-
-# ========================= TAGS STORAGE =========================
-
-def load_tags():
-    """Load tags from JSON file"""
-    if TAGS_PATH.exists():
-        try:
-            return json.loads(TAGS_PATH.read_text())
-        except:
-            return {}
-    return {}
-
-def save_tags(tags_db):
-    """Save tags to JSON file"""
-    TAGS_PATH.write_text(json.dumps(tags_db, indent=2))
+def _device_from_record(record, status):
+    """Directory entry from a catalog record"""
+    return {
+        "mac": record["mac"],
+        "name": record["name"],
+        "manufacturer": record["manufacturer"],
+        "type": record["type"],
+        "count": record["count"],
+        "first_seen": record["first_seen"],
+        "last_seen": record["last_seen"],
+        "status": status,
+        "positions": record["gps_count"],
+        "tags": get_tags(record["mac"]),
+        "has_gps": record["gps_count"] > 0
+    }
 
 # ========================= AGGREGATIONS =========================
 
@@ -640,32 +779,26 @@ def get_device_aggregations():
     Returns:
         dict: Aggregated stats
     """
-    logs = get_parsed_logs()
-    stats = get_mac_statistics(logs)
+    with snapshot():
+        records = get_catalog()
+        status_counts = presence.status_counts()
     
-    # Count by manufacturer
     manufacturer_counts = defaultdict(int)
-    for mac in stats.keys():
-        manufacturer = lookup_oui(mac)
-        manufacturer_counts[manufacturer] += 1
-    
-    # Count by type
     type_counts = defaultdict(int)
-    for mac, data in stats.items():
-        device_type = detect_device_type(data["name"], mac)
-        type_counts[device_type] += 1
     
-    # Count by status
-    status_counts = defaultdict(int)
-    for data in stats.values():
-        status = get_device_status(data["last"])
-        status_counts[status] += 1
+    for record in records:
+        manufacturer_counts[record["manufacturer"]] += 1
+        type_counts[record["type"]] += 1
     
     return {
-        "total_devices": len(stats),
+        "total_devices": len(records),
         "by_manufacturer": dict(sorted(manufacturer_counts.items(), key=lambda x: x[1], reverse=True)[:10]),
         "by_type": dict(type_counts),
-        "by_status": dict(status_counts),
-        "with_gps": len([d for d in stats.values() if len(d["positions"]) > 0]),
-        "tagged": len(load_tags())
+        # Live presence counters (statuses without devices are left out)
+        "by_status": {status: count for status, count in status_counts.items() if count},
+        "with_gps": len([r for r in records if r["gps_count"] > 0]),
+        "tagged": tag_store.tagged_count()
     }
+
+load_catalog_tags(tag_store.get_all_tags())
+reindex_all()
@@ -0,0 +1,403 @@
+"""
+Geodesy
+=======
+
+Vektorisierte Track-Metriken (Distanzen, Peilungen, Geschwindigkeiten,
+Bounding-Box), Ausreißer-Filter und Track-Vereinfachung (Douglas-Peucker)
+NumPy wenn verfügbar, sonst skalarer Fallback mit identischen Ergebnissen
+"""
+
+from math import radians, degrees, sin, cos, sqrt, atan2, inf
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+EARTH_RADIUS_KM = 6371
+
+# Plausibilität: schneller als ~300 km/h = GPS-Sprung
+MAX_SPEED_KMH = 300
+
+# Timestamps haben Minuten-Auflösung -> Segmente dauern mindestens 60s
+MIN_SEGMENT_SECONDS = 60
+
+# Nach so vielen verworfenen Fixes in Folge gilt die neue Position als echt
+OUTLIER_RESET = 3
+
+# ========================= SEGMENTS =========================
+
+def segment_distances(lats, lons):
+    """
+    Haversine-Distanz zwischen aufeinanderfolgenden Punkten (km)
+
+    Args:
+        lats, lons: Sequenzen gleicher Länge
+
+    Returns:
+        List[float]: n-1 Segment-Distanzen
+    """
+    if len(lats) < 2:
+        return []
+
+    if NUMPY_AVAILABLE:
+        return _segments_np(np.asarray(lats, dtype=float), np.asarray(lons, dtype=float)).tolist()
+
+    return [
+        _haversine(lats[i], lons[i], lats[i + 1], lons[i + 1])
+        for i in range(len(lats) - 1)
+    ]
+
+def segment_bearings(lats, lons):
+    """
+    Anfangs-Peilung je Segment (Grad, 0 = Nord, im Uhrzeigersinn)
+
+    Returns:
+        List[float]: n-1 Peilungen
+    """
+    if len(lats) < 2:
+        return []
+
+    if NUMPY_AVAILABLE:
+        lat = np.radians(np.asarray(lats, dtype=float))
+        lon = np.radians(np.asarray(lons, dtype=float))
+        dlon = lon[1:] - lon[:-1]
+        y = np.sin(dlon) * np.cos(lat[1:])
+        x = np.cos(lat[:-1]) * np.sin(lat[1:]) - np.sin(lat[:-1]) * np.cos(lat[1:]) * np.cos(dlon)
+        return ((np.degrees(np.arctan2(y, x)) + 360) % 360).tolist()
+
+    bearings = []
+    for i in range(len(lats) - 1):
+        lat1, lat2 = radians(lats[i]), radians(lats[i + 1])
+        dlon = radians(lons[i + 1] - lons[i])
+        y = sin(dlon) * cos(lat2)
+        x = cos(lat1) * sin(lat2) - sin(lat1) * cos(lat2) * cos(dlon)
+        bearings.append((degrees(atan2(y, x)) + 360) % 360)
+    return bearings
+
+def segment_seconds(epochs):
+    """
+    Dauer je Segment (Sekunden, mindestens MIN_SEGMENT_SECONDS)
+
+    Returns:
+        List[float]: n-1 Dauern
+    """
+    if len(epochs) < 2:
+        return []
+
+    if NUMPY_AVAILABLE:
+        epoch = np.asarray(epochs, dtype=float)
+        return np.maximum(epoch[1:] - epoch[:-1], MIN_SEGMENT_SECONDS).tolist()
+
+    return [
+        max(epochs[i + 1] - epochs[i], MIN_SEGMENT_SECONDS)
+        for i in range(len(epochs) - 1)
+    ]
+
+def segment_speeds(lats, lons, epochs):
+    """
+    Geschwindigkeit je Segment (km/h)
+
+    Args:
+        lats, lons: Punkte in Track-Reihenfolge
+        epochs: Epoch-Sekunden je Punkt
+
+    Returns:
+        List[float]: n-1 Geschwindigkeiten
+    """
+    if len(lats) < 2:
+        return []
+
+    if NUMPY_AVAILABLE:
+        distances = _segments_np(np.asarray(lats, dtype=float), np.asarray(lons, dtype=float))
+        seconds = np.asarray(segment_seconds(epochs))
+        return (distances / seconds * 3600).tolist()
+
+    return [
+        speed_kmh(dist, seconds)
+        for dist, seconds in zip(segment_distances(lats, lons), segment_seconds(epochs))
+    ]
+
+def speed_kmh(distance_km, seconds):
+    """Geschwindigkeit eines Segments (Dauer nach unten begrenzt)"""
+    return distance_km / max(seconds, MIN_SEGMENT_SECONDS) * 3600
+
+# ========================= OUTLIERS =========================
+
+def reject_outliers(lats, lons, epochs):
+    """
+    GPS-Sprünge entfernen
+
+    Ein Fix wird verworfen, wenn er vom letzten akzeptierten Fix aus nur
+    mit mehr als MAX_SPEED_KMH erreichbar wäre. Nach OUTLIER_RESET
+    verworfenen Fixes in Folge wird der Fix übernommen (Gerät hat sich
+    tatsächlich versetzt, z. B. nach einer Lücke im Log).
+
+    Args:
+        lats, lons: Punkte in Track-Reihenfolge
+        epochs: Epoch-Sekunden je Punkt
+
+    Returns:
+        List[int]: Indizes der akzeptierten Punkte (aufsteigend)
+    """
+    n = len(lats)
+    if n < 2:
+        return list(range(n))
+
+    # Schneller Pfad: keine Segmente über dem Limit
+    speeds = segment_speeds(lats, lons, epochs)
+    if max(speeds) <= MAX_SPEED_KMH:
+        return list(range(n))
+
+    kept = [0]
+    streak = 0
+    for i in range(1, n):
+        last = kept[-1]
+        dist = _haversine(lats[last], lons[last], lats[i], lons[i])
+        if speed_kmh(dist, epochs[i] - epochs[last]) > MAX_SPEED_KMH and streak + 1 < OUTLIER_RESET:
+            streak += 1
+            continue
+        kept.append(i)
+        streak = 0
+
+    return kept
+
+# ========================= TRACKS =========================
+
+def track_metrics(lats, lons, epochs=None):
+    """
+    Alle Metriken eines Tracks in einem Durchlauf
+
+    Args:
+        lats, lons: Punkte in Track-Reihenfolge
+        epochs: Optional Epoch-Sekunden je Punkt (für Geschwindigkeiten)
+
+    Returns:
+        dict: {
+            "segments_km": [float],
+            "cumulative_km": [float],   # pro Punkt, beginnt bei 0
+            "bearings": [float],
+            "total_km": float,
+            "bounds": {"min_lat", "max_lat", "min_lon", "max_lon"} | None,
+            "speeds_kmh": [float] | None,
+            "max_speed_kmh": float | None,
+            "avg_speed_kmh": float | None
+        }
+    """
+    segments = segment_distances(lats, lons)
+
+    speeds = max_speed = avg_speed = None
+    if epochs is not None and segments:
+        segments, speeds, elapsed = _drop_jumps(segments, epochs)
+
+        max_speed = max(speeds)
+        avg_speed = sum(segments) / elapsed * 3600 if elapsed > 0 else 0.0
+
+    cumulative = [0.0] * len(lats)
+    running = 0.0
+    for i, dist in enumerate(segments):
+        running += dist
+        cumulative[i + 1] = running
+
+    return {
+        "segments_km": segments,
+        "cumulative_km": cumulative,
+        "bearings": segment_bearings(lats, lons),
+        "total_km": running,
+        "bounds": track_bounds(lats, lons),
+        "speeds_kmh": speeds,
+        "max_speed_kmh": max_speed,
+        "avg_speed_kmh": avg_speed
+    }
+
+def track_bounds(lats, lons):
+    """Bounding-Box eines Tracks (None wenn leer)"""
+    if not len(lats):
+        return None
+
+    if NUMPY_AVAILABLE:
+        lat = np.asarray(lats, dtype=float)
+        lon = np.asarray(lons, dtype=float)
+        return {
+            "min_lat": float(lat.min()),
+            "max_lat": float(lat.max()),
+            "min_lon": float(lon.min()),
+            "max_lon": float(lon.max())
+        }
+
+    return {
+        "min_lat": min(lats),
+        "max_lat": max(lats),
+        "min_lon": min(lons),
+        "max_lon": max(lons)
+    }
+
+# ========================= SIMPLIFICATION =========================
+
+def simplification_ranks(lats, lons):
+    """
+    Douglas-Peucker-Rang je Punkt (Meter)
+
+    Einmal vollständig berechnet, liefert der Rang jede Vereinfachungsstufe:
+    Ein Punkt bleibt bei Toleranz t genau dann erhalten, wenn rank > t.
+    Der Rang ist auf den Rang des Eltern-Splits begrenzt, dadurch sind die
+    Stufen verschachtelt und identisch mit Douglas-Peucker bei Toleranz t.
+
+    Args:
+        lats, lons: Punkte in Track-Reihenfolge
+
+    Returns:
+        List[float]: Rang je Punkt (Endpunkte = inf)
+    """
+    n = len(lats)
+    ranks = [inf] * n
+    if n <= 2:
+        return ranks
+
+    xs, ys = _project(lats, lons)
+
+    stack = [(0, n - 1, inf)]
+    while stack:
+        first, last, parent = stack.pop()
+        if last - first < 2:
+            continue
+
+        index, dist = _farthest_point(xs, ys, first, last)
+        rank = min(dist, parent)
+        ranks[index] = rank
+
+        stack.append((first, index, rank))
+        stack.append((index, last, rank))
+
+    return ranks
+
+def simplify_indices(ranks, tolerance_m):
+    """
+    Indizes der Punkte, die bei gegebener Toleranz erhalten bleiben
+
+    Args:
+        ranks: Ergebnis von simplification_ranks()
+        tolerance_m: Maximale Abweichung in Metern
+
+    Returns:
+        List[int]: Punkt-Indizes (aufsteigend)
+    """
+    return [i for i, rank in enumerate(ranks) if rank > tolerance_m]
+
+def zoom_tolerance(zoom, lat, pixels=1.0):
+    """
+    Toleranz (Meter) für eine Karten-Zoomstufe
+
+    Args:
+        zoom: Web-Mercator Zoom
+        lat: Referenz-Breite (Maßstab)
+        pixels: Erlaubte Abweichung in Bildschirm-Pixeln
+
+    Returns:
+        float: Toleranz in Metern
+    """
+    meters_per_pixel = 156543.03392 * cos(radians(lat)) / (2 ** zoom)
+    return meters_per_pixel * pixels
+
+# ========================= INTERNALS =========================
+
+def _project(lats, lons):
+    """Äquirektanguläre Projektion (Meter) um die mittlere Breite"""
+    scale = EARTH_RADIUS_KM * 1000 * radians(1)
+
+    if NUMPY_AVAILABLE:
+        lat = np.asarray(lats, dtype=float)
+        lon = np.asarray(lons, dtype=float)
+        return lon * scale * np.cos(np.radians(lat.mean())), lat * scale
+
+    mean_lat = sum(lats) / len(lats)
+    kx = scale * cos(radians(mean_lat))
+    return [lon * kx for lon in lons], [lat * scale for lat in lats]
+
+def _farthest_point(xs, ys, first, last):
+    """Punkt mit größtem Abstand zum Segment first-last"""
+    ax, ay = xs[first], ys[first]
+    dx, dy = xs[last] - ax, ys[last] - ay
+    length_sq = dx * dx + dy * dy
+
+    if NUMPY_AVAILABLE:
+        px = xs[first + 1:last] - ax
+        py = ys[first + 1:last] - ay
+        if length_sq > 0:
+            t = np.clip((px * dx + py * dy) / length_sq, 0, 1)
+            px = px - t * dx
+            py = py - t * dy
+        dist_sq = px * px + py * py
+        offset = int(np.argmax(dist_sq))
+        return first + 1 + offset, float(sqrt(dist_sq[offset]))
+
+    best_index, best_sq = first + 1, -1.0
+    for i in range(first + 1, last):
+        px, py = xs[i] - ax, ys[i] - ay
+        if length_sq > 0:
+            t = min(max((px * dx + py * dy) / length_sq, 0), 1)
+            px, py = px - t * dx, py - t * dy
+        dist_sq = px * px + py * py
+        if dist_sq > best_sq:
+            best_index, best_sq = i, dist_sq
+
+    return best_index, sqrt(best_sq)
+
+
+def _drop_jumps(segments, epochs):
+    """
+    Geschwindigkeit je Segment; verbleibende Sprünge (Versatz nach
+    OUTLIER_RESET) gelten als Track-Unterbrechung ohne Strecke und Zeit.
+    Die Zeit ist wie bei speed_kmh auf MIN_SEGMENT_SECONDS begrenzt,
+    damit die Durchschnitts- nie über der Maximalgeschwindigkeit liegt.
+
+    Returns:
+        tuple: (segments_km, speeds_kmh, elapsed_seconds)
+    """
+    if NUMPY_AVAILABLE:
+        distances = np.asarray(segments, dtype=float)
+        epoch = np.asarray(epochs, dtype=float)
+        seconds = epoch[1:] - epoch[:-1]
+
+        seconds = np.maximum(seconds, MIN_SEGMENT_SECONDS)
+        speeds = distances / seconds * 3600
+        jumps = speeds > MAX_SPEED_KMH
+        distances[jumps] = 0.0
+        speeds[jumps] = 0.0
+        elapsed = float(seconds[~jumps].sum())
+
+        return distances.tolist(), speeds.tolist(), elapsed
+
+    distances, speeds, elapsed = [], [], 0.0
+    for i, dist in enumerate(segments):
+        seconds = epochs[i + 1] - epochs[i]
+        speed = speed_kmh(dist, seconds)
+        if speed > MAX_SPEED_KMH:
+            dist = speed = 0.0
+        else:
+            elapsed += max(seconds, MIN_SEGMENT_SECONDS)
+        distances.append(dist)
+        speeds.append(speed)
+
+    return distances, speeds, elapsed
+
+def _segments_np(lat, lon):
+    """Haversine über NumPy-Arrays (n-1 Segmente)"""
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+
+    dlat = lat[1:] - lat[:-1]
+    dlon = lon[1:] - lon[:-1]
+
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(dlon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+    return EARTH_RADIUS_KM * c
+
+def _haversine(lat1, lon1, lat2, lon2):
+    """Skalare Haversine-Distanz (km)"""
+    lat1, lon1, lat2, lon2 = radians(lat1), radians(lon1), radians(lat2), radians(lon2)
+
+    a = sin((lat2 - lat1) / 2) ** 2 + cos(lat1) * cos(lat2) * sin((lon2 - lon1) / 2) ** 2
+    return EARTH_RADIUS_KM * 2 * atan2(sqrt(a), sqrt(1 - a))
@@ -0,0 +1,426 @@
+"""
+Geofence API
+============
+
+Geofences (Kreise und Polygone) mit Enter/Leave-Events
+
+- Fences liegen in geofences.json, im Speicher über ein Gitter indiziert
+- Jede neue GPS-Sichtung wird beim Ingest gegen die Fences ihrer Zelle geprüft
+  (erst Bounding-Box, dann exakte Form)
+- Neue und beim Start geladene Fences werden gleich nachgetragen: Historie
+  über den Positions-Index, Status aus dem letzten Fix, ohne Events
+- Pro Gerät wird der Inside/Outside-Status gehalten -> enter/exit Events
+- Mitgliedschaft (Row-IDs, MACs) ist vorberechnet, Geofence-Filter in
+  map_api.py brauchen keinen Point-in-Polygon-Test pro Request
+"""
+
+from collections import defaultdict, deque
+from datetime import datetime
+from math import radians, cos, floor
+from pathlib import Path
+import json
+import threading
+import uuid
+
+from api.utils import haversine_distance
+from api.ingest import register_listener, ingest_lock, get_entries, snapshot
+from api.spatial import query_bbox, position_index
+from api.movement import get_movement_states
+
+# Geofence Storage
+BASE_DIR = Path(__file__).parent.parent
+GEOFENCES_PATH = BASE_DIR / "geofences.json"
+
+# Zellgröße des Fence-Index in Grad (~5 km)
+GEOFENCE_CELL_DEG = 0.05
+
+# Max. Ausdehnung einer Fence (Bounding-Box, Grad Breite/Länge)
+GEOFENCE_MAX_SPAN_DEG = 1.0
+MAX_EVENTS = 1000
+
+geofence_state = {
+    "fences": {},                   # {fence_id: fence}
+    "bboxes": {},                   # {fence_id: bbox}
+    "pending": set(),               # geladene Fences, Historie noch nicht nachgetragen
+    "cells": defaultdict(set),      # {(row, col): {fence_id, ...}}
+    "members": {},                  # {fence_id: {row_id, ...}}
+    "macs": {},                     # {fence_id: {mac, ...}} jemals innerhalb
+    "inside": defaultdict(set),     # {mac: {fence_id, ...}} aktueller Status
+    "events": deque(maxlen=MAX_EVENTS)
+}
+
+_file_lock = threading.Lock()
+
+# ========================= GEOFENCE CRUD =========================
+
+def list_geofences():
+    """
+    Alle Geofences mit Mitglieder-Zahlen
+
+    Returns:
+        dict: {"geofences": [...], "count": int}
+    """
+    with ingest_lock:
+        _sync()
+
+        fences = []
+        for fence_id, fence in geofence_state["fences"].items():
+            fences.append(dict(
+                fence,
+                sightings=len(geofence_state["members"][fence_id]),
+                devices_seen=len(geofence_state["macs"][fence_id]),
+                devices_inside=sorted(
+                    mac for mac, inside in geofence_state["inside"].items()
+                    if fence_id in inside
+                )
+            ))
+
+    return {
+        "geofences": fences,
+        "count": len(fences)
+    }
+
+def create_geofence(data):
+    """
+    Neue Geofence anlegen
+
+    Args:
+        data: {
+            "name": str,
+            "type": "circle" | "polygon",
+            "center": [lat, lon], "radius_m": float,   # circle
+            "points": [[lat, lon], ...]                # polygon
+        }
+
+    Returns:
+        dict: {"success": bool, "geofence": {...}} oder {"success": False, "error": str}
+    """
+    fence, error = _validate_fence(data)
+    if error:
+        return {"success": False, "error": error}
+
+    fence["id"] = uuid.uuid4().hex[:12]
+    fence["created"] = datetime.now().isoformat()
+
+    with ingest_lock, snapshot():
+        _sync()
+        _add_fence(fence)
+        _backfill(fence["id"])
+        _save_fences()
+
+    return {
+        "success": True,
+        "geofence": fence
+    }
+
+def delete_geofence(fence_id):
+    """Geofence entfernen"""
+    with ingest_lock:
+        fence = geofence_state["fences"].pop(fence_id, None)
+        if fence is None:
+            return {"success": False, "error": "Geofence not found"}
+
+        for cell in _fence_cells(fence):
+            geofence_state["cells"][cell].discard(fence_id)
+        geofence_state["bboxes"].pop(fence_id, None)
+        geofence_state["pending"].discard(fence_id)
+        geofence_state["members"].pop(fence_id, None)
+        geofence_state["macs"].pop(fence_id, None)
+        for inside in geofence_state["inside"].values():
+            inside.discard(fence_id)
+
+        _save_fences()
+
+    return {
+        "success": True,
+        "id": fence_id
+    }
+
+# ========================= EVENTS & MEMBERSHIP =========================
+
+def get_geofence_events(limit=100, fence_id=None, mac=None):
+    """
+    Letzte Enter/Exit-Events (neueste zuerst)
+
+    Args:
+        limit: Maximale Anzahl
+        fence_id: Optional nur eine Geofence
+        mac: Optional nur ein Gerät
+
+    Returns:
+        dict: {"events": [...], "count": int}
+    """
+    with ingest_lock:
+        _sync()
+
+        events = []
+        for event in reversed(geofence_state["events"]):
+            if fence_id and event["fence_id"] != fence_id:
+                continue
+            if mac and event["mac"] != mac:
+                continue
+            events.append(event)
+            if len(events) >= limit:
+                break
+
+    return {
+        "events": events,
+        "count": len(events)
+    }
+
+def get_geofence_members(fence_id):
+    """
+    Row-IDs aller Sichtungen innerhalb einer Geofence
+
+    Returns:
+        set | None: Row-IDs oder None wenn Geofence unbekannt
+    """
+    with ingest_lock:
+        _sync()
+        return geofence_state["members"].get(fence_id)
+
+def get_geofence_macs(fence_id):
+    """
+    MACs, die jemals innerhalb einer Geofence gesehen wurden
+
+    Returns:
+        set | None: MACs oder None wenn Geofence unbekannt
+    """
+    with ingest_lock:
+        _sync()
+        return geofence_state["macs"].get(fence_id)
+
+# ========================= INGEST =========================
+
+def _evaluate_entries(start_row, entries):
+    """Ingest-Listener: neue Sichtungen gegen Geofences prüfen"""
+    if not geofence_state["fences"]:
+        return
+
+    fences = geofence_state["fences"]
+    bboxes = geofence_state["bboxes"]
+    pending = geofence_state["pending"]
+
+    for offset, entry in enumerate(entries):
+        lat, lon = entry.get("lat"), entry.get("lon")
+        if not (lat and lon):
+            continue
+
+        row = start_row + offset
+        mac = entry["mac"]
+
+        inside_now = set()
+        for fence_id in geofence_state["cells"].get(_cell(lat, lon), ()):
+            if fence_id in pending or not _in_bbox(bboxes[fence_id], lat, lon):
+                continue
+            if _contains(fences[fence_id], lat, lon):
+                inside_now.add(fence_id)
+                geofence_state["members"][fence_id].add(row)
+                geofence_state["macs"][fence_id].add(mac)
+
+        inside_before = geofence_state["inside"].get(mac)
+        if not inside_now and not inside_before:
+            continue
+
+        inside_before = inside_before or set()
+        for fence_id in inside_now - inside_before:
+            _emit("enter", fence_id, entry, row)
+        for fence_id in inside_before - inside_now:
+            _emit("exit", fence_id, entry, row)
+
+        if inside_now:
+            geofence_state["inside"][mac] = inside_now
+        else:
+            del geofence_state["inside"][mac]
+
+def _reset_membership():
+    """Ingest-Listener: Mitgliedschaft neu aufbauen (Log rotiert)"""
+    for fence_id in geofence_state["fences"]:
+        geofence_state["members"][fence_id] = set()
+        geofence_state["macs"][fence_id] = set()
+    geofence_state["inside"] = defaultdict(set)
+    geofence_state["events"].clear()
+
+def _emit(event_type, fence_id, entry, row):
+    """Enter/Exit-Event speichern"""
+    geofence_state["events"].append({
+        "type": event_type,
+        "fence_id": fence_id,
+        "fence_name": geofence_state["fences"][fence_id]["name"],
+        "mac": entry["mac"],
+        "name": entry["name"],
+        "timestamp": entry["timestamp"],
+        "row": row
+    })
+
+# ========================= INDEX =========================
+
+def _sync():
+    """Log einlesen, danach Historie geladener Fences nachtragen"""
+    # Snapshot: kein Refresh zwischen Positions-Abfrage und Bewegungsstatus
+    with snapshot():
+        while geofence_state["pending"]:
+            _backfill(geofence_state["pending"].pop())
+
+def _add_fence(fence):
+    """Geofence indizieren (Mitgliedschaft leer, siehe _backfill)"""
+    fence_id = fence["id"]
+    geofence_state["fences"][fence_id] = fence
+    geofence_state["bboxes"][fence_id] = _fence_bbox(fence)
+    geofence_state["members"][fence_id] = set()
+    geofence_state["macs"][fence_id] = set()
+
+    for cell in _fence_cells(fence):
+        geofence_state["cells"][cell].add(fence_id)
+
+def _backfill(fence_id):
+    """Bestehende Positionen einer Fence nachtragen (innerhalb eines Snapshots)"""
+    fence = geofence_state["fences"][fence_id]
+    bbox = geofence_state["bboxes"][fence_id]
+
+    # Historie über den Positions-Index (nur Zellen der Fence-Box)
+    entries = get_entries()
+    rows = position_index["rows"]
+    for pos_id in query_bbox(bbox):
+        entry = entries[rows[pos_id]]
+        if _contains(fence, entry["lat"], entry["lon"]):
+            geofence_state["members"][fence_id].add(rows[pos_id])
+            geofence_state["macs"][fence_id].add(entry["mac"])
+
+    # Aktueller Status = letzter Fix je Gerät, ohne Events für die Vergangenheit
+    for mac, state in get_movement_states():
+        last = state["last"]
+        if _contains(fence, last["lat"], last["lon"]):
+            geofence_state["inside"][mac].add(fence_id)
+
+def _cell(lat, lon):
+    return (floor(lat / GEOFENCE_CELL_DEG), floor(lon / GEOFENCE_CELL_DEG))
+
+def _fence_cells(fence):
+    """Alle Gitterzellen, die die Bounding-Box der Fence schneiden"""
+    bbox = _fence_bbox(fence)
+    row_min, col_min = _cell(bbox["min_lat"], bbox["min_lon"])
+    row_max, col_max = _cell(bbox["max_lat"], bbox["max_lon"])
+
+    return [
+        (row, col)
+        for row in range(row_min, row_max + 1)
+        for col in range(col_min, col_max + 1)
+    ]
+
+def _in_bbox(bbox, lat, lon):
+    return bbox["min_lat"] <= lat <= bbox["max_lat"] and bbox["min_lon"] <= lon <= bbox["max_lon"]
+
+def _fence_bbox(fence):
+    """Bounding-Box einer Fence"""
+    if fence["type"] == "circle":
+        lat, lon = fence["center"]
+        dlat = fence["radius_m"] / 111195
+        dlon = dlat / max(cos(radians(lat)), 1e-6)
+        return {
+            "min_lat": lat - dlat, "max_lat": lat + dlat,
+            "min_lon": lon - dlon, "max_lon": lon + dlon
+        }
+
+    lats = [p[0] for p in fence["points"]]
+    lons = [p[1] for p in fence["points"]]
+    return {
+        "min_lat": min(lats), "max_lat": max(lats),
+        "min_lon": min(lons), "max_lon": max(lons)
+    }
+
+def _contains(fence, lat, lon):
+    """Exakter Test: Punkt in Kreis / Polygon (Ray Casting)"""
+    if fence["type"] == "circle":
+        center_lat, center_lon = fence["center"]
+        return haversine_distance(center_lat, center_lon, lat, lon) * 1000 <= fence["radius_m"]
+
+    inside = False
+    points = fence["points"]
+    j = len(points) - 1
+    for i in range(len(points)):
+        lat_i, lon_i = points[i]
+        lat_j, lon_j = points[j]
+        if (lat_i > lat) != (lat_j > lat):
+            cross_lon = lon_i + (lat - lat_i) * (lon_j - lon_i) / (lat_j - lat_i)
+            if lon < cross_lon:
+                inside = not inside
+        j = i
+
+    return inside
+
+# ========================= VALIDATION =========================
+
+def _validate_fence(data):
+    """
+    Prüft Geofence-Daten
+
+    Returns:
+        tuple: (fence, None) oder (None, error)
+    """
+    if not isinstance(data, dict):
+        return None, "Geofence must be an object"
+
+    fence_type = data.get("type")
+    name = str(data.get("name") or "Geofence")
+
+    try:
+        if fence_type == "circle":
+            lat, lon = (float(v) for v in data["center"])
+            radius = float(data["radius_m"])
+            if not (-90 <= lat <= 90 and -180 <= lon <= 180) or not 0 < radius < float("inf"):
+                return None, "Invalid center or radius"
+            fence = {"name": name, "type": "circle", "center": [lat, lon], "radius_m": radius}
+        elif fence_type == "polygon":
+            points = [[float(p[0]), float(p[1])] for p in data["points"]]
+            if len(points) < 3:
+                return None, "Polygon needs at least 3 points"
+            if not all(-90 <= lat <= 90 and -180 <= lon <= 180 for lat, lon in points):
+                return None, "Invalid polygon coordinates"
+            fence = {"name": name, "type": "polygon", "points": points}
+        else:
+            return None, "Type must be 'circle' or 'polygon'"
+    except (KeyError, TypeError, ValueError):
+        return None, "Missing or invalid geofence geometry"
+
+    # Größenlimit hält den Zell-Index klein (Kreise nahe den Polen werden sehr breit)
+    bbox = _fence_bbox(fence)
+    if (bbox["max_lat"] - bbox["min_lat"] > GEOFENCE_MAX_SPAN_DEG
+            or bbox["max_lon"] - bbox["min_lon"] > GEOFENCE_MAX_SPAN_DEG):
+        return None, f"Geofence too large (max {GEOFENCE_MAX_SPAN_DEG}° span)"
+
+    return fence, None
+
+# ========================= STORAGE =========================
+
+def _load_fences():
+    """Load geofences from JSON file (invalid fences are skipped)"""
+    if not GEOFENCES_PATH.exists():
+        return []
+    try:
+        stored = json.loads(GEOFENCES_PATH.read_text())
+    except (ValueError, OSError):
+        return []
+
+    fences = []
+    for data in stored if isinstance(stored, list) else []:
+        fence, error = _validate_fence(data)
+        if error or not data.get("id"):
+            print(f"⚠️ Geofence übersprungen ({data.get('id') if isinstance(data, dict) else '?'}): {error or 'missing id'}")
+            continue
+        fence["id"] = str(data["id"])
+        fence["created"] = data.get("created")
+        fences.append(fence)
+    return fences
+
+def _save_fences():
+    """Save geofences to JSON file"""
+    with _file_lock:
+        GEOFENCES_PATH.write_text(json.dumps(list(geofence_state["fences"].values()), indent=2))
+
+# Historie wird beim ersten Zugriff nachgetragen (siehe _sync), wie bei POST
+for _fence in _load_fences():
+    _add_fence(_fence)
+    geofence_state["pending"].add(_fence["id"])
+
+register_listener(_evaluate_entries, _reset_membership)
@@ -0,0 +1,233 @@
+"""
+Ingest Pipeline
+===============
+
+Liest das Scan-Log inkrementell (Byte-Offset statt Komplett-Parse pro Request)
+und verteilt neu geparste Einträge an registrierte Indizes.
+
+Jeder Eintrag bekommt eine Row-ID (Position im Store). Die Daten-Version
+ändert sich nur, wenn neue Zeilen ankommen oder das Log rotiert wird -
+abgeleitete Ergebnisse können deshalb pro Version gecacht werden.
+"""
+
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from api.utils import LOG_PATH, parse_log_line
+
+# Globaler State
+ingest_state = {
+    "offset": 0,        # Byte-Offset bis zu dem gelesen wurde
+    "inode": None,      # Erkennung von Log-Rotation
+    "generation": 0,    # Zählt Resets (Rotation/Truncation)
+    "entries": [],      # Geparste Einträge, Index = Row-ID
+    "postings": {},     # {mac: array(Row-IDs)} in Log-Reihenfolge
+    "holds": 0          # Aktive Snapshots (refresh pausiert)
+}
+
+# Max. gecachte Ergebnisse pro Namespace und Daten-Version (älteste fliegen raus)
+CACHE_MAX_KEYS = 32
+
+ingest_lock = threading.RLock()
+_listeners = []
+_cache = {}
+
+# Unvollständige letzte Zeile erst nach dieser Ruhezeit übernehmen (Sekunden)
+PARTIAL_LINE_GRACE = 1.0
+
+# ========================= LISTENERS =========================
+
+def register_listener(on_entries, on_reset=None):
+    """
+    Registriert einen Index, der neue Einträge inkrementell verarbeitet
+
+    Args:
+        on_entries: callable(start_row, entries) - neue Einträge ab Row-ID
+        on_reset: callable() - Store wurde geleert (Rotation/Truncation)
+
+    Bereits vorhandene Einträge werden sofort nachgereicht.
+    """
+    with ingest_lock:
+        _listeners.append((on_entries, on_reset))
+        if ingest_state["entries"]:
+            on_entries(0, ingest_state["entries"])
+
+def _reset():
+    """Leert den Store und informiert alle Listener"""
+    ingest_state["offset"] = 0
+    ingest_state["entries"] = []
+    ingest_state["postings"] = {}
+    ingest_state["generation"] += 1
+    _cache.clear()
+
+    for _, on_reset in _listeners:
+        if on_reset:
+            on_reset()
+
+# ========================= INGEST =========================
+
+def refresh():
+    """
+    Liest neu angehängte Log-Zeilen
+
+    Returns:
+        int: Anzahl neuer Einträge
+    """
+    with ingest_lock:
+        # Snapshot aktiv -> neue Zeilen erst danach übernehmen
+        if ingest_state["holds"]:
+            return 0
+
+        if not LOG_PATH.exists():
+            if ingest_state["offset"] or ingest_state["entries"]:
+                _reset()
+            return 0
+
+        stat = LOG_PATH.stat()
+
+        # Rotation oder Truncation -> neu einlesen
+        if stat.st_ino != ingest_state["inode"] or stat.st_size < ingest_state["offset"]:
+            if ingest_state["inode"] is not None:
+                _reset()
+            ingest_state["inode"] = stat.st_ino
+
+        if stat.st_size == ingest_state["offset"]:
+            return 0
+
+        with open(LOG_PATH, 'rb') as f:
+            f.seek(ingest_state["offset"])
+            data = f.read()
+
+        # Nur vollständige Zeilen übernehmen, außer der Writer ist fertig
+        end = data.rfind(b"\n") + 1
+        if end < len(data) and time.time() - stat.st_mtime > PARTIAL_LINE_GRACE:
+            end = len(data)
+        if end == 0:
+            return 0
+
+        ingest_state["offset"] += end
+
+        new_entries = []
+        for line in data[:end].decode('utf-8', errors='ignore').splitlines():
+            entry = parse_log_line(line)
+            if entry:
+                new_entries.append(entry)
+
+        if not new_entries:
+            return 0
+
+        start_row = len(ingest_state["entries"])
+        ingest_state["entries"].extend(new_entries)
+
+        postings = ingest_state["postings"]
+        for row, entry in enumerate(new_entries, start_row):
+            rows = postings.get(entry["mac"])
+            if rows is None:
+                rows = postings[entry["mac"]] = array('l')
+            rows.append(row)
+
+        for on_entries, _ in _listeners:
+            on_entries(start_row, new_entries)
+
+        return len(new_entries)
+
+def get_entries():
+    """
+    Alle geparsten Einträge (aktualisiert vorher)
+
+    Returns:
+        List[dict]: Einträge, Index = Row-ID (nicht verändern)
+    """
+    with ingest_lock:
+        refresh()
+        return ingest_state["entries"]
+
+def get_device_entries(mac, last=None, first=None):
+    """
+    Einträge eines Geräts über die Posting-Liste (O(Sichtungen des Geräts))
+
+    Args:
+        mac: MAC-Adresse
+        last: Optional nur die letzten N Einträge
+        first: Optional nur die ersten N Einträge
+
+    Returns:
+        List[dict]: Einträge in Log-Reihenfolge (nicht verändern)
+    """
+    with ingest_lock:
+        refresh()
+        rows = ingest_state["postings"].get(mac)
+        if not rows:
+            return []
+
+        if last:
+            rows = rows[-last:]
+        elif first:
+            rows = rows[:first]
+
+        entries = ingest_state["entries"]
+        return [entries[row] for row in rows]
+
+def get_data_version():
+    """
+    Aktuelle Daten-Version
+
+    Returns:
+        tuple: (generation, anzahl_einträge)
+    """
+    with ingest_lock:
+        refresh()
+        return (ingest_state["generation"], len(ingest_state["entries"]))
+
+@contextmanager
+def snapshot():
+    """
+    Konsistenter Datenstand über mehrere Abfragen (auch aus Worker-Threads)
+
+    Liest einmal neue Zeilen und pausiert refresh() bis zum Verlassen des
+    Blocks. Die Daten-Version bleibt dadurch für alle Abfragen gleich.
+    Der Lock wird dabei nicht gehalten.
+
+    Yields:
+        tuple: Daten-Version des Snapshots
+    """
+    with ingest_lock:
+        refresh()
+        ingest_state["holds"] += 1
+        version = (ingest_state["generation"], len(ingest_state["entries"]))
+
+    try:
+        yield version
+    finally:
+        with ingest_lock:
+            ingest_state["holds"] -= 1
+
+# ========================= VERSION CACHE =========================
+
+def get_cached(namespace, key, builder):
+    """
+    Ergebnis pro Daten-Version cachen (höchstens CACHE_MAX_KEYS pro Namespace)
+
+    Args:
+        namespace: Name des Ergebnis-Typs (z. B. "hotspots")
+        key: Hashbare Parameter
+        builder: callable() - berechnet das Ergebnis bei Cache-Miss
+
+    Returns:
+        Ergebnis von builder (ggf. aus dem Cache)
+    """
+    version = get_data_version()
+    slot = _cache.get(namespace)
+
+    if slot is None or slot["version"] != version:
+        slot = {"version": version, "results": {}}
+        _cache[namespace] = slot
+
+    results = slot["results"]
+    if key not in results:
+        results[key] = builder()
+        if len(results) > CACHE_MAX_KEYS:
+            del results[next(iter(results))]
+
+    return results[key]
@@ -0,0 +1,423 @@
+"""
+Log Index
+=========
+
+Invertierter Index über die Log-Zeilen für die Log-Suche.
+
+Indiziert werden (inkrementell beim Ingest):
+- Gerätename (kleingeschrieben) -> Row-IDs, plus Wort -> Namen
+- MAC -> Row-IDs (Posting-Listen des Ingest), sortierte MAC-Liste für Präfixe
+- Epoch pro Zeile für after:/before:
+
+Ein Feld "source" gibt es nicht: das Log-Format kennt keine Scanner-ID,
+die erste Spalte ist nur ein umlaufender Zeilenzähler (000-999).
+
+Query-Syntax (AND bindet stärker als OR, Leerzeichen = AND):
+
+    mac:AA:BB*              MAC-Präfix (Trenner optional), ohne * exakt
+    name:galaxy             Wort im Namen, name:gal* = Wort-Präfix
+    name:"galaxy s21"       Teilstring im Namen
+    vendor:apple            Hersteller (OUI) enthält
+    after:/before:          Epoch, ISO-Datum oder "14 OCT 1230"
+    galaxy                  Teilstring in MAC oder Name (wie die alte Suche)
+    a OR b AND c            = a OR (b AND c)
+
+Ausgewertet wird pro AND-Klausel über die kleinste Posting-Liste; die
+übrigen Bedingungen werden direkt an der Zeile geprüft. Seiten werden
+per Cursor (letzte Row-ID) geblättert.
+"""
+
+from array import array
+from bisect import bisect_left, insort
+import heapq
+import math
+import re
+
+from api.ingest import register_listener, ingest_lock, refresh, ingest_state, get_cached
+from api.catalog import catalog_state
+from api.utils import timestamp_to_epoch, parse_time_param, encode_cursor, decode_cursor
+
+SEARCH_MAX_LIMIT = 1000
+
+# Kandidaten, die für die Gesamtzahl maximal geprüft werden (danach Schätzung)
+COUNT_SCAN_LIMIT = 10000
+
+# Ab diesem Anteil aller Zeilen wird gescannt statt Posting-Listen zu mergen
+SCAN_FRACTION = 0.25
+
+QUERY_FIELDS = ("mac", "name", "vendor", "after", "before")
+
+WORD_PATTERN = re.compile(r"\w+")
+TOKEN_PATTERN = re.compile(r'(\w+):"([^"]*)"|"([^"]*)"|(\S+)')
+
+log_index_state = {
+    "names": {},        # {name (lower): array(Row-IDs)}
+    "words": {},        # {wort: {name, ...}}
+    "vocab": [],        # sortierte Wörter (Präfix-Suche)
+    "mac_keys": [],     # sortierte [(hex-mac, mac), ...]
+    "epochs": array('d')  # Row-ID -> Epoch (nan = unbekannt)
+}
+
+# ========================= INDEXING =========================
+
+def _index_entries(start_row, entries):
+    """Ingest-Listener: neue Zeilen indizieren"""
+    names = log_index_state["names"]
+    words = log_index_state["words"]
+    epochs = log_index_state["epochs"]
+    postings = ingest_state["postings"]
+
+    new_words, new_macs = [], []
+
+    for row, entry in enumerate(entries, start_row):
+        name = entry["name"].lower()
+        rows = names.get(name)
+        if rows is None:
+            rows = names[name] = array('l')
+            for word in set(WORD_PATTERN.findall(name)):
+                if word not in words:
+                    words[word] = set()
+                    new_words.append(word)
+                words[word].add(name)
+        rows.append(row)
+
+        # Erste Sichtung dieser MAC (Posting-Liste des Ingest beginnt hier)
+        if postings[entry["mac"]][0] == row:
+            new_macs.append((_hex(entry["mac"].lower()), entry["mac"]))
+
+        epoch = timestamp_to_epoch(entry["timestamp"])
+        epochs.append(math.nan if epoch is None else epoch)
+
+    _merge_sorted(log_index_state["vocab"], new_words)
+    _merge_sorted(log_index_state["mac_keys"], new_macs)
+
+def _merge_sorted(target, items):
+    """Neue Schlüssel in eine sortierte Liste übernehmen"""
+    if len(items) > len(target) // 4:
+        target.extend(items)
+        target.sort()
+    else:
+        for item in items:
+            insort(target, item)
+
+def _reset_log_index():
+    """Ingest-Listener: Index leeren (Log rotiert)"""
+    log_index_state["names"] = {}
+    log_index_state["words"] = {}
+    log_index_state["vocab"] = []
+    log_index_state["mac_keys"] = []
+    log_index_state["epochs"] = array('d')
+
+def _hex(text):
+    """MAC ohne Trenner ("aa:bb-cc" -> "aabbcc")"""
+    return text.replace(":", "").replace("-", "")
+
+# ========================= QUERY PARSING =========================
+
+def parse_query(query):
+    """
+    Query in OR-verknüpfte AND-Klauseln zerlegen
+
+    Returns:
+        tuple: (clauses, error) - clauses = [[(field, value, quoted), ...], ...];
+               field None = freier Suchbegriff
+    """
+    clauses = [[]]
+    for match in TOKEN_PATTERN.finditer(query or ""):
+        field, quoted_value, phrase, token = match.groups()
+
+        if field is not None:
+            term = (field.lower(), quoted_value, True)
+        elif phrase is not None:
+            term = (None, phrase, True)
+        elif token == "OR":
+            clauses.append([])
+            continue
+        elif token == "AND":
+            continue
+        elif ":" in token and token.split(":", 1)[0].lower() in QUERY_FIELDS:
+            field, value = token.split(":", 1)
+            term = (field.lower(), value, False)
+        else:
+            term = (None, token, False)
+
+        if term[0] is not None and term[0] not in QUERY_FIELDS:
+            return None, f"Unknown field: {term[0]} (available: {', '.join(QUERY_FIELDS)})"
+        if term[0] is not None and not term[1]:
+            return None, f"Empty value for {term[0]}:"
+        clauses[-1].append(term)
+
+    if len(clauses) > 1 and not all(clauses):
+        return None, "OR needs a condition on both sides"
+
+    return clauses, None
+
+def _parse_time(value):
+    epoch = parse_time_param(value)
+    return epoch if epoch is not None else timestamp_to_epoch(value.upper())
+
+# ========================= RESOLVING =========================
+
+def _resolve_term(field, value, quoted):
+    """
+    Bedingung -> Index-Schlüssel
+
+    Returns:
+        list | None: [(art, {schlüssel, ...}), ...] mit art "name"/"mac";
+                     None bei ungültigem Wert
+    """
+    value_lower = value.lower()
+
+    if field == "mac":
+        prefix = value_lower.endswith("*")
+        key = _hex(value_lower.rstrip("*"))
+        if any(c not in "0123456789abcdef" for c in key):
+            return None
+        mac_keys = log_index_state["mac_keys"]
+        macs = set()
+        for i in range(bisect_left(mac_keys, (key,)), len(mac_keys)):
+            hex_mac, mac = mac_keys[i]
+            if not hex_mac.startswith(key):
+                break
+            if prefix or hex_mac == key:
+                macs.add(mac)
+        return [("mac", macs)]
+
+    if field == "name":
+        if quoted:
+            return [("name", {name for name in log_index_state["names"] if value_lower in name})]
+        words = log_index_state["words"]
+        if value_lower.endswith("*"):
+            prefix = value_lower.rstrip("*")
+            vocab = log_index_state["vocab"]
+            names = set()
+            for i in range(bisect_left(vocab, prefix), len(vocab)):
+                if not vocab[i].startswith(prefix):
+                    break
+                names |= words[vocab[i]]
+            return [("name", names)]
+        return [("name", set(words.get(value_lower, ())))]
+
+    if field == "vendor":
+        return [("mac", {
+            record["mac"] for record in catalog_state["devices"]
+            if value_lower in record["manufacturer"].lower()
+        })]
+
+    # Freier Begriff: Teilstring in MAC oder Name (Vokabular statt aller Zeilen)
+    return [
+        ("mac", {mac for _, mac in log_index_state["mac_keys"] if value_lower in mac.lower()}),
+        ("name", {name for name in log_index_state["names"] if value_lower in name})
+    ]
+
+def _posting_lists(kind, keys):
+    postings = ingest_state["postings"] if kind == "mac" else log_index_state["names"]
+    return [postings[key] for key in keys if key in postings]
+
+def _resolve_clause(terms):
+    """
+    AND-Klausel auflösen
+
+    Returns:
+        dict | None: {"matches": [[(art, schlüssel), ...], ...], "after", "before"}
+    """
+    clause = {"matches": [], "after": None, "before": None}
+    for field, value, quoted in terms:
+        if field in ("after", "before"):
+            epoch = _parse_time(value)
+            if epoch is None:
+                return None
+            bound = clause[field]
+            if field == "after":
+                clause["after"] = epoch if bound is None else max(bound, epoch)
+            else:
+                clause["before"] = epoch if bound is None else min(bound, epoch)
+            continue
+
+        match = _resolve_term(field, value, quoted)
+        if match is None:
+            return None
+        clause["matches"].append(match)
+    return clause
+
+# ========================= ROW HELPERS =========================
+
+def first_row_after(epoch):
+    """
+    Erste Row, ab der Einträge >= epoch vorkommen können
+
+    Alle Zeilen davor sind älter (laufendes Maximum der Epochs im Katalog).
+    """
+    return bisect_left(catalog_state["epoch_high"], epoch)
+
+def row_epoch(row):
+    """Epoch einer Zeile (nan = unbekannt)"""
+    return log_index_state["epochs"][row]
+
+# ========================= EVALUATION =========================
+
+def _entry_key(kind, row):
+    entry = ingest_state["entries"][row]
+    if kind == "mac":
+        return entry["mac"]
+    return entry["name"].lower()
+
+def _clause_plan(clause):
+    """Treiber (kleinste Posting-Menge) und restliche Prüfungen einer Klausel"""
+    driver, driver_size = None, None
+    for match in clause["matches"]:
+        lists = [rows for kind, keys in match for rows in _posting_lists(kind, keys)]
+        size = sum(len(rows) for rows in lists)
+        if driver is None or size < driver_size:
+            driver, driver_size, driver_lists = match, size, lists
+
+    total_rows = len(ingest_state["entries"])
+    if driver is not None and len(driver_lists) > 1 and driver_size > total_rows * SCAN_FRACTION:
+        # Viele Posting-Listen mit großem Anteil: Zeilen scannen statt mergen
+        driver = None
+    checks = [match for match in clause["matches"] if match is not driver]
+    if driver is None:
+        driver_lists = None
+        driver_size = total_rows
+
+    start = 0
+    if clause["after"] is not None:
+        start = first_row_after(clause["after"])
+        if driver_lists is None:
+            driver_size = max(total_rows - start, 0)
+
+    return {"lists": driver_lists, "size": driver_size, "start": start,
+            "checks": checks, "matches": clause["matches"],
+            "after": clause["after"], "before": clause["before"]}
+
+def _candidates(plan, start_row):
+    """Kandidaten-Rows einer Klausel ab start_row, aufsteigend"""
+    start_row = max(start_row, plan["start"])
+
+    if plan["lists"] is None:
+        return iter(range(start_row, len(ingest_state["entries"])))
+
+    return heapq.merge(*(
+        (rows[i] for i in range(bisect_left(rows, start_row), len(rows)))
+        for rows in plan["lists"]
+    ))
+
+def _verify(plan, row, driven):
+    """Zeile gegen eine Klausel prüfen (driven = Zeile stammt aus deren Treiber)"""
+    epoch = log_index_state["epochs"][row]
+    if plan["after"] is not None and not epoch >= plan["after"]:
+        return False
+    if plan["before"] is not None and not epoch <= plan["before"]:
+        return False
+    for match in plan["checks"] if driven else plan["matches"]:
+        if not any(_entry_key(kind, row) in keys for kind, keys in match):
+            return False
+    return True
+
+def _matches(plans, start_row):
+    """
+    Zeilen, die mindestens eine Klausel erfüllen (aufsteigend, ohne Duplikate)
+
+    Yields:
+        tuple: (row, matched)
+    """
+    streams = [_candidates(plan, start_row) for plan in plans]
+    stream = streams[0] if len(streams) == 1 else heapq.merge(*streams)
+
+    last = -1
+    for row in stream:
+        if row == last:
+            continue
+        last = row
+        # Bei OR kann die Zeile aus dem Treiber einer anderen Klausel stammen
+        yield row, any(_verify(plan, row, len(plans) == 1) for plan in plans)
+
+def _count(plans):
+    """
+    Treffer insgesamt
+
+    Returns:
+        tuple: (total, exact) - geschätzt, wenn mehr als COUNT_SCAN_LIMIT Kandidaten
+    """
+    # Eine Bedingung ohne Zusatzprüfung: Größe der Posting-Listen
+    if len(plans) == 1 and not plans[0]["checks"] and plans[0]["after"] is None \
+            and plans[0]["before"] is None:
+        return plans[0]["size"], True
+
+    scanned = matched = 0
+    for _, hit in _matches(plans, 0):
+        if scanned == COUNT_SCAN_LIMIT:
+            candidates = min(sum(plan["size"] for plan in plans), len(ingest_state["entries"]))
+            return round(matched / scanned * candidates), False
+        scanned += 1
+        matched += hit
+
+    return matched, True
+
+# ========================= SEARCH =========================
+
+def search(query, limit=100, cursor=None):
+    """
+    Log-Suche über den invertierten Index
+
+    Args:
+        query: Query (siehe Modul-Doku); leer = alle Zeilen
+        limit: Treffer pro Seite (max. SEARCH_MAX_LIMIT)
+        cursor: next_cursor der vorigen Seite
+
+    Returns:
+        dict: {
+            "results": [...],        # Einträge in Log-Reihenfolge
+            "count": int,            # Treffer dieser Seite
+            "total": int,
+            "total_exact": bool,     # False = hochgerechnet
+            "next_cursor": str | None,
+            "query": str
+        }
+        oder {"error": str}
+    """
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+
+    start_row = 0
+    if cursor:
+        payload = decode_cursor(cursor)
+        if not payload or len(payload) != 2 or payload[0] != "logs" \
+                or not isinstance(payload[1], int) or payload[1] < 0:
+            return {"error": "Invalid cursor"}
+        start_row = payload[1]
+
+    clauses, error = parse_query(query)
+    if error:
+        return {"error": error}
+
+    with ingest_lock:
+        refresh()
+
+        resolved = [_resolve_clause(terms) for terms in clauses]
+        if any(clause is None for clause in resolved):
+            return {"error": "Invalid value in query (mac: hex digits, after:/before: time)"}
+        plans = [_clause_plan(clause) for clause in resolved]
+
+        entries = ingest_state["entries"]
+        results, next_row = [], None
+        for row, hit in _matches(plans, start_row):
+            if not hit:
+                continue
+            if len(results) == limit:
+                next_row = row
+                break
+            results.append(entries[row])
+
+        # Gesamtzahl einmal pro Query und Daten-Version (Folgeseiten aus dem Cache)
+        total, exact = get_cached("log_search_total", query or "", lambda: _count(plans))
+
+    return {
+        "results": results,
+        "count": len(results),
+        "total": total,
+        "total_exact": exact,
+        "next_cursor": encode_cursor(["logs", next_row]) if next_row is not None else None,
+        "query": query
+    }
+
+register_listener(_index_entries, _reset_log_index)
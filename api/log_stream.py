@@ -0,0 +1,210 @@
+"""
+Log Stream
+==========
+
+Live-Feed neuer Log-Einträge als Server-Sent Events.
+
+Der Ingest meldet neue Zeilen über einen Listener; wartende Clients werden
+per Condition geweckt. Solange Clients verbunden sind, ruft ein Poller-
+Thread refresh() auf - das Log wird also einmal gelesen, egal wie viele
+Clients folgen.
+
+Jeder Client hat nur einen Cursor (Row-ID) in den Ingest-Store, keine
+eigene Queue: langsame Clients bremsen niemanden und kosten keinen
+Speicher (Backpressure über den blockierenden Generator). Fällt ein
+Client mehr als STREAM_MAX_LAG Zeilen zurück, springt er vor und
+bekommt ein "gap"-Event.
+
+Event-IDs sind "<generation>-<row>"; mit Last-Event-ID setzt ein Client
+nach einem Reconnect hinter dem letzten empfangenen Eintrag fort.
+
+Filter gibt es für MAC und Namen. Eine Quelle (Scanner-ID) enthält das
+Log-Format nicht - die erste Spalte ist nur ein Zeilenzähler.
+"""
+
+import json
+import threading
+import time
+
+from api.ingest import register_listener, ingest_lock, refresh, ingest_state
+
+# Log-Poll-Intervall solange Clients verbunden sind (Sekunden)
+STREAM_POLL_SECONDS = 1.0
+
+# Keepalive-Kommentar nach so vielen Sekunden ohne Event
+STREAM_HEARTBEAT_SECONDS = 15
+
+# Einträge pro Durchlauf und Client
+STREAM_BATCH = 200
+
+# Max. Rückstand eines Clients (Zeilen), danach "gap"-Event
+STREAM_MAX_LAG = 10000
+
+# Max. Einträge, die beim Verbinden nachgeliefert werden (?backlog=)
+STREAM_MAX_BACKLOG = 1000
+
+stream_state = {
+    "end": 0,           # Anzahl veröffentlichter Zeilen
+    "generation": 0,    # Ingest-Generation (Rotation)
+    "clients": 0,
+    "poller": None
+}
+
+_condition = threading.Condition()
+
+# ========================= INGEST =========================
+
+def _publish(start_row, entries):
+    """Ingest-Listener: neue Zeilen melden und wartende Clients wecken"""
+    with _condition:
+        stream_state["end"] = start_row + len(entries)
+        stream_state["generation"] = ingest_state["generation"]
+        _condition.notify_all()
+
+def _reset_stream():
+    """Ingest-Listener: Log rotiert"""
+    with _condition:
+        stream_state["end"] = 0
+        stream_state["generation"] = ingest_state["generation"]
+        _condition.notify_all()
+
+def _poll():
+    """Poller-Thread: Log lesen, solange Clients verbunden sind"""
+    while True:
+        with _condition:
+            if not stream_state["clients"]:
+                stream_state["poller"] = None
+                return
+        refresh()
+        time.sleep(STREAM_POLL_SECONDS)
+
+def _connect():
+    with _condition:
+        stream_state["clients"] += 1
+        if stream_state["poller"] is None:
+            stream_state["poller"] = threading.Thread(target=_poll, name="log-stream-poller", daemon=True)
+            stream_state["poller"].start()
+
+def _disconnect():
+    with _condition:
+        stream_state["clients"] -= 1
+
+# ========================= FILTERS =========================
+
+def make_filter(mac=None, name=None):
+    """
+    Filter für Stream-Einträge
+
+    Args:
+        mac: MAC exakt oder Präfix mit * (Groß-/Kleinschreibung egal)
+        name: Teilstring im Namen
+
+    Returns:
+        callable | None: entry -> bool (None = alles)
+    """
+    if not (mac or name):
+        return None
+
+    mac = mac.upper() if mac else None
+    name = name.lower() if name else None
+
+    def accept(entry):
+        if mac:
+            if mac.endswith("*"):
+                if not entry["mac"].upper().startswith(mac[:-1]):
+                    return False
+            elif entry["mac"].upper() != mac:
+                return False
+        if name and name not in entry["name"].lower():
+            return False
+        return True
+
+    return accept
+
+# ========================= STREAM =========================
+
+def parse_event_id(value):
+    """
+    Last-Event-ID -> (generation, row)
+
+    Returns:
+        tuple | None
+    """
+    try:
+        generation, row = (int(part) for part in (value or "").split("-"))
+    except ValueError:
+        return None
+    return generation, row
+
+def stream_events(last_event_id=None, mac=None, name=None, backlog=0):
+    """
+    SSE-Stream neuer Log-Einträge
+
+    Args:
+        last_event_id: Letzte empfangene Event-ID (Resume)
+        mac, name: Filter (siehe make_filter)
+        backlog: Ohne Resume die letzten N Zeilen nachliefern
+
+    Yields:
+        str: SSE-Nachrichten ("retry", "log", "gap", Keepalive-Kommentare)
+    """
+    accept = make_filter(mac, name)
+
+    with ingest_lock:
+        refresh()
+        generation = ingest_state["generation"]
+        end = len(ingest_state["entries"])
+
+    resume = parse_event_id(last_event_id)
+    if resume and resume[0] == generation and resume[1] < end:
+        cursor = resume[1] + 1
+    else:
+        cursor = max(0, end - max(0, min(backlog, STREAM_MAX_BACKLOG)))
+
+    _connect()
+    try:
+        yield "retry: 3000\n\n"
+        last_sent = time.time()
+
+        while True:
+            with _condition:
+                if stream_state["end"] <= cursor and stream_state["generation"] == generation:
+                    _condition.wait(STREAM_HEARTBEAT_SECONDS)
+                published = stream_state["end"]
+                current_generation = stream_state["generation"]
+
+            if current_generation != generation:
+                # Log rotiert: Row-IDs beginnen neu
+                generation, cursor = current_generation, 0
+                yield f"event: gap\ndata: {json.dumps({'reason': 'rotated'})}\n\n"
+
+            if published - cursor > STREAM_MAX_LAG:
+                skipped = published - STREAM_MAX_LAG - cursor
+                cursor = published - STREAM_MAX_LAG
+                yield f"event: gap\ndata: {json.dumps({'reason': 'lag', 'skipped': skipped})}\n\n"
+
+            if cursor < published:
+                stop = min(published, cursor + STREAM_BATCH)
+                with ingest_lock:
+                    if ingest_state["generation"] != generation:
+                        continue
+                    batch = ingest_state["entries"][cursor:stop]
+
+                messages = []
+                for row, entry in enumerate(batch, cursor):
+                    if accept is None or accept(entry):
+                        messages.append(f"id: {generation}-{row}\nevent: log\ndata: {json.dumps(entry)}\n\n")
+                cursor = stop
+
+                if messages:
+                    last_sent = time.time()
+                    yield "".join(messages)
+                    continue
+
+            if time.time() - last_sent >= STREAM_HEARTBEAT_SECONDS:
+                last_sent = time.time()
+                yield ": keepalive\n\n"
+    finally:
+        _disconnect()
+
+register_listener(_publish, _reset_stream)
@@ -6,50 +6,114 @@ Backend für Log-Viewer-Modul
 Migriert von noctis_log.py (Streamlit → Flask)
 """
 
+from datetime import datetime, timedelta
+
 from api.utils import (
     get_parsed_logs,
     filter_logs_by_time,
-    filter_logs_by_mac,
-    search_logs,
-    prepare_export_data
+    prepare_export_data,
+    timestamp_to_epoch,
+    iter_csv,
+    iter_ndjson,
+    encode_cursor,
+    decode_cursor
 )
+from api.ingest import get_device_entries, get_entries, ingest_lock, ingest_state
+from api.log_index import search as search_log_index, first_row_after, row_epoch
+
+TIME_FILTER_HOURS = {"24h": 24, "7d": 24*7, "30d": 24*30}
+
+# Max. Einträge pro Seite in get_logs_data
+LOGS_PAGE_MAX = 1000
+
+# CSV-Spalten des Log-Exports
+EXPORT_FIELDS = ["timestamp", "mac", "name", "latitude", "longitude"]
 
 # ========================= LOG DATA =========================
 
-def get_logs_data(limit=100, time_filter=None):
+def get_logs_data(limit=100, time_filter=None, cursor=None):
     """
-    Log-Daten mit optionalem Filter
+    Log-Daten mit optionalem Filter, seitenweise per Cursor
+    
+    Ohne Cursor kommt die neueste Seite. prev_cursor blättert zu älteren,
+    next_cursor zu neueren Einträgen; jede Seite kostet O(Seitengröße)
+    (Row-IDs des Ingest statt Parsen und Slicen aller Logs).
     
     Args:
-        limit: Anzahl Einträge
+        limit: Anzahl Einträge pro Seite
         time_filter: None, "24h", "7d", "30d"
+        cursor: prev_cursor/next_cursor einer vorigen Seite
     
     Returns:
         dict: {
-            "logs": [...],
+            "logs": [...],           # Log-Reihenfolge (älteste zuerst)
             "total": int,
-            "filtered": int
+            "filtered": int,
+            "prev_cursor": str | None,
+            "next_cursor": str | None
         }
     """
-    logs = get_parsed_logs()
-    total = len(logs)
+    limit = max(1, min(limit or LOGS_PAGE_MAX, LOGS_PAGE_MAX))
     
-    # Filter anwenden
-    if time_filter == "24h":
-        logs = filter_logs_by_time(logs, hours=24)
-    elif time_filter == "7d":
-        logs = filter_logs_by_time(logs, hours=24*7)
-    elif time_filter == "30d":
-        logs = filter_logs_by_time(logs, hours=24*30)
+    hours = TIME_FILTER_HOURS.get(time_filter)
+    cutoff = (datetime.now() - timedelta(hours=hours)).timestamp() if hours else None
     
-    # Limit anwenden
-    if limit:
-        logs = logs[-limit:]
+    with ingest_lock:
+        entries = get_entries()
+        generation = ingest_state["generation"]
+        end = len(entries)
+        
+        if cursor:
+            payload = decode_cursor(cursor)
+            if not payload or len(payload) != 4 or payload[0] != "logdata" \
+                    or payload[1] not in ("before", "after") or not isinstance(payload[2], int):
+                return {"error": "Invalid cursor"}
+            if payload[3] != generation:
+                return {"error": "Cursor expired (log rotated)"}
+            direction, row = payload[1], payload[2]
+        else:
+            direction, row = "before", end
+        
+        # Ältere Zeilen als der Cutoff können nicht mehr passen
+        start = first_row_after(cutoff) if cutoff is not None else 0
+        
+        def matches(r):
+            return cutoff is None or row_epoch(r) >= cutoff
+        
+        rows = []
+        if direction == "before":
+            r = min(row, end) - 1
+            while r >= start and len(rows) < limit:
+                if matches(r):
+                    rows.append(r)
+                r -= 1
+            rows.reverse()
+        else:
+            r = max(row + 1, start)
+            while r < end and len(rows) < limit:
+                if matches(r):
+                    rows.append(r)
+                r += 1
+        
+        logs = [entries[r] for r in rows]
+        
+        has_prev = has_next = False
+        if rows:
+            has_prev = any(matches(r) for r in range(rows[0] - 1, start - 1, -1))
+            has_next = any(matches(r) for r in range(rows[-1] + 1, end))
+        elif direction == "after":
+            # Leere Seite am Ende: später von hier aus weiterblättern
+            has_next = True
+    
+    boundary_prev = rows[0] if rows else None
+    boundary_next = rows[-1] if rows else row
     
     return {
         "logs": logs,
-        "total": total,
-        "filtered": len(logs)
+        "total": end,
+        "filtered": len(logs),
+        "prev_cursor": encode_cursor(["logdata", "before", boundary_prev, generation]) if has_prev else None,
+        "next_cursor": encode_cursor(["logdata", "after", boundary_next, generation]) if has_next else None
     }
 
 # ========================= RECENT LOGS =========================
@@ -64,8 +128,8 @@ def get_recent_logs(n=50):
             "count": int
         }
     """
-    logs = get_parsed_logs()
-    recent = logs[-n:] if len(logs) > n else logs
+    logs = get_entries()
+    recent = logs[-n:] if len(logs) > n else logs[:]
     
     # Reverse für neueste zuerst
     recent.reverse()
@@ -77,28 +141,26 @@ def get_recent_logs(n=50):
 
 # ========================= SEARCH =========================
 
-def search_logs_api(query):
+def search_logs_api(query, limit=100, cursor=None):
     """
-    Suche in Logs
+    Suche in Logs (invertierter Index, siehe api.log_index)
     
     Args:
-        query: Suchbegriff
+        query: Suchbegriff oder Query (mac:AA:BB*, name:"x", after:, AND/OR)
+        limit: Treffer pro Seite
+        cursor: next_cursor der vorigen Seite
     
     Returns:
         dict: {
             "results": [...],
             "count": int,
+            "total": int,
+            "total_exact": bool,
+            "next_cursor": str | None,
             "query": str
         }
     """
-    logs = get_parsed_logs()
-    results = search_logs(logs, query)
-    
-    return {
-        "results": results,
-        "count": len(results),
-        "query": query
-    }
+    return search_log_index(query, limit, cursor)
 
 # ========================= STATISTICS =========================
 
@@ -161,11 +223,8 @@ def get_device_logs(mac, limit=None):
             "count": int
         }
     """
-    logs = get_parsed_logs()
-    device_logs = filter_logs_by_mac(logs, mac)
-    
-    if limit:
-        device_logs = device_logs[-limit:]
+    # Posting list: nur die Sichtungen dieses Geräts
+    device_logs = get_device_entries(mac, last=limit)
     
     return {
         "mac": mac,
@@ -180,35 +239,18 @@ def export_logs(format_type='json', time_filter=None):
     Export Logs in verschiedenen Formaten
     
     Args:
-        format_type: "json" oder "csv"
+        format_type: "json", "csv" oder "ndjson"
         time_filter: None, "24h", "7d", "30d"
     
     Returns:
-        dict: Export-Daten
+        dict: Export-Daten ("data" ist bei csv/ndjson ein String)
     """
-    logs = get_parsed_logs()
+    export_data = list(iter_export_logs(time_filter))
     
-    # Filter anwenden
-    if time_filter == "24h":
-        logs = filter_logs_by_time(logs, hours=24)
-    elif time_filter == "7d":
-        logs = filter_logs_by_time(logs, hours=24*7)
-    elif time_filter == "30d":
-        logs = filter_logs_by_time(logs, hours=24*30)
-    
-    export_data = prepare_export_data(logs)
-    
-    if format_type == 'csv':
-        # CSV-Format
-        csv_lines = ["timestamp,mac,name,latitude,longitude"]
-        for entry in export_data:
-            lat = entry.get("latitude", "")
-            lon = entry.get("longitude", "")
-            csv_lines.append(f"{entry['timestamp']},{entry['mac']},{entry['name']},{lat},{lon}")
-        
+    if format_type in ('csv', 'ndjson'):
         return {
-            "format": "csv",
-            "data": "\n".join(csv_lines),
+            "format": format_type,
+            "data": "".join(_serialize_logs(export_data, format_type)),
             "count": len(export_data)
         }
     
@@ -219,6 +261,48 @@ def export_logs(format_type='json', time_filter=None):
         "count": len(export_data)
     }
 
+def stream_export_logs(format_type='csv', time_filter=None):
+    """
+    Log-Export als Text-Stream (für Generator-Responses)
+    
+    Args:
+        format_type: "csv" oder "ndjson"
+        time_filter: None, "24h", "7d", "30d"
+    
+    Returns:
+        Iterator[str]: Export-Chunks, bei CSV zuerst der Header
+    """
+    return _serialize_logs(iter_export_logs(time_filter), format_type)
+
+def _serialize_logs(rows, format_type):
+    if format_type == 'csv':
+        return iter_csv(rows, EXPORT_FIELDS)
+    return iter_ndjson(rows)
+
+def iter_export_logs(time_filter=None):
+    """
+    Export-Einträge direkt aus dem Ingest (ohne Kopie aller Logs)
+    
+    Die Zeilenzahl wird beim Start festgelegt; später angehängte Zeilen
+    gehören nicht mehr zum Export.
+    
+    Yields:
+        dict: {"timestamp", "mac", "name"[, "latitude", "longitude"]}
+    """
+    entries = get_entries()
+    end = len(entries)
+    
+    hours = TIME_FILTER_HOURS.get(time_filter)
+    cutoff = (datetime.now() - timedelta(hours=hours)).timestamp() if hours else None
+    
+    for row in range(end):
+        entry = entries[row]
+        if cutoff is not None:
+            epoch = timestamp_to_epoch(entry["timestamp"])
+            if epoch is None or epoch < cutoff:
+                continue
+        yield prepare_export_data((entry,))[0]
+
 # ========================= LOG FILTERS =========================
 
 def get_available_filters():
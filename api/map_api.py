@@ -6,13 +6,56 @@ Backend für GPS-Karten-Modul
 Migriert von noctis_map.py (Streamlit → Flask)
 """
 
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from queue import Queue
+import threading
 from api.utils import (
-    get_parsed_logs,
     get_gps_data,
-    haversine_distance,
-    filter_logs_by_mac
+    timestamp_to_epoch
 )
+from api.ingest import get_entries, get_device_entries, get_cached, ingest_lock, ingest_state, snapshot
+from api.movement import get_movement_states, is_moving, centroid, avg_speed, bounds
+from api.cotravel import get_cotravel_pairs, COTRAVEL_SLOT_SECONDS, COTRAVEL_MIN_SLOTS, COTRAVEL_MIN_PLACES
+from api.geofence_api import get_geofence_members, get_geofence_macs
+from api.geodesy import (
+    track_metrics,
+    reject_outliers,
+    simplification_ranks,
+    simplify_indices,
+    zoom_tolerance
+)
+from api.spatial import (
+    cluster_points,
+    query_bbox,
+    cluster_by_zoom,
+    position_index,
+    get_tile_bins,
+    pixel_to_lonlat,
+    TILE_BINS,
+    HEATMAP_MAX_ZOOM
+)
+
+# Hotspot-Defaults
+HOTSPOT_RADIUS_M = 100
+HOTSPOT_MIN_POINTS = 3
+
+# Größter erlaubter Hotspot-Radius (Meter)
+HOTSPOT_MAX_RADIUS_M = 5000
+
+# Ab diesem Zoom keine Marker-Cluster mehr
+CLUSTER_MAX_ZOOM = 18
+
+# Kompakte Marker: Quantisierung der Koordinaten (1e-6 Grad ~ 0.1 m)
+COMPACT_SCALE = 1000000
+
+# Track-Vereinfachung: erlaubte Abweichung in Pixeln, gecachte Geräte
+TRACK_TOLERANCE_PX = 1.0
+TRACK_CACHE_SIZE = 256
+
+# Douglas-Peucker-Ränge pro Gerät: {mac: {"key": (generation, fixes), "ranks": [...]}}
+_track_ranks = OrderedDict()
+_track_ranks_lock = threading.Lock()
 
 # ========================= GPS STATISTICS =========================
 
@@ -29,25 +72,28 @@ def get_gps_statistics():
             "has_data": bool
         }
     """
-    gps_data = get_gps_data()
-    
-    if not gps_data:
-        return {
-            "total_points": 0,
-            "unique_devices": 0,
-            "avg_lat": 0,
-            "avg_lon": 0,
-            "has_data": False
-        }
-    
-    unique_macs = set(point["mac"] for point in gps_data)
-    
-    avg_lat = sum(point["lat"] for point in gps_data) / len(gps_data)
-    avg_lon = sum(point["lon"] for point in gps_data) / len(gps_data)
+    return get_cached("gps_statistics", None, _compute_gps_statistics)
+
+def _compute_gps_statistics():
+    """Statistiken aus dem Positions-Index (kein erneutes Parsen des Logs)"""
+    with ingest_lock:
+        total = len(position_index["rows"])
+        
+        if not total:
+            return {
+                "total_points": 0,
+                "unique_devices": 0,
+                "avg_lat": 0,
+                "avg_lon": 0,
+                "has_data": False
+            }
+        
+        avg_lat = sum(position_index["lat"]) / total
+        avg_lon = sum(position_index["lon"]) / total
     
     return {
-        "total_points": len(gps_data),
-        "unique_devices": len(unique_macs),
+        "total_points": total,
+        "unique_devices": len(get_movement_states()),
         "avg_lat": round(avg_lat, 6),
         "avg_lon": round(avg_lon, 6),
         "has_data": True
@@ -55,12 +101,20 @@ def get_gps_statistics():
 
 # ========================= MAP DATA =========================
 
-def get_map_markers(device_filter="all"):
+def get_map_markers(device_filter="all", bbox=None, zoom=None, time_from=None, time_to=None,
+                    geofence=None):
     """
     Marker-Daten für Karte
     
+    Ohne bbox: alle Marker (Legacy). Mit bbox: Viewport-Modus, siehe
+    get_viewport_markers().
+    
     Args:
         device_filter: "all", "named", "unknown"
+        bbox: Optional {"min_lat", "min_lon", "max_lat", "max_lon"}
+        zoom: Karten-Zoom (für serverseitiges Clustering)
+        time_from, time_to: Optionales Zeitfenster (Epoch)
+        geofence: Optional nur Sichtungen innerhalb dieser Geofence-ID
     
     Returns:
         dict: {
@@ -84,13 +138,26 @@ def get_map_markers(device_filter="all"):
             }
         }
     """
-    gps_data = get_gps_data()
+    if bbox is not None:
+        return get_viewport_markers(bbox, zoom, device_filter, time_from, time_to, geofence)
+    
+    if geofence is not None:
+        members = get_geofence_members(geofence)
+        if members is None:
+            return {"error": "Geofence not found"}
+        entries = get_entries()
+        gps_data = [_entry_point(entries[row]) for row in sorted(members)]
+    else:
+        gps_data = get_gps_data(get_entries())
     
     # Filter anwenden
-    if device_filter == "named":
-        gps_data = [p for p in gps_data if p["name"] != "Unknown"]
-    elif device_filter == "unknown":
-        gps_data = [p for p in gps_data if p["name"] == "Unknown"]
+    gps_data = _filter_points(gps_data, device_filter)
+    
+    if time_from is not None or time_to is not None:
+        gps_data = [
+            p for p in gps_data
+            if _in_time_window(timestamp_to_epoch(p["timestamp"]), time_from, time_to)
+        ]
     
     if not gps_data:
         return {
@@ -100,45 +167,304 @@ def get_map_markers(device_filter="all"):
         }
     
     # Erstelle Marker
-    markers = []
-    for point in gps_data:
-        popup = f"<b>{point['name']}</b><br>" \
-                f"MAC: {point['mac']}<br>" \
-                f"Time: {point['timestamp']}<br>" \
-                f"Pos: {point['lat']:.6f}, {point['lon']:.6f}"
+    markers = [_build_marker(point) for point in gps_data]
+    
+    return {
+        "markers": markers,
+        "count": len(markers),
+        "bounds": _compute_bounds(markers)
+    }
+
+def get_viewport_markers(bbox, zoom=None, device_filter="all", time_from=None, time_to=None,
+                         geofence=None):
+    """
+    Marker im sichtbaren Kartenausschnitt, serverseitig geclustert
+    
+    Positionen kommen aus dem Gitter-Index (nur Zellen im Viewport).
+    Punkte in derselben Bildschirm-Zelle (CLUSTER_CELL_PX) werden zu einem
+    Cluster zusammengefasst, Einzelpunkte bleiben normale Marker. Die
+    Antwortgröße hängt damit von der Bildschirmgröße ab, nicht vom Datenbestand.
+    
+    Args:
+        bbox: {"min_lat", "min_lon", "max_lat", "max_lon"}
+        zoom: Karten-Zoom (None oder >= CLUSTER_MAX_ZOOM = kein Clustering)
+        device_filter: "all", "named", "unknown"
+        time_from, time_to: Optionales Zeitfenster (Epoch)
+        geofence: Optional nur Sichtungen innerhalb dieser Geofence-ID
+    
+    Returns:
+        dict: {
+            "mode": "viewport",
+            "zoom": int,
+            "markers": [...],
+            "clusters": [
+                {
+                    "lat": float,
+                    "lon": float,
+                    "count": int,
+                    "device_count": int,
+                    "bounds": {...}
+                },
+                ...
+            ],
+            "count": int,
+            "bounds": {...}
+        }
+    """
+    with ingest_lock:
+        entries = get_entries()
+        rows = position_index["rows"]
         
-        markers.append({
-            "lat": point["lat"],
-            "lon": point["lon"],
-            "mac": point["mac"],
-            "name": point["name"],
-            "timestamp": point["timestamp"],
-            "popup": popup
-        })
+        members = None
+        if geofence is not None:
+            members = get_geofence_members(geofence)
+            if members is None:
+                return {"error": "Geofence not found"}
+        
+        pos_ids = query_bbox(bbox, time_from, time_to)
+        if members is not None:
+            pos_ids = [pos_id for pos_id in pos_ids if rows[pos_id] in members]
+        if device_filter in ("named", "unknown"):
+            named = device_filter == "named"
+            pos_ids = [
+                pos_id for pos_id in pos_ids
+                if (entries[rows[pos_id]]["name"] != "Unknown") == named
+            ]
+        
+        if zoom is not None and zoom < CLUSTER_MAX_ZOOM:
+            groups = cluster_by_zoom(pos_ids, zoom)
+        else:
+            groups = [[pos_id] for pos_id in pos_ids]
+        
+        markers = []
+        clusters = []
+        for group in groups:
+            points = [_entry_point(entries[rows[pos_id]]) for pos_id in group]
+            
+            if len(points) == 1:
+                markers.append(_build_marker(points[0]))
+                continue
+            
+            clusters.append({
+                "lat": round(sum(p["lat"] for p in points) / len(points), 6),
+                "lon": round(sum(p["lon"] for p in points) / len(points), 6),
+                "count": len(points),
+                "device_count": len(set(p["mac"] for p in points)),
+                "bounds": _compute_bounds(points)
+            })
+        
+        bounds = None
+        if pos_ids:
+            bounds = _compute_bounds([
+                {"lat": position_index["lat"][i], "lon": position_index["lon"][i]}
+                for i in pos_ids
+            ])
     
-    # Berechne Bounds
-    lats = [m["lat"] for m in markers]
-    lons = [m["lon"] for m in markers]
+    clusters.sort(key=lambda c: c["count"], reverse=True)
     
-    bounds = {
-        "min_lat": min(lats),
-        "max_lat": max(lats),
-        "min_lon": min(lons),
-        "max_lon": max(lons)
+    return {
+        "mode": "viewport",
+        "zoom": zoom,
+        "markers": markers,
+        "clusters": clusters,
+        "count": len(pos_ids),
+        "bounds": bounds
     }
+
+def get_compact_markers(device_filter="all", bbox=None, time_from=None, time_to=None,
+                        geofence=None):
+    """
+    Kompakte Marker-Payload (spaltenweise statt Objekt pro Marker)
+    
+    - Koordinaten quantisiert auf 1e-6 Grad, delta-kodiert als Integer
+    - MAC, Name und Timestamp als Wörterbuch + Index-Array
+    - Marker-IDs (Row-IDs) delta-kodiert; Popup-Details lazy über
+      get_marker_details()
+    
+    Args:
+        device_filter: "all", "named", "unknown"
+        bbox: Optional {"min_lat", "min_lon", "max_lat", "max_lon"}
+        time_from, time_to: Optionales Zeitfenster (Epoch)
+        geofence: Optional nur Sichtungen innerhalb dieser Geofence-ID
+    
+    Returns:
+        dict: {
+            "format": "compact",
+            "count": int,
+            "scale": int,
+            "id": [int],        # delta
+            "lat": [int],       # delta, * scale
+            "lon": [int],       # delta, * scale
+            "mac": [int], "macs": [str],
+            "name": [int], "names": [str],
+            "time": [int], "times": [str],
+            "bounds": {...}
+        }
+    """
+    with ingest_lock:
+        entries = get_entries()
+        rows = position_index["rows"]
+        lats = position_index["lat"]
+        lons = position_index["lon"]
+        
+        members = None
+        if geofence is not None:
+            members = get_geofence_members(geofence)
+            if members is None:
+                return {"error": "Geofence not found"}
+        
+        if bbox is not None:
+            pos_ids = query_bbox(bbox, time_from, time_to)
+        else:
+            pos_ids = range(len(rows))
+            if time_from is not None or time_to is not None:
+                epochs = position_index["epoch"]
+                pos_ids = [
+                    pos_id for pos_id in pos_ids
+                    if _in_time_window(epochs[pos_id], time_from, time_to)
+                ]
+        
+        dictionaries = {"mac": {}, "name": {}, "timestamp": {}}
+        columns = {"id": [], "lat": [], "lon": [], "mac": [], "name": [], "time": []}
+        previous = {"id": 0, "lat": 0, "lon": 0}
+        kept = []
+        
+        for pos_id in pos_ids:
+            row = rows[pos_id]
+            entry = entries[row]
+            
+            if device_filter == "named" and entry["name"] == "Unknown":
+                continue
+            if device_filter == "unknown" and entry["name"] != "Unknown":
+                continue
+            if members is not None and row not in members:
+                continue
+            
+            kept.append(pos_id)
+            values = {
+                "id": row,
+                "lat": round(lats[pos_id] * COMPACT_SCALE),
+                "lon": round(lons[pos_id] * COMPACT_SCALE)
+            }
+            for key, value in values.items():
+                columns[key].append(value - previous[key])
+                previous[key] = value
+            
+            for key, column in (("mac", "mac"), ("name", "name"), ("timestamp", "time")):
+                lookup = dictionaries[key]
+                value = entry[key]
+                if value not in lookup:
+                    lookup[value] = len(lookup)
+                columns[column].append(lookup[value])
+        
+        bounds = None
+        if kept:
+            bounds = _compute_bounds([
+                {"lat": lats[i], "lon": lons[i]} for i in kept
+            ])
     
     return {
-        "markers": markers,
-        "count": len(markers),
+        "format": "compact",
+        "count": len(columns["id"]),
+        "scale": COMPACT_SCALE,
+        **columns,
+        "macs": list(dictionaries["mac"]),
+        "names": list(dictionaries["name"]),
+        "times": list(dictionaries["timestamp"]),
         "bounds": bounds
     }
 
+def get_marker_details(marker_id):
+    """
+    Popup-Details für einen Marker (lazy, für kompakte Payload)
+    
+    Args:
+        marker_id: Row-ID aus get_compact_markers()
+    
+    Returns:
+        dict: Marker inkl. Popup oder {"error": str}
+    """
+    entries = get_entries()
+    
+    if not 0 <= marker_id < len(entries):
+        return {"error": "Marker not found"}
+    
+    entry = entries[marker_id]
+    if not (entry.get("lat") and entry.get("lon")):
+        return {"error": "Marker not found"}
+    
+    marker = _build_marker(entry)
+    marker["id"] = marker_id
+    return marker
+
+def _entry_point(entry):
+    """GPS-Punkt (wie get_gps_data) aus einem Log-Eintrag"""
+    return {
+        "mac": entry["mac"],
+        "name": entry["name"],
+        "lat": entry["lat"],
+        "lon": entry["lon"],
+        "timestamp": entry["timestamp"]
+    }
+
+def _build_marker(point):
+    """Marker inkl. Popup-HTML"""
+    popup = f"<b>{point['name']}</b><br>" \
+            f"MAC: {point['mac']}<br>" \
+            f"Time: {point['timestamp']}<br>" \
+            f"Pos: {point['lat']:.6f}, {point['lon']:.6f}"
+    
+    return {
+        "lat": point["lat"],
+        "lon": point["lon"],
+        "mac": point["mac"],
+        "name": point["name"],
+        "timestamp": point["timestamp"],
+        "popup": popup
+    }
+
+def _filter_points(gps_data, device_filter):
+    """Geräte-Filter anwenden (all/named/unknown)"""
+    if device_filter == "named":
+        return [p for p in gps_data if p["name"] != "Unknown"]
+    if device_filter == "unknown":
+        return [p for p in gps_data if p["name"] == "Unknown"]
+    return gps_data
+
+def _in_time_window(epoch, time_from, time_to):
+    """Prüft Epoch gegen optionales Zeitfenster"""
+    if epoch is None:
+        return False
+    if time_from is not None and epoch < time_from:
+        return False
+    if time_to is not None and epoch > time_to:
+        return False
+    return True
+
+def _compute_bounds(points):
+    """Bounds über Punkte mit lat/lon"""
+    lats = [p["lat"] for p in points]
+    lons = [p["lon"] for p in points]
+    
+    return {
+        "min_lat": min(lats),
+        "max_lat": max(lats),
+        "min_lon": min(lons),
+        "max_lon": max(lons)
+    }
+
 # ========================= DEVICE POSITIONS =========================
 
-def get_device_positions():
+def get_device_positions(geofence=None):
     """
     Positionen gruppiert nach Gerät
     
+    Liest die inkrementell gepflegten Aggregate (api.movement), O(Geräte).
+    Distanzen und Geschwindigkeiten ohne GPS-Sprünge (> MAX_SPEED_KMH).
+    
+    Args:
+        geofence: Optional nur Geräte, die in dieser Geofence-ID gesehen wurden
+    
     Returns:
         dict: {
             "devices": [
@@ -148,52 +474,32 @@ def get_device_positions():
                     "positions": int,
                     "first_pos": {"lat": float, "lon": float, "time": str},
                     "last_pos": {"lat": float, "lon": float, "time": str},
-                    "movement_km": float
+                    "movement_km": float,
+                    "bounds": {"min_lat", "max_lat", "min_lon", "max_lon"}
                 },
                 ...
             ]
         }
     """
-    gps_data = get_gps_data()
-    
-    # Gruppiere nach MAC
-    device_positions = defaultdict(list)
-    for point in gps_data:
-        device_positions[point["mac"]].append(point)
+    macs = None
+    if geofence is not None:
+        macs = get_geofence_macs(geofence)
+        if macs is None:
+            return {"error": "Geofence not found"}
     
     devices = []
-    for mac, positions in device_positions.items():
-        # Sortiere nach Zeit
-        positions.sort(key=lambda p: p["timestamp"])
-        
-        first = positions[0]
-        last = positions[-1]
-        
-        # Berechne Bewegung
-        movement = 0
-        if len(positions) > 1:
-            for i in range(len(positions) - 1):
-                dist = haversine_distance(
-                    positions[i]["lat"], positions[i]["lon"],
-                    positions[i+1]["lat"], positions[i+1]["lon"]
-                )
-                movement += dist
+    for mac, state in get_movement_states():
+        if macs is not None and mac not in macs:
+            continue
         
         devices.append({
             "mac": mac,
-            "name": first["name"],
-            "positions": len(positions),
-            "first_pos": {
-                "lat": first["lat"],
-                "lon": first["lon"],
-                "time": first["timestamp"]
-            },
-            "last_pos": {
-                "lat": last["lat"],
-                "lon": last["lon"],
-                "time": last["timestamp"]
-            },
-            "movement_km": round(movement, 2)
+            "name": state["name"],
+            "positions": state["fixes"],
+            "first_pos": state["first"],
+            "last_pos": state["last"],
+            "movement_km": round(state["distance_km"], 2),
+            "bounds": bounds(state)
         })
     
     # Sortiere nach Anzahl Positionen
@@ -217,7 +523,11 @@ def get_heatmap_data():
             ]
         }
     """
-    gps_data = get_gps_data()
+    return get_cached("heatmap", None, _compute_heatmap)
+
+def _compute_heatmap():
+    """Heatmap-Berechnung (ohne Cache)"""
+    gps_data = get_gps_data(get_entries())
     
     if not gps_data:
         return {"points": []}
@@ -239,14 +549,59 @@ def get_heatmap_data():
         "points": points
     }
 
+def get_heatmap_tile(z, x, y):
+    """
+    Heatmap-Tile (Slippy-Map z/x/y) aus der Tile-Pyramide
+    
+    Dichte-Raster werden pro Tile im LRU-Cache gehalten und beim Ingest
+    inkrementell fortgeschrieben. Jeder Request liefert nur die belegten
+    Bins eines Tiles (Bin-Mittelpunkt + Anzahl).
+    
+    Args:
+        z, x, y: Tile-Koordinaten
+    
+    Returns:
+        dict: {
+            "z": int, "x": int, "y": int,
+            "points": [[lat, lon, count], ...],
+            "max": int
+        } oder {"error": str}
+    """
+    if not (0 <= z <= HEATMAP_MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z):
+        return {"error": "Invalid tile coordinates"}
+    
+    bins = get_tile_bins(z, x, y)
+    bin_px = 256 // TILE_BINS
+    
+    points = []
+    for (bin_x, bin_y), count in bins.items():
+        lat, lon = pixel_to_lonlat(
+            x * 256 + (bin_x + 0.5) * bin_px,
+            y * 256 + (bin_y + 0.5) * bin_px,
+            z
+        )
+        points.append([round(lat, 6), round(lon, 6), count])
+    
+    return {
+        "z": z,
+        "x": x,
+        "y": y,
+        "points": points,
+        "max": max(bins.values()) if bins else 0
+    }
+
 # ========================= LOCATION ANALYSIS =========================
 
-def get_location_hotspots(min_points=3):
+def get_location_hotspots(min_points=HOTSPOT_MIN_POINTS, radius_m=HOTSPOT_RADIUS_M):
     """
     Findet GPS-Hotspots (Bereiche mit vielen Geräten)
     
+    Clustering über Gitter-Index (nahezu linear), Ergebnis pro
+    Daten-Version gecacht.
+    
     Args:
         min_points: Minimum Punkte für Hotspot
+        radius_m: Cluster-Radius in Metern (> 0, max. HOTSPOT_MAX_RADIUS_M)
     
     Returns:
         dict: {
@@ -258,41 +613,32 @@ def get_location_hotspots(min_points=3):
                     "total_points": int
                 },
                 ...
-            ]
-        }
+            ],
+            "radius_m": float
+        } oder {"error": str}
     """
-    gps_data = get_gps_data()
+    if not 0 < radius_m <= HOTSPOT_MAX_RADIUS_M:
+        return {"error": f"radius must be > 0 and <= {HOTSPOT_MAX_RADIUS_M} m"}
+    
+    return get_cached(
+        "hotspots",
+        (min_points, radius_m),
+        lambda: _compute_hotspots(min_points, radius_m)
+    )
+
+def _compute_hotspots(min_points, radius_m):
+    """Hotspot-Berechnung (ohne Cache)"""
+    gps_data = get_gps_data(get_entries())
     
     if not gps_data:
-        return {"hotspots": []}
+        return {"hotspots": [], "radius_m": radius_m}
     
-    # Gruppiere Punkte in 100m Radius
-    clusters = []
-    used_points = set()
-    
-    for i, point in enumerate(gps_data):
-        if i in used_points:
-            continue
-        
-        cluster = [point]
-        used_points.add(i)
-        
-        # Finde nahegelegene Punkte
-        for j, other in enumerate(gps_data):
-            if j in used_points or i == j:
-                continue
-            
-            dist = haversine_distance(
-                point["lat"], point["lon"],
-                other["lat"], other["lon"]
-            )
-            
-            if dist <= 0.1:  # 100m
-                cluster.append(other)
-                used_points.add(j)
-        
-        if len(cluster) >= min_points:
-            clusters.append(cluster)
+    # Gruppiere Punkte im Radius
+    clusters = [
+        [gps_data[i] for i in indices]
+        for indices in cluster_points(gps_data, radius_m / 1000)
+        if len(indices) >= min_points
+    ]
     
     # Berechne Hotspot-Zentren
     hotspots = []
@@ -312,7 +658,8 @@ def get_location_hotspots(min_points=3):
     hotspots.sort(key=lambda h: h["device_count"], reverse=True)
     
     return {
-        "hotspots": hotspots
+        "hotspots": hotspots,
+        "radius_m": radius_m
     }
 
 # ========================= MOVEMENT ANALYSIS =========================
@@ -321,6 +668,9 @@ def get_movement_analysis():
     """
     Bewegungsanalyse für Geräte
     
+    Liest die inkrementell gepflegten Aggregate (api.movement), O(Geräte).
+    Distanzen und Geschwindigkeiten ohne GPS-Sprünge (> MAX_SPEED_KMH).
+    
     Returns:
         dict: {
             "moving_devices": [
@@ -329,7 +679,10 @@ def get_movement_analysis():
                     "name": str,
                     "total_distance_km": float,
                     "positions": int,
-                    "avg_speed_kmh": float
+                    "avg_speed_kmh": float,
+                    "max_speed_kmh": float,
+                    "rejected_fixes": int,
+                    "bounds": {"min_lat", "max_lat", "min_lon", "max_lon"}
                 },
                 ...
             ],
@@ -345,67 +698,43 @@ def get_movement_analysis():
             ]
         }
     """
-    gps_data = get_gps_data()
-    
-    if not gps_data:
-        return {
-            "moving_devices": [],
-            "stationary_devices": []
-        }
-    
-    # Gruppiere nach MAC
-    device_positions = defaultdict(list)
-    for point in gps_data:
-        device_positions[point["mac"]].append(point)
-    
     moving = []
     stationary = []
     
-    for mac, positions in device_positions.items():
-        if len(positions) < 2:
+    for mac, state in get_movement_states():
+        if state["fixes"] < 2:
             # Nur 1 Position = stationär
-            pos = positions[0]
+            pos = state["first"]
             stationary.append({
                 "mac": mac,
-                "name": pos["name"],
+                "name": state["name"],
                 "lat": pos["lat"],
                 "lon": pos["lon"],
                 "positions": 1
             })
             continue
         
-        # Sortiere nach Zeit
-        positions.sort(key=lambda p: p["timestamp"])
-        
-        # Berechne Gesamtdistanz
-        total_distance = 0
-        for i in range(len(positions) - 1):
-            dist = haversine_distance(
-                positions[i]["lat"], positions[i]["lon"],
-                positions[i+1]["lat"], positions[i+1]["lon"]
-            )
-            total_distance += dist
-        
-        # Bewegung > 100m = moving
-        if total_distance > 0.1:
+        if is_moving(state):
             moving.append({
                 "mac": mac,
-                "name": positions[0]["name"],
-                "total_distance_km": round(total_distance, 2),
-                "positions": len(positions),
-                "avg_speed_kmh": 0  # Kann berechnet werden wenn Zeitstempel verfügbar
+                "name": state["name"],
+                "total_distance_km": round(state["distance_km"], 2),
+                "positions": state["fixes"],
+                "avg_speed_kmh": round(avg_speed(state), 1),
+                "max_speed_kmh": round(state["max_speed_kmh"], 1),
+                "rejected_fixes": state["rejected"],
+                "bounds": bounds(state)
             })
         else:
             # Statisch (alle Positionen im gleichen Bereich)
-            avg_lat = sum(p["lat"] for p in positions) / len(positions)
-            avg_lon = sum(p["lon"] for p in positions) / len(positions)
+            avg_lat, avg_lon = centroid(state)
             
             stationary.append({
                 "mac": mac,
-                "name": positions[0]["name"],
+                "name": state["name"],
                 "lat": round(avg_lat, 6),
                 "lon": round(avg_lon, 6),
-                "positions": len(positions)
+                "positions": state["fixes"]
             })
     
     # Sortiere
@@ -417,14 +746,82 @@ def get_movement_analysis():
         "stationary_devices": stationary
     }
 
+# ========================= CO-TRAVEL =========================
+
+def get_cotravel_analysis(min_slots=COTRAVEL_MIN_SLOTS, min_places=COTRAVEL_MIN_PLACES, limit=100):
+    """
+    Geräte, die zusammen reisen (wiederholt gleicher Ort + Zeit-Slot)
+    
+    Paar-Zähler werden beim Ingest gepflegt (api.cotravel), das Ergebnis
+    pro Daten-Version und Schwellwert gecacht.
+    
+    Args:
+        min_slots: Mindestanzahl gemeinsamer 15-Minuten-Slots
+        min_places: Mindestanzahl verschiedener Orte (~1 km)
+        limit: Maximale Anzahl Paare
+    
+    Returns:
+        dict: {
+            "pairs": [
+                {
+                    "mac_a": str, "name_a": str,
+                    "mac_b": str, "name_b": str,
+                    "shared_slots": int,
+                    "places": int,
+                    "first_epoch": float,
+                    "last_epoch": float
+                },
+                ...
+            ],
+            "total": int,
+            "slot_minutes": int
+        }
+    """
+    return get_cached(
+        "cotravel",
+        (min_slots, min_places, limit),
+        lambda: _compute_cotravel(min_slots, min_places, limit)
+    )
+
+def _compute_cotravel(min_slots, min_places, limit):
+    """Co-Travel-Auswertung (ohne Cache)"""
+    pairs = get_cotravel_pairs(min_slots, min_places)
+    names = {mac: state["name"] for mac, state in get_movement_states()}
+    
+    result = []
+    for pair in pairs[:limit]:
+        result.append({
+            "mac_a": pair["mac_a"],
+            "name_a": names.get(pair["mac_a"], "Unknown"),
+            "mac_b": pair["mac_b"],
+            "name_b": names.get(pair["mac_b"], "Unknown"),
+            "shared_slots": pair["shared_slots"],
+            "places": pair["places"],
+            "first_epoch": pair["first_epoch"],
+            "last_epoch": pair["last_epoch"]
+        })
+    
+    return {
+        "pairs": result,
+        "total": len(pairs),
+        "slot_minutes": COTRAVEL_SLOT_SECONDS // 60
+    }
+
 # ========================= DEVICE TRACKING =========================
 
-def get_device_track(mac):
+def get_device_track(mac, tolerance=None, zoom=None):
     """
     Bewegungsspur für ein spezifisches Gerät
     
+    Mit tolerance oder zoom wird der Track per Douglas-Peucker vereinfacht.
+    Die Ränge aller Punkte werden einmal pro Gerät berechnet und gecacht,
+    jede weitere Stufe ist nur noch ein Filter. "order" bleibt der Index
+    im Track nach dem Verwerfen der GPS-Sprünge (vor der Vereinfachung).
+    
     Args:
         mac: MAC-Adresse
+        tolerance: Maximale Abweichung in Metern
+        zoom: Karten-Zoom (Toleranz = TRACK_TOLERANCE_PX Pixel)
     
     Returns:
         dict: {
@@ -434,46 +831,106 @@ def get_device_track(mac):
                 {"lat": float, "lon": float, "timestamp": str, "order": int},
                 ...
             ],
-            "total_distance_km": float
+            "total_distance_km": float,
+            "avg_speed_kmh": float,
+            "max_speed_kmh": float,
+            "rejected_fixes": int,     # verworfene GPS-Sprünge
+            "simplification": {"tolerance_m": float, "original_points": int} | None
         }
     """
-    logs = get_parsed_logs()
-    device_logs = filter_logs_by_mac(logs, mac)
+    with ingest_lock:
+        device_logs = get_device_entries(mac)
+        generation = ingest_state["generation"]
+    
+    fixes = [log for log in device_logs if log.get("lat") and log.get("lon")]
+    epochs = [timestamp_to_epoch(log["timestamp"]) for log in fixes]
+    if None in epochs:
+        epochs = None
+    
+    # GPS-Sprünge verwerfen (nur mit gültigen Zeitstempeln möglich)
+    kept = range(len(fixes))
+    if epochs is not None:
+        kept = reject_outliers([f["lat"] for f in fixes], [f["lon"] for f in fixes], epochs)
+        epochs = [epochs[i] for i in kept]
+    rejected = len(fixes) - len(kept)
     
     track = []
-    for log in device_logs:
-        if log.get("lat") and log.get("lon"):
-            track.append({
-                "lat": log["lat"],
-                "lon": log["lon"],
-                "timestamp": log["timestamp"],
-                "order": len(track)
-            })
+    for i in kept:
+        track.append({
+            "lat": fixes[i]["lat"],
+            "lon": fixes[i]["lon"],
+            "timestamp": fixes[i]["timestamp"],
+            "order": len(track)
+        })
     
     if not track:
         return {
             "mac": mac,
             "name": "Unknown",
             "track": [],
-            "total_distance_km": 0
+            "total_distance_km": 0,
+            "avg_speed_kmh": 0,
+            "max_speed_kmh": 0,
+            "rejected_fixes": 0,
+            "bounds": None,
+            "simplification": None
         }
     
-    # Berechne Gesamtdistanz
-    total_distance = 0
-    for i in range(len(track) - 1):
-        dist = haversine_distance(
-            track[i]["lat"], track[i]["lon"],
-            track[i+1]["lat"], track[i+1]["lon"]
-        )
-        total_distance += dist
+    lats = [p["lat"] for p in track]
+    lons = [p["lon"] for p in track]
+    
+    # Distanz und Geschwindigkeiten (ein Durchlauf über den ganzen Track)
+    metrics = track_metrics(lats, lons, epochs)
+    
+    simplification = None
+    if tolerance is None and zoom is not None:
+        tolerance = zoom_tolerance(zoom, metrics["bounds"]["min_lat"], TRACK_TOLERANCE_PX)
+    
+    if tolerance is not None:
+        ranks = _get_track_ranks(mac, generation, lats, lons)
+        simplification = {
+            "tolerance_m": round(tolerance, 2),
+            "original_points": len(track)
+        }
+        track = [track[i] for i in simplify_indices(ranks, tolerance)]
     
     return {
         "mac": mac,
         "name": device_logs[0]["name"] if device_logs else "Unknown",
         "track": track,
-        "total_distance_km": round(total_distance, 2)
+        "total_distance_km": round(metrics["total_km"], 2),
+        "avg_speed_kmh": round(metrics["avg_speed_kmh"] or 0, 1),
+        "max_speed_kmh": round(metrics["max_speed_kmh"] or 0, 1),
+        "rejected_fixes": rejected,
+        "bounds": metrics["bounds"],
+        "simplification": simplification
     }
 
+def _get_track_ranks(mac, generation, lats, lons):
+    """
+    Douglas-Peucker-Ränge aus dem Cache (neu bei neuen GPS-Fixes)
+    
+    Innerhalb einer Ingest-Generation wächst ein Track nur, die Anzahl
+    Fixes erkennt also neue Daten; nach einer Rotation zählt die Generation.
+    """
+    key = (generation, len(lats))
+    
+    with _track_ranks_lock:
+        cached = _track_ranks.get(mac)
+        if cached is not None and cached["key"] == key:
+            _track_ranks.move_to_end(mac)
+            return cached["ranks"]
+    
+    ranks = simplification_ranks(lats, lons)
+    
+    with _track_ranks_lock:
+        _track_ranks[mac] = {"key": key, "ranks": ranks}
+        _track_ranks.move_to_end(mac)
+        if len(_track_ranks) > TRACK_CACHE_SIZE:
+            _track_ranks.popitem(last=False)
+    
+    return ranks
+
 # ========================= COMBINED MAP DATA =========================
 
 def get_all_map_data(device_filter="all"):
@@ -481,13 +938,74 @@ def get_all_map_data(device_filter="all"):
     Alle Karten-Daten auf einmal
     
     Returns:
-        dict: Kombinierte Map-Daten
+        dict: Kombinierte Map-Daten (fehlgeschlagene Sektion: {"error": str})
     """
-    return {
-        "statistics": get_gps_statistics(),
-        "markers": get_map_markers(device_filter),
-        "devices": get_device_positions(),
-        "heatmap": get_heatmap_data(),
-        "hotspots": get_location_hotspots(),
-        "movement": get_movement_analysis()
+    results = {
+        name: data if error is None else {"error": error}
+        for name, data, error in iter_map_sections(device_filter)
     }
+    return {name: results[name] for name, _ in MAP_SECTIONS}
+
+def iter_map_sections(device_filter="all"):
+    """
+    Karten-Sektionen parallel berechnen, in Fertigstellungs-Reihenfolge
+    
+    Alle Sektionen lesen denselben Daten-Snapshot (api.ingest.snapshot),
+    schnelle Sektionen (Marker) werden nicht von langsamen (Hotspots)
+    blockiert.
+    
+    Berechnet wird in einem eigenen Thread, der den Snapshot nur für die
+    Dauer der Berechnung hält - ein langsamer Client pausiert den Ingest
+    nicht. Fehler werden pro Sektion gemeldet; jede Sektion wird genau
+    einmal geliefert, auch wenn der Thread selbst scheitert.
+    
+    Args:
+        device_filter: Filter für die Marker-Sektion
+    
+    Yields:
+        tuple: (section_name, data, error) - error ist None oder str
+    """
+    results = Queue()
+    failure = []
+    
+    def compute():
+        try:
+            with snapshot():
+                with ThreadPoolExecutor(max_workers=len(MAP_SECTIONS)) as executor:
+                    futures = {
+                        executor.submit(builder, device_filter): name
+                        for name, builder in MAP_SECTIONS
+                    }
+                    for future in as_completed(futures):
+                        try:
+                            results.put((futures[future], future.result(), None))
+                        except Exception as e:
+                            results.put((futures[future], None, str(e)))
+        except Exception as e:
+            failure.append(str(e))
+        finally:
+            results.put(None)   # Ende
+    
+    threading.Thread(target=compute, name="map-sections", daemon=True).start()
+    
+    pending = [name for name, _ in MAP_SECTIONS]
+    while True:
+        item = results.get()
+        if item is None:
+            break
+        pending.remove(item[0])
+        yield item
+    
+    # Thread gescheitert: restliche Sektionen als Fehler melden
+    for name in pending:
+        yield name, None, failure[0] if failure else "Section not computed"
+
+# Sektionen von /api/map/all: (Name, callable(device_filter))
+MAP_SECTIONS = [
+    ("statistics", lambda device_filter: get_gps_statistics()),
+    ("markers", lambda device_filter: get_map_markers(device_filter)),
+    ("devices", lambda device_filter: get_device_positions()),
+    ("heatmap", lambda device_filter: get_heatmap_data()),
+    ("hotspots", lambda device_filter: get_location_hotspots()),
+    ("movement", lambda device_filter: get_movement_analysis())
+]
@@ -0,0 +1,141 @@
+"""
+Movement State
+==============
+
+Bewegungs-Aggregate pro Gerät, inkrementell beim Ingest gepflegt
+(O(1) pro GPS-Fix statt Neuberechnung aller Tracks pro Request)
+
+Reihenfolge = Log-Reihenfolge (chronologisch), nicht String-Sortierung
+der Timestamps.
+
+Geschwindigkeit je Segment aus den Epoch-Zeitstempeln; Fixes, die nur mit
+mehr als MAX_SPEED_KMH erreichbar wären, zählen als GPS-Sprung und gehen
+weder in Distanz noch in Bounds/Mittelpunkt ein (gleiche Regel wie
+geodesy.reject_outliers für Tracks).
+"""
+
+from api.utils import haversine_distance, timestamp_to_epoch
+from api.ingest import register_listener, ingest_lock, refresh
+from api.geodesy import speed_kmh, MAX_SPEED_KMH, OUTLIER_RESET, MIN_SEGMENT_SECONDS
+
+# Bewegung > 100m = moving
+MOVING_THRESHOLD_KM = 0.1
+
+# {mac: {...}} in Reihenfolge der ersten GPS-Sichtung
+movement_state = {}
+
+# ========================= INGEST =========================
+
+def _update_movement(start_row, entries):
+    """Ingest-Listener: neue GPS-Fixes in die Geräte-Aggregate übernehmen"""
+    for entry in entries:
+        lat, lon = entry.get("lat"), entry.get("lon")
+        if not (lat and lon):
+            continue
+
+        fix = {
+            "lat": lat,
+            "lon": lon,
+            "time": entry["timestamp"],
+            "epoch": timestamp_to_epoch(entry["timestamp"])
+        }
+
+        state = movement_state.get(entry["mac"])
+        if state is None:
+            movement_state[entry["mac"]] = {
+                "name": entry["name"],
+                "fixes": 1,
+                "first": fix,
+                "last": fix,
+                "distance_km": 0.0,
+                "moving_seconds": 0.0,
+                "max_speed_kmh": 0.0,
+                "rejected": 0,
+                "rejected_streak": 0,
+                "min_lat": lat, "max_lat": lat,
+                "min_lon": lon, "max_lon": lon,
+                "sum_lat": lat, "sum_lon": lon
+            }
+            continue
+
+        last = state["last"]
+        dist = haversine_distance(last["lat"], last["lon"], lat, lon)
+
+        if fix["epoch"] is not None and last["epoch"] is not None:
+            seconds = fix["epoch"] - last["epoch"]
+            speed = speed_kmh(dist, seconds)
+
+            # GPS-Sprung verwerfen, außer das Gerät bleibt dort
+            if speed > MAX_SPEED_KMH:
+                state["rejected_streak"] += 1
+                if state["rejected_streak"] < OUTLIER_RESET:
+                    state["rejected"] += 1
+                    continue
+                # Versetzt (Lücke im Log): neu ansetzen ohne Strecke
+                dist = 0.0
+            else:
+                # Gleiche Mindestdauer wie speed_kmh (avg <= max)
+                state["moving_seconds"] += max(seconds, MIN_SEGMENT_SECONDS)
+                if dist and speed > state["max_speed_kmh"]:
+                    state["max_speed_kmh"] = speed
+
+        state["rejected_streak"] = 0
+        state["distance_km"] += dist
+        state["last"] = fix
+        state["fixes"] += 1
+        state["sum_lat"] += lat
+        state["sum_lon"] += lon
+
+        if lat < state["min_lat"]:
+            state["min_lat"] = lat
+        elif lat > state["max_lat"]:
+            state["max_lat"] = lat
+        if lon < state["min_lon"]:
+            state["min_lon"] = lon
+        elif lon > state["max_lon"]:
+            state["max_lon"] = lon
+
+def _reset_movement():
+    """Ingest-Listener: Aggregate leeren (Log rotiert)"""
+    movement_state.clear()
+
+# ========================= READS =========================
+
+def get_movement_states():
+    """
+    Aktuelle Bewegungs-Aggregate aller Geräte
+
+    Returns:
+        List[tuple]: [(mac, state), ...] in Reihenfolge der ersten Sichtung
+    """
+    with ingest_lock:
+        refresh()
+        return [(mac, dict(state)) for mac, state in movement_state.items()]
+
+def is_moving(state):
+    """Klassifikation: moving wenn Gesamtdistanz > MOVING_THRESHOLD_KM"""
+    return state["fixes"] > 1 and state["distance_km"] > MOVING_THRESHOLD_KM
+
+def avg_speed(state):
+    """Durchschnittsgeschwindigkeit (km/h) über die Zeit zwischen den Fixes"""
+    if state["moving_seconds"] <= 0:
+        return 0.0
+    return state["distance_km"] / state["moving_seconds"] * 3600
+
+def centroid(state):
+    """Mittelpunkt aller Fixes"""
+    return (
+        state["sum_lat"] / state["fixes"],
+        state["sum_lon"] / state["fixes"]
+    )
+
+def bounds(state):
+    """Bounding-Box aller Fixes"""
+    return {
+        "min_lat": state["min_lat"],
+        "max_lat": state["max_lat"],
+        "min_lon": state["min_lon"],
+        "max_lon": state["max_lon"]
+    }
+
+register_listener(_update_movement, _reset_movement)
@@ -0,0 +1,218 @@
+"""
+Presence Engine
+===============
+
+Online/offline state per catalog row, maintained on ingest instead of
+being recomputed from last-seen timestamps on every request.
+
+A sighting puts the device online until last_epoch + ONLINE_SECONDS.
+Expiry times sit in a min-heap; advance() pops the expired ones and
+flips those devices offline (stale heap entries of devices seen again in
+the meantime are skipped). Counters and status bitmaps are updated on
+every transition, so status filters and by_status aggregations are O(1)
+reads. Each transition is recorded as an event.
+
+Status semantics are the same as catalog.device_status: online while
+now - last_epoch < ONLINE_SECONDS, unknown without a parseable timestamp.
+"""
+
+from collections import deque
+import heapq
+import time
+
+from api.ingest import register_listener, ingest_lock, refresh
+from api.catalog import catalog_state, bits_from_rows, ONLINE_SECONDS, STATUSES
+
+# Transition events kept in memory
+EVENT_BUFFER = 1000
+
+presence_state = {
+    "status": [],               # catalog row -> "online" | "offline" | "unknown"
+    "expires": {},              # {row: expiry epoch} of online rows
+    "heap": [],                 # [(expiry epoch, row), ...] - may hold stale entries
+    "online_bits": 0,
+    "unknown_bits": 0,
+    "counts": {status: 0 for status in STATUSES},
+    "clock": 0.0,               # time of the last advance()
+    "events": deque(maxlen=EVENT_BUFFER),
+    "event_seq": 0
+}
+
+# ========================= INGEST =========================
+
+def _track_entries(start_row, entries):
+    """Ingest listener: re-evaluate the catalog rows touched by new sightings"""
+    devices = catalog_state["devices"]
+    by_mac = catalog_state["by_mac"]
+    statuses = presence_state["status"]
+    initial = not statuses
+
+    now = max(time.time(), presence_state["clock"])
+    presence_state["clock"] = now
+
+    known = len(statuses)
+    statuses.extend([None] * (len(devices) - known))
+
+    changes = []
+    for row in {by_mac[entry["mac"]] for entry in entries}:
+        last_epoch = devices[row]["last_epoch"]
+        if last_epoch is None:
+            status = "unknown"
+        elif now - last_epoch < ONLINE_SECONDS:
+            status = "online"
+            expiry = last_epoch + ONLINE_SECONDS
+            if presence_state["expires"].get(row) != expiry:
+                presence_state["expires"][row] = expiry
+                heapq.heappush(presence_state["heap"], (expiry, row))
+        else:
+            status = "offline"
+
+        if status != "online":
+            presence_state["expires"].pop(row, None)
+
+        previous = statuses[row]
+        if status != previous:
+            # New devices only produce events after the initial load
+            event = previous is not None or (status == "online" and not initial)
+            changes.append((row, previous, status, last_epoch if status == "online" else now, event))
+
+    _apply(changes)
+
+def _reset_presence():
+    """Ingest listener: drop all state (log rotated)"""
+    presence_state["status"] = []
+    presence_state["expires"] = {}
+    presence_state["heap"] = []
+    presence_state["online_bits"] = 0
+    presence_state["unknown_bits"] = 0
+    presence_state["counts"] = {status: 0 for status in STATUSES}
+
+def _apply(changes):
+    """
+    Apply status transitions to state, counters, bitmaps and events
+
+    Args:
+        changes: [(row, previous, status, epoch, emit_event), ...]
+    """
+    if not changes:
+        return
+
+    statuses = presence_state["status"]
+    counts = presence_state["counts"]
+    devices = catalog_state["devices"]
+    size = len(statuses)
+
+    rows_into = {status: [] for status in STATUSES}
+    rows_out = {status: [] for status in STATUSES}
+
+    for row, previous, status, epoch, emit_event in changes:
+        statuses[row] = status
+        counts[status] += 1
+        rows_into[status].append(row)
+        if previous is not None:
+            counts[previous] -= 1
+            rows_out[previous].append(row)
+
+        if emit_event:
+            presence_state["event_seq"] += 1
+            presence_state["events"].append({
+                "seq": presence_state["event_seq"],
+                "mac": devices[row]["mac"],
+                "status": status,
+                "previous": previous,
+                "epoch": epoch
+            })
+
+    for status, key in (("online", "online_bits"), ("unknown", "unknown_bits")):
+        if rows_out[status]:
+            presence_state[key] &= ~bits_from_rows(rows_out[status], size)
+        if rows_into[status]:
+            presence_state[key] |= bits_from_rows(rows_into[status], size)
+
+# ========================= TIMER =========================
+
+def advance(now=None):
+    """
+    Flip devices whose online window expired to offline
+
+    Args:
+        now: Reference time (default: time.time()); the clock never runs backwards
+
+    Returns:
+        int: Number of devices that went offline
+    """
+    with ingest_lock:
+        refresh()
+
+        now = max(time.time() if now is None else now, presence_state["clock"])
+        presence_state["clock"] = now
+
+        heap = presence_state["heap"]
+        expires = presence_state["expires"]
+        changes = []
+
+        while heap and heap[0][0] <= now:
+            expiry, row = heapq.heappop(heap)
+            if expires.get(row) != expiry:
+                continue    # seen again since, or already offline
+            del expires[row]
+            changes.append((row, "online", "offline", expiry, True))
+
+        # Drop stale entries once they dominate the heap
+        if len(heap) > 2 * len(expires) + 1024:
+            presence_state["heap"] = [(expiry, row) for row, expiry in expires.items()]
+            heapq.heapify(presence_state["heap"])
+
+        _apply(changes)
+        return len(changes)
+
+# ========================= READS =========================
+
+def status_bits(now=None):
+    """
+    Status bitmaps over catalog rows (after advancing the clock)
+
+    Returns:
+        dict: {"online": bits, "unknown": bits} - offline is the rest
+    """
+    with ingest_lock:
+        advance(now)
+        return {
+            "online": presence_state["online_bits"],
+            "unknown": presence_state["unknown_bits"]
+        }
+
+def status_counts(now=None):
+    """Live counters: {"online": n, "offline": n, "unknown": n}"""
+    with ingest_lock:
+        advance(now)
+        return dict(presence_state["counts"])
+
+def status_of(mac, now=None):
+    """Presence status of one MAC (None if never seen)"""
+    with ingest_lock:
+        advance(now)
+        row = catalog_state["by_mac"].get(mac)
+        return None if row is None else presence_state["status"][row]
+
+def get_presence_events(since=0, limit=100):
+    """
+    Status transitions after a sequence number
+
+    Args:
+        since: Last seq the client has seen (0 = oldest buffered)
+        limit: Max events
+
+    Returns:
+        dict: {"events": [...], "last_seq": int, "counts": {...}}
+    """
+    with ingest_lock:
+        advance()
+        events = [event for event in presence_state["events"] if event["seq"] > since][:limit]
+        return {
+            "events": events,
+            "last_seq": presence_state["event_seq"],
+            "counts": dict(presence_state["counts"])
+        }
+
+register_listener(_track_entries, _reset_presence)
@@ -0,0 +1,239 @@
+"""
+Search Index
+============
+
+In-memory n-gram index over the device catalog (MAC, name, vendor, tags)
+plus a sorted MAC-prefix index, updated on ingest and tag changes.
+
+All 1- to 3-grams of every field are indexed, so any query up to three
+characters is a single posting lookup and longer queries intersect their
+trigram postings. Candidates are verified with the original substring
+test, results are identical to scanning every device.
+"""
+
+from bisect import bisect_left, insort
+from collections import defaultdict
+import heapq
+
+from api.ingest import register_listener, ingest_lock, refresh
+from api.catalog import catalog_state
+
+MAX_GRAM = 3
+
+# Typeahead ranking (lower = better)
+RANK_MAC_PREFIX = 0
+RANK_NAME_PREFIX = 1
+RANK_WORD_PREFIX = 2
+RANK_SUBSTRING = 3
+RANK_VENDOR = 4
+RANK_TAG = 5
+
+TYPEAHEAD_MAX_LIMIT = 50
+
+search_state = {
+    "grams": defaultdict(set),  # {gram: {catalog row, ...}}
+    "docs": {},                 # {row: (mac, name, vendor, tags)} lowercased, as indexed
+    "mac_keys": []              # sorted [(hex mac, row), ...] for prefix lookups
+}
+
+# ========================= INDEXING =========================
+
+def _index_entries(start_row, entries):
+    """Ingest listener: (re)index the catalog rows touched by new sightings"""
+    by_mac = catalog_state["by_mac"]
+    for row in {by_mac[entry["mac"]] for entry in entries}:
+        _index_row(row)
+
+def _reset_search():
+    """Ingest listener: drop the index (log rotated)"""
+    search_state["grams"] = defaultdict(set)
+    search_state["docs"] = {}
+    search_state["mac_keys"] = []
+
+def _index_row(row):
+    """Index one catalog row; no-op if its searchable fields are unchanged"""
+    record = catalog_state["devices"][row]
+    doc = (
+        record["mac"].lower(),
+        record["name"].lower(),
+        record["manufacturer"].lower(),
+        tuple(tag.lower() for tag in catalog_state["tags"].get(record["mac"], ()))
+    )
+
+    old = search_state["docs"].get(row)
+    if old == doc:
+        return
+
+    grams = search_state["grams"]
+    old_grams = _doc_grams(old) if old else set()
+    new_grams = _doc_grams(doc)
+
+    for gram in old_grams - new_grams:
+        grams[gram].discard(row)
+        if not grams[gram]:
+            del grams[gram]
+    for gram in new_grams - old_grams:
+        grams[gram].add(row)
+
+    if old is None:
+        insort(search_state["mac_keys"], (_hex(doc[0]), row))
+
+    search_state["docs"][row] = doc
+
+def _doc_grams(doc):
+    """All 1..MAX_GRAM-grams of a document's fields"""
+    mac, name, vendor, tags = doc
+    grams = set()
+    for text in (mac, name, vendor) + tags:
+        grams.update(_grams(text))
+    return grams
+
+def _grams(text):
+    return {
+        text[i:i + n]
+        for n in range(1, MAX_GRAM + 1)
+        for i in range(len(text) - n + 1)
+    }
+
+def _hex(text):
+    """MAC without separators ("aa:bb-cc" -> "aabbcc")"""
+    return text.replace(":", "").replace("-", "")
+
+def reindex_mac(mac):
+    """Re-index one device (e.g. after its tags changed)"""
+    with ingest_lock:
+        row = catalog_state["by_mac"].get(mac)
+        if row is not None:
+            _index_row(row)
+
+def reindex_all():
+    """Re-index all devices (e.g. after the tag store was loaded)"""
+    with ingest_lock:
+        for row in range(len(catalog_state["devices"])):
+            _index_row(row)
+
+# ========================= QUERIES =========================
+
+def candidate_rows(query):
+    """
+    Catalog rows whose MAC, name, vendor or a tag contains query
+
+    Args:
+        query: Search string (case-insensitive)
+
+    Returns:
+        set: Catalog row ids
+    """
+    query = query.lower()
+
+    with ingest_lock:
+        refresh()
+        grams = search_state["grams"]
+
+        # Empty string is contained in everything
+        if not query:
+            return set(search_state["docs"])
+
+        if len(query) <= MAX_GRAM:
+            return set(grams.get(query, ()))
+
+        postings = sorted(
+            (grams.get(query[i:i + MAX_GRAM], set()) for i in range(len(query) - MAX_GRAM + 1)),
+            key=len
+        )
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+
+        docs = search_state["docs"]
+        return {row for row in candidates if _doc_contains(docs[row], query)}
+
+def mac_prefix_rows(prefix):
+    """Catalog rows whose MAC starts with prefix (separators optional)"""
+    key = _hex(prefix.lower())
+    if not key or any(c not in "0123456789abcdef" for c in key):
+        return []
+
+    with ingest_lock:
+        refresh()
+        mac_keys = search_state["mac_keys"]
+
+        rows = []
+        for i in range(bisect_left(mac_keys, (key,)), len(mac_keys)):
+            if not mac_keys[i][0].startswith(key):
+                break
+            rows.append(mac_keys[i][1])
+        return rows
+
+def typeahead(query, limit=10):
+    """
+    Ranked device suggestions
+
+    Ranking: MAC prefix, name prefix, word prefix in name, substring in
+    MAC/name, vendor, tag; ties by most recent sighting.
+
+    Args:
+        query: Search string
+        limit: Max results (capped at TYPEAHEAD_MAX_LIMIT)
+
+    Returns:
+        List[dict]: [{"mac", "name", "manufacturer", "last_seen", "match_field", "rank"}, ...]
+    """
+    query = query.lower().strip()
+    limit = max(1, min(limit, TYPEAHEAD_MAX_LIMIT))
+    if not query:
+        return []
+
+    rows = candidate_rows(query)
+    prefix_rows = set(mac_prefix_rows(query))
+
+    with ingest_lock:
+        devices = catalog_state["devices"]
+        docs = search_state["docs"]
+
+        scored = []
+        for row in rows | prefix_rows:
+            rank, field = _rank(docs[row], query, row in prefix_rows)
+            record = devices[row]
+            recency = record["last_epoch"] or 0
+            scored.append((rank, -recency, row, field))
+
+        best = heapq.nsmallest(limit, scored)
+
+        return [
+            {
+                "mac": devices[row]["mac"],
+                "name": devices[row]["name"],
+                "manufacturer": devices[row]["manufacturer"],
+                "last_seen": devices[row]["last_seen"],
+                "match_field": field,
+                "rank": rank
+            }
+            for rank, _, row, field in best
+        ]
+
+def _doc_contains(doc, query):
+    mac, name, vendor, tags = doc
+    return query in mac or query in name or query in vendor or any(query in tag for tag in tags)
+
+def _rank(doc, query, mac_prefix):
+    """(rank, match_field) of a matching document"""
+    mac, name, vendor, tags = doc
+
+    if mac_prefix:
+        return RANK_MAC_PREFIX, "mac"
+    if name.startswith(query):
+        return RANK_NAME_PREFIX, "name"
+    if any(word.startswith(query) for word in name.split()):
+        return RANK_WORD_PREFIX, "name"
+    if query in mac:
+        return RANK_SUBSTRING, "mac"
+    if query in name:
+        return RANK_SUBSTRING, "name"
+    if query in vendor:
+        return RANK_VENDOR, "manufacturer"
+    return RANK_TAG, "tags"
+
+register_listener(_index_entries, _reset_search)
@@ -0,0 +1,362 @@
+"""
+Spatial Helpers
+===============
+
+Grid-Bucketing für GPS-Punkte (Nachbarzellen statt Paarvergleich)
+Basis für Hotspot-Clustering und räumliche Abfragen in map_api.py
+
+Der Positions-Index wird vom Ingest-Pipeline inkrementell gepflegt.
+"""
+
+from array import array
+from collections import defaultdict, OrderedDict, Counter
+from math import radians, degrees, sin, cos, asin, atan, sinh, log, tan, pi, floor
+from api.utils import haversine_distance, timestamp_to_epoch
+from api.ingest import register_listener, ingest_lock, refresh
+
+EARTH_RADIUS_KM = 6371
+KM_PER_DEG_LAT = radians(1) * EARTH_RADIUS_KM
+
+# ========================= GRID =========================
+
+def grid_cell_size(radius_km, max_abs_lat):
+    """
+    Zellgröße (Grad) so, dass alle Punkte im Radius in den 3x3 Nachbarzellen liegen
+
+    Args:
+        radius_km: Suchradius in km
+        max_abs_lat: Betragsmäßig größte Breite der Daten
+
+    Returns:
+        tuple: (dlat, dlon) in Grad
+    """
+    if not radius_km > 0:
+        raise ValueError("radius_km must be positive")
+
+    dlat = radius_km / KM_PER_DEG_LAT
+
+    # Breitengrad am polnächsten Rand der Zelle
+    lat = min(abs(max_abs_lat) + dlat, 90)
+    ratio = sin(radius_km / (2 * EARTH_RADIUS_KM)) / max(cos(radians(lat)), 1e-12)
+
+    if ratio >= 1:
+        return dlat, 360.0
+
+    dlon = degrees(2 * asin(ratio))
+    return dlat, dlon
+
+def build_grid(points, dlat, dlon):
+    """
+    Punkte in Gitterzellen einsortieren
+
+    Args:
+        points: Liste von dicts mit "lat"/"lon"
+        dlat, dlon: Zellgröße in Grad
+
+    Returns:
+        dict: {(row, col): [index, ...]} (Indizes aufsteigend)
+    """
+    grid = defaultdict(list)
+    for i, point in enumerate(points):
+        grid[(int(point["lat"] // dlat), int(point["lon"] // dlon))].append(i)
+    return grid
+
+# ========================= CLUSTERING =========================
+
+def cluster_points(points, radius_km=0.1):
+    """
+    Greedy-Radius-Clustering über ein Gitter-Index
+
+    Liefert dieselben Cluster wie der paarweise Vergleich (erster freier Punkt
+    sammelt alle freien Punkte im Radius), prüft aber nur die 3x3 Nachbarzellen.
+    Bereits vergebene Punkte werden beim Scannen aus den Zellen entfernt,
+    dadurch bleibt der Aufwand nahezu linear.
+
+    Args:
+        points: Liste von dicts mit "lat"/"lon"
+        radius_km: Cluster-Radius in km
+
+    Returns:
+        List[List[int]]: Cluster als Listen von Punkt-Indizes
+    """
+    if not points:
+        return []
+
+    max_abs_lat = max(abs(p["lat"]) for p in points)
+    dlat, dlon = grid_cell_size(radius_km, max_abs_lat)
+    grid = build_grid(points, dlat, dlon)
+
+    used = bytearray(len(points))
+    clusters = []
+
+    for i, point in enumerate(points):
+        if used[i]:
+            continue
+
+        used[i] = 1
+        cluster = [i]
+        row = int(point["lat"] // dlat)
+        col = int(point["lon"] // dlon)
+
+        for dr in (-1, 0, 1):
+            for dc in (-1, 0, 1):
+                key = (row + dr, col + dc)
+                cell = grid.get(key)
+                if not cell:
+                    continue
+
+                # Vergebene Punkte aus der Zelle entfernen
+                alive = [j for j in cell if not used[j]]
+                grid[key] = alive
+
+                for j in alive:
+                    other = points[j]
+                    dist = haversine_distance(
+                        point["lat"], point["lon"],
+                        other["lat"], other["lon"]
+                    )
+                    if dist <= radius_km:
+                        cluster.append(j)
+                        used[j] = 1
+
+        # Reihenfolge wie beim paarweisen Vergleich (stabile Mittelwerte)
+        cluster.sort()
+        clusters.append(cluster)
+
+    return clusters
+
+# ========================= POSITION INDEX =========================
+
+# Zellgröße des Positions-Index in Grad (~1 km)
+INDEX_CELL_DEG = 0.01
+
+position_index = {
+    "cells": defaultdict(list),   # {(row, col): [pos_id, ...]}
+    "rows": array('l'),           # pos_id -> Ingest-Row-ID
+    "lat": array('d'),
+    "lon": array('d'),
+    "epoch": array('d')           # NaN wenn Timestamp ungültig
+}
+
+def _index_entries(start_row, entries):
+    """Ingest-Listener: neue GPS-Sichtungen in den Index aufnehmen"""
+    cells = position_index["cells"]
+
+    for offset, entry in enumerate(entries):
+        if not (entry.get("lat") and entry.get("lon")):
+            continue
+
+        pos_id = len(position_index["rows"])
+        lat, lon = entry["lat"], entry["lon"]
+        epoch = timestamp_to_epoch(entry["timestamp"])
+
+        position_index["rows"].append(start_row + offset)
+        position_index["lat"].append(lat)
+        position_index["lon"].append(lon)
+        position_index["epoch"].append(epoch if epoch is not None else float("nan"))
+        cells[_index_cell(lat, lon)].append(pos_id)
+
+def _reset_index():
+    """Ingest-Listener: Index leeren (Log rotiert)"""
+    position_index["cells"] = defaultdict(list)
+    for key in ("rows", "lat", "lon", "epoch"):
+        position_index[key] = array(position_index[key].typecode)
+
+def _index_cell(lat, lon):
+    return (floor(lat / INDEX_CELL_DEG), floor(lon / INDEX_CELL_DEG))
+
+def query_bbox(bbox, time_from=None, time_to=None):
+    """
+    Positionen innerhalb einer Bounding-Box
+
+    Args:
+        bbox: {"min_lat", "min_lon", "max_lat", "max_lon"}
+              (min_lon > max_lon = Box über die Datumsgrenze)
+        time_from, time_to: Optionales Zeitfenster (Epoch)
+
+    Returns:
+        List[int]: Positions-IDs (aufsteigend = chronologisch)
+    """
+    if bbox["min_lon"] > bbox["max_lon"]:
+        west = dict(bbox, max_lon=180.0)
+        east = dict(bbox, min_lon=-180.0)
+        return sorted(query_bbox(west, time_from, time_to) +
+                      query_bbox(east, time_from, time_to))
+
+    with ingest_lock:
+        refresh()
+        cells = position_index["cells"]
+        lats = position_index["lat"]
+        lons = position_index["lon"]
+        epochs = position_index["epoch"]
+
+        row_min, col_min = _index_cell(bbox["min_lat"], bbox["min_lon"])
+        row_max, col_max = _index_cell(bbox["max_lat"], bbox["max_lon"])
+        span = (row_max - row_min + 1) * (col_max - col_min + 1)
+
+        # Große Boxen: nur belegte Zellen prüfen
+        if span > len(cells):
+            candidates = [
+                cell for (row, col), cell in cells.items()
+                if row_min <= row <= row_max and col_min <= col <= col_max
+            ]
+        else:
+            candidates = []
+            for row in range(row_min, row_max + 1):
+                for col in range(col_min, col_max + 1):
+                    cell = cells.get((row, col))
+                    if cell:
+                        candidates.append(cell)
+
+        result = []
+        for cell in candidates:
+            for pos_id in cell:
+                if not (bbox["min_lat"] <= lats[pos_id] <= bbox["max_lat"] and
+                        bbox["min_lon"] <= lons[pos_id] <= bbox["max_lon"]):
+                    continue
+                # NaN-Vergleiche sind False -> ungültige Zeiten fallen raus
+                if time_from is not None and not epochs[pos_id] >= time_from:
+                    continue
+                if time_to is not None and not epochs[pos_id] <= time_to:
+                    continue
+                result.append(pos_id)
+
+    result.sort()
+    return result
+
+# ========================= ZOOM CLUSTERING =========================
+
+# Cluster-Zellgröße in Bildschirm-Pixeln (Web-Mercator, 256px Tiles)
+CLUSTER_CELL_PX = 60
+
+def lonlat_to_pixel(lat, lon, zoom):
+    """
+    Web-Mercator Pixel-Koordinaten
+
+    Returns:
+        tuple: (x, y) in Pixeln bei gegebenem Zoom
+    """
+    lat = max(min(lat, 85.05112878), -85.05112878)
+    size = 256 * (2 ** zoom)
+    x = (lon + 180) / 360 * size
+    lat_rad = radians(lat)
+    y = (1 - log(tan(lat_rad) + 1 / cos(lat_rad)) / pi) / 2 * size
+    return x, y
+
+def cluster_by_zoom(pos_ids, zoom, cell_px=CLUSTER_CELL_PX):
+    """
+    Positionen in Bildschirm-Zellen gruppieren
+
+    Args:
+        pos_ids: Positions-IDs
+        zoom: Karten-Zoom
+        cell_px: Zellgröße in Pixeln
+
+    Returns:
+        List[List[int]]: Gruppen von Positions-IDs
+    """
+    lats = position_index["lat"]
+    lons = position_index["lon"]
+
+    groups = defaultdict(list)
+    for pos_id in pos_ids:
+        x, y = lonlat_to_pixel(lats[pos_id], lons[pos_id], zoom)
+        groups[(int(x // cell_px), int(y // cell_px))].append(pos_id)
+
+    return list(groups.values())
+
+def pixel_to_lonlat(x, y, zoom):
+    """
+    Inverse zu lonlat_to_pixel()
+
+    Returns:
+        tuple: (lat, lon)
+    """
+    size = 256 * (2 ** zoom)
+    lon = x / size * 360 - 180
+    lat = degrees(atan(sinh(pi * (1 - 2 * y / size))))
+    return lat, lon
+
+# ========================= HEATMAP TILES =========================
+
+# Dichte-Raster pro Tile (TILE_BINS x TILE_BINS Zellen à 8 Pixel)
+TILE_BINS = 32
+HEATMAP_MAX_ZOOM = 18
+HEATMAP_CACHE_SIZE = 512
+
+# LRU-Cache: {(z, x, y): Counter({(bin_x, bin_y): count})}
+heatmap_tiles = OrderedDict()
+
+def _tile_slot(lat, lon, zoom):
+    """Tile-Key und Bin innerhalb des Tiles für einen Punkt"""
+    x, y = lonlat_to_pixel(lat, lon, zoom)
+    bin_px = 256 // TILE_BINS
+    tile = (zoom, int(x // 256), int(y // 256))
+    return tile, (int(x % 256 // bin_px), int(y % 256 // bin_px))
+
+def _update_heat_tiles(start_row, entries):
+    """Ingest-Listener: gecachte Tiles mit neuen Positionen fortschreiben"""
+    if not heatmap_tiles:
+        return
+
+    for entry in entries:
+        if not (entry.get("lat") and entry.get("lon")):
+            continue
+
+        # Pixel einmal auf Max-Zoom berechnen, tiefere Stufen per Division
+        x, y = lonlat_to_pixel(entry["lat"], entry["lon"], HEATMAP_MAX_ZOOM)
+        bin_px = 256 // TILE_BINS
+
+        for zoom in range(HEATMAP_MAX_ZOOM + 1):
+            scale = 2 ** (HEATMAP_MAX_ZOOM - zoom)
+            zx, zy = x / scale, y / scale
+            bins = heatmap_tiles.get((zoom, int(zx // 256), int(zy // 256)))
+            if bins is not None:
+                bins[(int(zx % 256 // bin_px), int(zy % 256 // bin_px))] += 1
+
+def _reset_heat_tiles():
+    """Ingest-Listener: Tile-Cache leeren (Log rotiert)"""
+    heatmap_tiles.clear()
+
+def get_tile_bins(zoom, tile_x, tile_y):
+    """
+    Dichte-Raster eines Tiles (aus LRU-Cache oder aus dem Positions-Index)
+
+    Args:
+        zoom, tile_x, tile_y: Slippy-Map Tile-Koordinaten
+
+    Returns:
+        Counter: {(bin_x, bin_y): count} - Kopie, der Cache wird beim Ingest fortgeschrieben
+    """
+    key = (zoom, tile_x, tile_y)
+
+    with ingest_lock:
+        refresh()
+
+        bins = heatmap_tiles.get(key)
+        if bins is not None:
+            heatmap_tiles.move_to_end(key)
+            return Counter(bins)
+
+        # Tile-Grenzen -> Bounding-Box
+        north, west = pixel_to_lonlat(tile_x * 256, tile_y * 256, zoom)
+        south, east = pixel_to_lonlat((tile_x + 1) * 256, (tile_y + 1) * 256, zoom)
+        bbox = {"min_lat": south, "min_lon": west, "max_lat": north, "max_lon": east}
+
+        bins = Counter()
+        lats = position_index["lat"]
+        lons = position_index["lon"]
+        for pos_id in query_bbox(bbox):
+            tile, cell = _tile_slot(lats[pos_id], lons[pos_id], zoom)
+            # Punkte auf der Kante gehören nur zu einem Tile
+            if tile == key:
+                bins[cell] += 1
+
+        heatmap_tiles[key] = bins
+        if len(heatmap_tiles) > HEATMAP_CACHE_SIZE:
+            heatmap_tiles.popitem(last=False)
+
+        return Counter(bins)
+
+register_listener(_index_entries, _reset_index)
+register_listener(_update_heat_tiles, _reset_heat_tiles)
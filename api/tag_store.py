@@ -0,0 +1,199 @@
+"""
+Tag Store
+=========
+
+Transactional device tag storage (SQLite) with an in-memory index.
+
+Reads are served from memory. Every write runs in one SQLite transaction
+under a lock, so concurrent requests cannot lose updates, and a single
+edit only touches the rows of the affected MACs. Bulk updates for
+thousands of MACs are one transaction.
+
+The database is opened lazily on first use and only created by the
+first write. On first start an existing device_tags.json is imported
+(the JSON file is left in place).
+"""
+
+from pathlib import Path
+import json
+import sqlite3
+import threading
+
+BASE_DIR = Path(__file__).parent.parent
+TAGS_DB_PATH = BASE_DIR / "device_tags.db"
+LEGACY_TAGS_PATH = BASE_DIR / "device_tags.json"
+
+BULK_ACTIONS = ("add", "remove", "set", "clear")
+
+_lock = threading.Lock()
+_tags = {}      # {mac: [tag, ...]} - ordered as stored
+_loaded = False
+
+# ========================= READS =========================
+
+def get_tags(mac):
+    """Tags of a device (empty list if none)"""
+    _ensure_loaded()
+    return list(_tags.get(mac, []))
+
+def get_all_tags():
+    """Copy of all tags: {mac: [tag, ...]}"""
+    _ensure_loaded()
+    with _lock:
+        return {mac: list(tags) for mac, tags in _tags.items()}
+
+def tagged_count():
+    """Number of MACs with at least one tag"""
+    _ensure_loaded()
+    return len(_tags)
+
+# ========================= WRITES =========================
+
+def set_tags(mac, tags, on_change=None):
+    """
+    Replace the tags of one device
+
+    Returns:
+        List[str]: Stored tags
+    """
+    result, _ = bulk_update([mac], tags, "set", on_change)
+    return result[mac]
+
+def remove_tags(mac, on_change=None):
+    """
+    Remove all tags of one device
+
+    Returns:
+        bool: True if the device had tags
+    """
+    _, changed = bulk_update([mac], [], "clear", on_change)
+    return bool(changed)
+
+def bulk_update(macs, tags, action, on_change=None):
+    """
+    Tag or untag many devices in one transaction
+
+    Args:
+        macs: MAC addresses (already normalized)
+        tags: Tag strings (duplicates are dropped)
+        action: "add" (append missing), "remove" (drop given tags),
+                "set" (replace), "clear" (drop all)
+        on_change: Optional callable(changed) - runs under the store lock,
+                   so mirrors (catalog, search index) apply in commit order
+
+    Returns:
+        tuple: (result, changed) - {mac: [tag, ...]} new tags of every
+               given MAC and the subset whose tags actually changed
+    """
+    if action not in BULK_ACTIONS:
+        raise ValueError(f"Unknown action: {action}")
+
+    tags = list(dict.fromkeys(tags))
+    _ensure_loaded()
+
+    with _lock:
+        result = {}
+        for mac in macs:
+            current = _tags.get(mac, [])
+            if action == "add":
+                new = current + [tag for tag in tags if tag not in current]
+            elif action == "remove":
+                new = [tag for tag in current if tag not in tags]
+            elif action == "set":
+                new = list(tags)
+            else:
+                new = []
+            result[mac] = new
+
+        changed = {mac: new for mac, new in result.items() if new != _tags.get(mac, [])}
+        if changed:
+            _write(changed)
+            for mac, new in changed.items():
+                if new:
+                    _tags[mac] = new
+                else:
+                    _tags.pop(mac, None)
+
+            if on_change:
+                on_change(changed)
+
+    return result, changed
+
+# ========================= STORAGE =========================
+
+def _connect():
+    conn = sqlite3.connect(TAGS_DB_PATH, timeout=10)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS device_tags ("
+        " mac TEXT NOT NULL,"
+        " position INTEGER NOT NULL,"
+        " tag TEXT NOT NULL,"
+        " PRIMARY KEY (mac, position))"
+    )
+    return conn
+
+def _write(changed):
+    """Persist {mac: tags} in one transaction"""
+    conn = _connect()
+    try:
+        with conn:
+            conn.executemany(
+                "DELETE FROM device_tags WHERE mac = ?",
+                [(mac,) for mac in changed]
+            )
+            conn.executemany(
+                "INSERT INTO device_tags (mac, position, tag) VALUES (?, ?, ?)",
+                [
+                    (mac, position, tag)
+                    for mac, tags in changed.items()
+                    for position, tag in enumerate(tags)
+                ]
+            )
+    finally:
+        conn.close()
+
+def _ensure_loaded():
+    """Load the store on first use"""
+    global _loaded
+    if _loaded:
+        return
+    with _lock:
+        if not _loaded:
+            _load()
+            _loaded = True
+
+def _load():
+    """Load all tags into memory (import device_tags.json on first start)"""
+    _tags.clear()
+
+    if TAGS_DB_PATH.exists():
+        conn = _connect()
+        try:
+            rows = conn.execute(
+                "SELECT mac, tag FROM device_tags ORDER BY mac, position"
+            ).fetchall()
+        finally:
+            conn.close()
+
+        for mac, tag in rows:
+            _tags.setdefault(mac, []).append(tag)
+        return
+
+    if not LEGACY_TAGS_PATH.exists():
+        return
+
+    try:
+        legacy = json.loads(LEGACY_TAGS_PATH.read_text())
+    except (ValueError, OSError):
+        return
+    if not isinstance(legacy, dict):
+        return
+
+    imported = {
+        mac: list(dict.fromkeys(str(tag) for tag in tags))
+        for mac, tags in legacy.items()
+        if isinstance(tags, list) and tags
+    }
+    if imported:
+        _write(imported)
+        _tags.update(imported)
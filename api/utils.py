@@ -9,8 +9,15 @@ Funktioniert mit Flask Backend
 from pathlib import Path
 from datetime import datetime, timedelta
 from collections import Counter, defaultdict
+from functools import lru_cache
+from math import radians, sin, cos, sqrt, atan2, isfinite
+import base64
+import binascii
+import csv
+import io
 import json
 import re
+import zlib
 
 # ========================= PATHS =========================
 
@@ -273,6 +280,86 @@ def is_on_watchlist(mac):
     watchlist = load_watchlist()
     return mac in watchlist
 
+# ========================= TIMESTAMPS =========================
+
+MONTHS = {"JAN": 1, "FEB": 2, "MAR": 3, "APR": 4, "MAY": 5, "JUN": 6,
+          "JUL": 7, "AUG": 8, "SEP": 9, "OCT": 10, "NOV": 11, "DEC": 12}
+
+@lru_cache(maxsize=65536)
+def timestamp_to_epoch(timestamp):
+    """
+    Log-Timestamp in Unix-Epoch umrechnen
+    
+    Format: "14 OCT 1230" (Jahr = aktuelles Jahr, wie in filter_logs_by_time)
+    
+    Returns:
+        float | None: Epoch-Sekunden oder None bei ungültigem Format
+    """
+    try:
+        parts = timestamp.split()
+        day = int(parts[0])
+        month = MONTHS.get(parts[1], 10)
+        hour = int(parts[2][:2])
+        minute = int(parts[2][2:4])
+        
+        return datetime(datetime.now().year, month, day, hour, minute).timestamp()
+    except (ValueError, IndexError, AttributeError):
+        return None
+
+def parse_time_param(value):
+    """
+    Zeit-Parameter aus Query-String (Epoch-Sekunden oder ISO-Format)
+    
+    Returns:
+        float | None: Epoch-Sekunden (None auch für inf/nan)
+    """
+    if not value:
+        return None
+    
+    try:
+        number = float(value)
+        return number if isfinite(number) else None
+    except ValueError:
+        pass
+    
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except (ValueError, OverflowError, OSError):
+        return None
+
+# ========================= CURSORS =========================
+
+def encode_cursor(payload):
+    """
+    Opaker Cursor-Token für Keyset-Pagination
+    
+    Args:
+        payload: JSON-serialisierbare Liste (z. B. [sort_by, order, key, row])
+    
+    Returns:
+        str: URL-sicherer Token
+    """
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(token):
+    """
+    Cursor-Token zurück in den Payload
+    
+    Returns:
+        list | None: Payload oder None wenn ungültig
+    """
+    if not token:
+        return None
+    
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        payload = json.loads(raw)
+    except (ValueError, TypeError, binascii.Error):
+        return None
+    
+    return payload if isinstance(payload, list) else None
+
 # ========================= VALIDATION =========================
 
 def is_valid_mac(mac: str) -> bool:
@@ -280,6 +367,28 @@ def is_valid_mac(mac: str) -> bool:
     pattern = r'^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$'
     return bool(re.match(pattern, mac))
 
+def parse_bbox(value):
+    """
+    Bounding-Box aus Query-String ("min_lon,min_lat,max_lon,max_lat")
+    
+    Returns:
+        dict | None: {"min_lat", "min_lon", "max_lat", "max_lon"} oder None wenn ungültig
+    """
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(v) for v in value.split(","))
+    except (ValueError, AttributeError):
+        return None
+    
+    if not (-90 <= min_lat <= max_lat <= 90):
+        return None
+    
+    return {
+        "min_lat": min_lat,
+        "min_lon": min_lon,
+        "max_lat": max_lat,
+        "max_lon": max_lon
+    }
+
 def format_mac(mac: str) -> str:
     """Formatiert MAC-Adresse einheitlich"""
     mac = mac.upper().replace("-", ":").replace(".", ":")
@@ -381,6 +490,77 @@ def prepare_export_data(logs):
     
     return export
 
+# Zeilen pro Chunk beim Streaming
+EXPORT_CHUNK_ROWS = 500
+
+def iter_csv(rows, fields):
+    """
+    CSV-Export als Stream (csv-Modul, korrektes Quoting von Kommas/Quotes)
+    
+    Args:
+        rows: Iterable von Dicts
+        fields: Spalten (Reihenfolge der Ausgabe)
+    
+    Yields:
+        str: CSV-Text, Header zuerst, dann je EXPORT_CHUNK_ROWS Zeilen
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=fields, extrasaction="ignore")
+    
+    writer.writeheader()
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    
+    pending = 0
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending == EXPORT_CHUNK_ROWS:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    
+    if pending:
+        yield buffer.getvalue()
+
+def iter_ndjson(rows):
+    """
+    NDJSON-Export als Stream (ein JSON-Objekt pro Zeile)
+    
+    Yields:
+        str: je EXPORT_CHUNK_ROWS Zeilen
+    """
+    chunk = []
+    for row in rows:
+        chunk.append(json.dumps(row))
+        if len(chunk) == EXPORT_CHUNK_ROWS:
+            yield "\n".join(chunk) + "\n"
+            chunk = []
+    
+    if chunk:
+        yield "\n".join(chunk) + "\n"
+
+def iter_gzip(chunks):
+    """
+    Text-Stream gzip-komprimieren (inkrementell, ohne den Export zu puffern)
+    
+    Yields:
+        bytes: gzip-Daten
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31 = gzip-Header
+    first = True
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if first:
+            # Erster Chunk (Header) sofort raus, nicht erst nach vollem Block
+            data += compressor.flush(zlib.Z_SYNC_FLUSH)
+            first = False
+        if data:
+            yield data
+    yield compressor.flush()
+
 # ========================= GPS HELPERS =========================
 
 def haversine_distance(lat1, lon1, lat2, lon2):
@@ -388,9 +568,8 @@ def haversine_distance(lat1, lon1, lat2, lon2):
     Berechnet Distanz zwischen zwei GPS-Punkten (km)
     
     Uses Haversine formula
+    Für ganze Tracks: api.geodesy (vektorisiert)
     """
-    from math import radians, sin, cos, sqrt, atan2
-    
     R = 6371  # Earth radius in km
     
     lat1, lon1, lat2, lon2 = map(radians, [lat1, lon1, lat2, lon2])
@@ -8,7 +8,7 @@ Bereinigte Version:
 - Extended Stats integriert
 """
 
-from flask import Flask, render_template, jsonify, request
+from flask import Flask, render_template, jsonify, request, Response, stream_with_context
 import json
 from pathlib import Path
 from datetime import datetime
@@ -65,8 +65,10 @@ try:
         get_logs_data,
         get_recent_logs,
         search_logs_api,
-        export_logs
+        export_logs,
+        stream_export_logs
     )
+    from api.utils import iter_gzip
     LOGS_API_AVAILABLE = True
 except ImportError as e:
     LOGS_API_AVAILABLE = False
@@ -77,36 +79,94 @@ try:
     from api.map_api import (
         get_gps_statistics,
         get_map_markers,
+        get_compact_markers,
+        get_marker_details,
         get_device_positions,
         get_heatmap_data,
+        get_heatmap_tile,
         get_location_hotspots,
         get_movement_analysis,
         get_device_track,
-        get_all_map_data
+        get_cotravel_analysis,
+        get_all_map_data,
+        iter_map_sections,
+        CLUSTER_MAX_ZOOM
     )
+    from api.utils import parse_bbox, parse_time_param
+    from api.cotravel import COTRAVEL_MIN_SLOTS, COTRAVEL_MIN_PLACES
     MAP_API_AVAILABLE = True
 except ImportError as e:
     MAP_API_AVAILABLE = False
     print(f"⚠️ Map API nicht verfügbar: {e}")
     
+# Import Geofence API
+try:
+    from api.geofence_api import (
+        list_geofences,
+        create_geofence,
+        delete_geofence,
+        get_geofence_events
+    )
+    GEOFENCE_API_AVAILABLE = True
+except ImportError as e:
+    GEOFENCE_API_AVAILABLE = False
+    print(f"⚠️ Geofence API nicht verfügbar: {e}")
+
     # Import Devices API
 try:
     from api.devices_api import (
         get_device_directory,
         get_device_details,
+        get_device_resource,
         get_device_timeline,
+        DETAIL_FIELDS,
         search_devices,
         tag_device,
         get_device_tags,
         remove_device_tags,
+        bulk_tag_devices,
         export_devices,
+        stream_export_devices,
         get_device_aggregations
     )
+    from api.utils import iter_gzip
     DEVICES_API_AVAILABLE = True
 except ImportError as e:
     DEVICES_API_AVAILABLE = False
     print(f"⚠️ Devices API nicht verfügbar: {e}")
 
+# Import Search Index
+try:
+    from api.search_index import typeahead
+    SEARCH_INDEX_AVAILABLE = True
+except ImportError as e:
+    SEARCH_INDEX_AVAILABLE = False
+    print(f"⚠️ Search Index nicht verfügbar: {e}")
+
+# Import Presence Engine
+try:
+    from api.presence import get_presence_events
+    PRESENCE_AVAILABLE = True
+except ImportError as e:
+    PRESENCE_AVAILABLE = False
+    print(f"⚠️ Presence Engine nicht verfügbar: {e}")
+
+# Import Device Diff
+try:
+    from api.device_diff import parse_window, diff_windows
+    DEVICE_DIFF_AVAILABLE = True
+except ImportError as e:
+    DEVICE_DIFF_AVAILABLE = False
+    print(f"⚠️ Device Diff nicht verfügbar: {e}")
+
+# Import Log Stream
+try:
+    from api.log_stream import stream_events, STREAM_MAX_BACKLOG
+    LOG_STREAM_AVAILABLE = True
+except ImportError as e:
+    LOG_STREAM_AVAILABLE = False
+    print(f"⚠️ Log Stream nicht verfügbar: {e}")
+
 # ========================= FLASK APP =========================
 
 app = Flask(__name__)
@@ -156,6 +216,33 @@ def save_config(config):
     """Speichert die Konfiguration"""
     CONFIG_PATH.write_text(json.dumps(config, indent=2))
 
+# Streaming-Exporte: Format -> (Mimetype, Dateiendung)
+EXPORT_STREAM_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson")
+}
+
+def export_response(chunks, format_type, basename):
+    """
+    Generator-Response für Streaming-Exporte (Download, optional gzip)
+    
+    Args:
+        chunks: Iterator[str] mit den Export-Daten
+        format_type: Schlüssel aus EXPORT_STREAM_FORMATS
+        basename: Dateiname ohne Endung
+    """
+    mimetype, extension = EXPORT_STREAM_FORMATS[format_type]
+    filename = f"{basename}_{datetime.now():%Y%m%d_%H%M%S}.{extension}"
+    
+    if request.args.get('gzip') in ('1', 'true'):
+        chunks = iter_gzip(chunks)
+        mimetype = "application/gzip"
+        filename += ".gz"
+    
+    response = Response(stream_with_context(chunks), mimetype=mimetype)
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
 def read_logs(limit=100):
     """Liest die letzten Log-Einträge"""
     if not LOG_PATH.exists():
@@ -232,7 +319,12 @@ def get_status():
             "stats": STATS_API_AVAILABLE,
             "stats_extensions": STATS_EXTENSIONS_AVAILABLE,
             "logs": LOGS_API_AVAILABLE,
-            "map": MAP_API_AVAILABLE
+            "map": MAP_API_AVAILABLE,
+            "geofence": GEOFENCE_API_AVAILABLE,
+            "search_index": SEARCH_INDEX_AVAILABLE,
+            "presence": PRESENCE_AVAILABLE,
+            "device_diff": DEVICE_DIFF_AVAILABLE,
+            "log_stream": LOG_STREAM_AVAILABLE
         }
     })
 
@@ -290,10 +382,23 @@ def get_devices():
 def search():
     """Volltext-Suche"""
     query = request.args.get('q', '').lower()
+    limit = request.args.get('limit', 10, type=int)
     
     if not query:
         return jsonify([])
     
+    # Geräte aus dem Such-Index (gerankt, ein Treffer pro Gerät)
+    if SEARCH_INDEX_AVAILABLE:
+        return jsonify([
+            {
+                "timestamp": result["last_seen"],
+                "mac": result["mac"],
+                "name": result["name"],
+                "scanner": "bluetooth"
+            }
+            for result in typeahead(query, limit)
+        ])
+    
     logs = read_logs(1000)
     results = []
     
@@ -444,8 +549,12 @@ def logs_data():
     
     limit = request.args.get('limit', 100, type=int)
     time_filter = request.args.get('time_filter', None)
+    cursor = request.args.get('cursor', None)
     
-    return jsonify(get_logs_data(limit, time_filter))
+    result = get_logs_data(limit, time_filter, cursor)
+    if "error" in result:
+        return jsonify(result), 400
+    return jsonify(result)
 
 @app.route('/api/logs/recent')
 def logs_recent():
@@ -456,6 +565,28 @@ def logs_recent():
     n = request.args.get('n', 50, type=int)
     return jsonify(get_recent_logs(n))
 
+@app.route('/api/logs/stream')
+def logs_stream():
+    """Live-Log als Server-Sent Events (Resume über Last-Event-ID)"""
+    if not LOG_STREAM_AVAILABLE:
+        return jsonify({"error": "Log Stream not available"}), 503
+    
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    backlog = request.args.get('backlog', 0, type=int)
+    if backlog < 0 or backlog > STREAM_MAX_BACKLOG:
+        return jsonify({"error": f"backlog must be between 0 and {STREAM_MAX_BACKLOG}"}), 400
+    
+    events = stream_events(
+        last_event_id,
+        mac=request.args.get('mac') or None,
+        name=request.args.get('name') or None,
+        backlog=backlog
+    )
+    response = Response(stream_with_context(events), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @app.route('/api/logs/search')
 def logs_search():
     """Log-Suche"""
@@ -463,7 +594,13 @@ def logs_search():
         return jsonify({"error": "Logs API not available"}), 503
     
     query = request.args.get('q', '')
-    return jsonify(search_logs_api(query))
+    limit = request.args.get('limit', 100, type=int)
+    cursor = request.args.get('cursor', None)
+    
+    result = search_logs_api(query, limit, cursor)
+    if "error" in result:
+        return jsonify(result), 400
+    return jsonify(result)
 
 @app.route('/api/logs/export')
 def logs_export():
@@ -474,6 +611,10 @@ def logs_export():
     format_type = request.args.get('format', 'json')
     time_filter = request.args.get('time_filter', None)
     
+    # CSV/NDJSON werden gestreamt (kein Puffern des ganzen Exports)
+    if format_type in EXPORT_STREAM_FORMATS:
+        return export_response(stream_export_logs(format_type, time_filter), format_type, "noctis_logs")
+    
     return jsonify(export_logs(format_type, time_filter))
 
 # ========================= MAP ENDPOINTS =========================
@@ -493,7 +634,40 @@ def map_markers():
         return jsonify({"error": "Map API not available"}), 503
     
     device_filter = request.args.get('filter', 'all')
-    return jsonify(get_map_markers(device_filter))
+    zoom = request.args.get('zoom', None, type=int)
+    if zoom is not None:
+        zoom = max(0, min(zoom, CLUSTER_MAX_ZOOM))
+    time_from = parse_time_param(request.args.get('from'))
+    time_to = parse_time_param(request.args.get('to'))
+    geofence = request.args.get('geofence', None)
+    
+    bbox = None
+    if request.args.get('bbox'):
+        bbox = parse_bbox(request.args.get('bbox'))
+        if bbox is None:
+            return jsonify({"error": "Invalid bbox (min_lon,min_lat,max_lon,max_lat)"}), 400
+    
+    if request.args.get('format') == 'compact':
+        result = get_compact_markers(device_filter, bbox, time_from, time_to, geofence)
+    else:
+        result = get_map_markers(device_filter, bbox, zoom, time_from, time_to, geofence)
+    
+    if "error" in result:
+        return jsonify(result), 404
+    
+    return jsonify(result)
+
+@app.route('/api/map/markers/<int:marker_id>')
+def map_marker_details(marker_id):
+    """Popup-Details für einen Marker"""
+    if not MAP_API_AVAILABLE:
+        return jsonify({"error": "Map API not available"}), 503
+    
+    marker = get_marker_details(marker_id)
+    if "error" in marker:
+        return jsonify(marker), 404
+    
+    return jsonify(marker)
 
 @app.route('/api/map/devices')
 def map_devices():
@@ -501,7 +675,12 @@ def map_devices():
     if not MAP_API_AVAILABLE:
         return jsonify({"error": "Map API not available"}), 503
     
-    return jsonify(get_device_positions())
+    geofence = request.args.get('geofence', None)
+    result = get_device_positions(geofence)
+    if "error" in result:
+        return jsonify(result), 404
+    
+    return jsonify(result)
 
 @app.route('/api/map/heatmap')
 def map_heatmap():
@@ -511,6 +690,18 @@ def map_heatmap():
     
     return jsonify(get_heatmap_data())
 
+@app.route('/api/map/heatmap/<int:z>/<int:x>/<int:y>')
+def map_heatmap_tile(z, x, y):
+    """Heatmap-Tile (Slippy-Map)"""
+    if not MAP_API_AVAILABLE:
+        return jsonify({"error": "Map API not available"}), 503
+    
+    tile = get_heatmap_tile(z, x, y)
+    if "error" in tile:
+        return jsonify(tile), 400
+    
+    return jsonify(tile)
+
 @app.route('/api/map/hotspots')
 def map_hotspots():
     """GPS-Hotspots"""
@@ -518,7 +709,12 @@ def map_hotspots():
         return jsonify({"error": "Map API not available"}), 503
     
     min_points = request.args.get('min', 3, type=int)
-    return jsonify(get_location_hotspots(min_points))
+    radius_m = request.args.get('radius', 100, type=float)
+    
+    result = get_location_hotspots(min_points, radius_m)
+    if "error" in result:
+        return jsonify(result), 400
+    return jsonify(result)
 
 @app.route('/api/map/movement')
 def map_movement():
@@ -534,7 +730,22 @@ def map_track(mac):
     if not MAP_API_AVAILABLE:
         return jsonify({"error": "Map API not available"}), 503
     
-    return jsonify(get_device_track(mac))
+    tolerance = request.args.get('tolerance', None, type=float)
+    zoom = request.args.get('zoom', None, type=int)
+    if zoom is not None:
+        zoom = max(0, min(zoom, CLUSTER_MAX_ZOOM))
+    return jsonify(get_device_track(mac, tolerance, zoom))
+
+@app.route('/api/map/cotravel')
+def map_cotravel():
+    """Geräte, die zusammen reisen"""
+    if not MAP_API_AVAILABLE:
+        return jsonify({"error": "Map API not available"}), 503
+    
+    min_slots = request.args.get('min_slots', COTRAVEL_MIN_SLOTS, type=int)
+    min_places = request.args.get('min_places', COTRAVEL_MIN_PLACES, type=int)
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify(get_cotravel_analysis(min_slots, min_places, limit))
 
 @app.route('/api/map/all')
 def map_all():
@@ -543,8 +754,59 @@ def map_all():
         return jsonify({"error": "Map API not available"}), 503
     
     device_filter = request.args.get('filter', 'all')
+    
+    # NDJSON: eine Zeile pro Sektion, sobald sie fertig ist
+    if request.args.get('stream') in ('1', 'true'):
+        def generate():
+            for section, data, error in iter_map_sections(device_filter):
+                if error is not None:
+                    yield json.dumps({"section": section, "error": error}) + "\n"
+                else:
+                    yield json.dumps({"section": section, "data": data}) + "\n"
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
     return jsonify(get_all_map_data(device_filter))
     
+# ========================= GEOFENCE ENDPOINTS =========================
+
+@app.route('/api/geofences', methods=['GET', 'POST'])
+def geofences():
+    """Geofences auflisten/anlegen"""
+    if not GEOFENCE_API_AVAILABLE:
+        return jsonify({"error": "Geofence API not available"}), 503
+    
+    if request.method == 'POST':
+        result = create_geofence(request.json)
+        if not result["success"]:
+            return jsonify(result), 400
+        return jsonify(result)
+    
+    return jsonify(list_geofences())
+
+@app.route('/api/geofences/<fence_id>', methods=['DELETE'])
+def geofence_delete(fence_id):
+    """Geofence löschen"""
+    if not GEOFENCE_API_AVAILABLE:
+        return jsonify({"error": "Geofence API not available"}), 503
+    
+    result = delete_geofence(fence_id)
+    if not result["success"]:
+        return jsonify(result), 404
+    
+    return jsonify(result)
+
+@app.route('/api/geofences/events')
+def geofence_events():
+    """Enter/Exit-Events"""
+    if not GEOFENCE_API_AVAILABLE:
+        return jsonify({"error": "Geofence API not available"}), 503
+    
+    limit = request.args.get('limit', 100, type=int)
+    fence_id = request.args.get('fence', None)
+    mac = request.args.get('mac', None)
+    return jsonify(get_geofence_events(limit, fence_id, mac))
+
 @app.route('/api/devices/directory')
 def devices_directory():
     """Device directory with filters and pagination"""
@@ -560,8 +822,10 @@ def devices_directory():
     search_query = request.args.get('search', None)
     sort_by = request.args.get('sort_by', 'last_seen')
     sort_order = request.args.get('sort_order', 'desc')
+    cursor = request.args.get('cursor', None)
+    tag = request.args.get('tag', None)
     
-    return jsonify(get_device_directory(
+    result = get_device_directory(
         page=page,
         limit=limit,
         time_filter=time_filter,
@@ -570,8 +834,14 @@ def devices_directory():
         status=status,
         search_query=search_query,
         sort_by=sort_by,
-        sort_order=sort_order
-    ))
+        sort_order=sort_order,
+        cursor=cursor,
+        tag=tag
+    )
+    if "error" in result:
+        return jsonify(result), 400
+    
+    return jsonify(result)
 
 @app.route('/api/devices/<mac>')
 def device_details(mac):
@@ -579,7 +849,47 @@ def device_details(mac):
     if not DEVICES_API_AVAILABLE:
         return jsonify({"error": "Devices API not available"}), 503
     
-    return jsonify(get_device_details(mac))
+    # ?fields=statistics,positions,... - only requested sections are computed
+    fields = request.args.get('fields')
+    if fields is not None:
+        fields = [field.strip() for field in fields.split(',') if field.strip()]
+        unknown = [field for field in fields if field not in DETAIL_FIELDS]
+        if unknown:
+            return jsonify({"error": f"Unknown fields: {', '.join(unknown)}",
+                            "available": list(DETAIL_FIELDS)}), 400
+    
+    return jsonify(get_device_details(mac, fields))
+
+@app.route('/api/devices/<mac>/positions')
+def device_positions(mac):
+    """GPS positions of a device (most recent ?limit=, 0 = all)"""
+    return device_resource(mac, "positions")
+
+@app.route('/api/devices/<mac>/rssi')
+def device_rssi(mac):
+    """RSSI samples of a device (most recent ?limit=, 0 = all)"""
+    return device_resource(mac, "rssi")
+
+@app.route('/api/devices/<mac>/sessions')
+def device_sessions(mac):
+    """Presence sessions of a device (most recent ?limit=, 0 = all)"""
+    return device_resource(mac, "sessions")
+
+@app.route('/api/devices/<mac>/logs')
+def device_logs(mac):
+    """Raw sightings of a device (most recent ?limit=, 0 = all)"""
+    return device_resource(mac, "logs")
+
+def device_resource(mac, resource):
+    """Shared handler of the device sub-resource endpoints"""
+    if not DEVICES_API_AVAILABLE:
+        return jsonify({"error": "Devices API not available"}), 503
+    
+    limit = request.args.get('limit', None, type=int)
+    if limit is not None and limit < 0:
+        return jsonify({"error": "limit must be >= 0"}), 400
+    
+    return jsonify(get_device_resource(mac, resource, limit))
 
 @app.route('/api/devices/<mac>/timeline')
 def device_timeline(mac):
@@ -604,6 +914,60 @@ def api_search_devices():
     
     return jsonify(search_devices(query, limit))
 
+@app.route('/api/devices/typeahead')
+def devices_typeahead():
+    """Ranked device suggestions (MAC prefix, name, vendor, tags)"""
+    if not SEARCH_INDEX_AVAILABLE:
+        return jsonify({"error": "Search index not available"}), 503
+    
+    query = request.args.get('q', '')
+    limit = request.args.get('limit', 10, type=int)
+    
+    results = typeahead(query, limit)
+    return jsonify({
+        "query": query,
+        "results": results,
+        "count": len(results)
+    })
+
+@app.route('/api/devices/presence')
+def devices_presence():
+    """Live online/offline counters and status transitions after ?since=<seq>"""
+    if not PRESENCE_AVAILABLE:
+        return jsonify({"error": "Presence engine not available"}), 503
+    
+    since = request.args.get('since', 0, type=int)
+    limit = request.args.get('limit', 100, type=int)
+    
+    return jsonify(get_presence_events(since, max(1, min(limit, 1000))))
+
+@app.route('/api/devices/diff')
+def devices_diff():
+    """Compare two windows: ?a=from,to&b=from,to (epoch seconds or ISO dates)"""
+    if not DEVICE_DIFF_AVAILABLE:
+        return jsonify({"error": "Device diff not available"}), 503
+    
+    window_a = parse_window(request.args.get('a'))
+    window_b = parse_window(request.args.get('b'))
+    if window_a is None or window_b is None:
+        return jsonify({"error": "Parameters 'a' and 'b' required as from,to (epoch or ISO, from <= to)"}), 400
+    
+    limit = request.args.get('limit', 100, type=int)
+    return jsonify(diff_windows(window_a, window_b, limit))
+
+@app.route('/api/devices/tags/bulk', methods=['POST'])
+def devices_tags_bulk():
+    """Tag or untag many devices at once"""
+    if not DEVICES_API_AVAILABLE:
+        return jsonify({"error": "Devices API not available"}), 503
+    
+    data = request.json or {}
+    result = bulk_tag_devices(data.get('macs', []), data.get('tags', []), data.get('action', 'add'))
+    if not result["success"]:
+        return jsonify(result), 400
+    
+    return jsonify(result)
+
 @app.route('/api/devices/<mac>/tags', methods=['GET', 'POST', 'DELETE'])
 def device_tags(mac):
     """Manage device tags"""
@@ -636,6 +1000,14 @@ def devices_export():
         filters['device_type'] = request.args.get('device_type')
     if request.args.get('status'):
         filters['status'] = request.args.get('status')
+    if request.args.get('tag'):
+        filters['tag'] = request.args.get('tag')
+    
+    # CSV/NDJSON are streamed (flat memory, first bytes immediately)
+    if format_type in EXPORT_STREAM_FORMATS:
+        return export_response(
+            stream_export_devices(format_type, time_filter, filters), format_type, "noctis_devices"
+        )
     
     return jsonify(export_devices(format_type, time_filter, filters))
 